@@ -96,6 +96,19 @@ class LbaasAgentApi(RpcProxy):
             topic=self.topic
         )
 
+    @log.log
+    def get_pools_state(self):
+        return self.call(
+            self.context,
+            self.make_msg(
+                'get_pools_state',
+                env=self.env,
+                group=self.group,
+                host=self.host
+            ),
+            topic=self.topic
+        )
+
     @log.log
     def get_service_by_pool_id(self, pool_id, global_routed_mode=False):
         return self.call(
@@ -109,6 +122,19 @@ class LbaasAgentApi(RpcProxy):
             topic=self.topic
         )
 
+    @log.log
+    def get_services_by_pool_ids(self, pool_ids, global_routed_mode=False):
+        return self.call(
+            self.context,
+            self.make_msg(
+                'get_services_by_pool_ids',
+                pool_ids=pool_ids,
+                global_routed_mode=global_routed_mode,
+                host=self.host
+            ),
+            topic=self.topic
+        )
+
     @log.log
     def create_port_on_subnet(self, subnet_id=None,
                               mac_address=None, name=None,
@@ -375,3 +401,15 @@ class LbaasAgentApi(RpcProxy):
             ),
             topic=self.topic
         )
+
+    @log.log
+    def update_pools_stats(self, stats_by_pool):
+        return self.call(
+            self.context,
+            self.make_msg(
+                'update_pools_stats',
+                stats_by_pool=stats_by_pool,
+                host=self.host
+            ),
+            topic=self.topic
+        )
@@ -15,6 +15,7 @@
 
 import datetime
 import copy
+from time import time
 
 preLiberty = False
 try:
@@ -32,6 +33,7 @@ from neutron.common import constants as neutron_constants
 from neutron import context
 from neutron.common import topics
 from neutron.common.exceptions import NeutronException
+from neutron.plugins.common import constants as plugin_const
 PREMITAKA = False
 try:
     from neutron.common import log
@@ -42,6 +44,7 @@ except ImportError:
 
 from f5.oslbaasv1agent.drivers.bigip import agent_api
 from f5.oslbaasv1agent.drivers.bigip import constants
+from f5.oslbaasv1agent.drivers.bigip import scheduler
 import f5.oslbaasv1agent.drivers.bigip.constants as lbaasv1constants
 
 preJuno = False
@@ -109,6 +112,11 @@ OPTS = [
         default=300,
         help=_('Number of seconds between service refresh check')
     ),
+    cfg.IntOpt(
+        'service_full_resync_interval',
+        default=3600,
+        help=_('Number of seconds between refreshes of all services')
+    ),
     cfg.StrOpt(
         'environment_prefix', default='',
         help=_('The object name prefix for this environment'),
@@ -134,11 +142,21 @@ class LogicalServiceCache(object):
 
     class Service(object):
         """Inner classes used to hold values for weakref lookups."""
-        def __init__(self, port_id, pool_id, tenant_id, agent_host):
+        def __init__(self, port_id, pool_id, tenant_id, agent_host,
+                     members=None):
             self.port_id = port_id
             self.pool_id = pool_id
             self.tenant_id = tenant_id
             self.agent_host = agent_host
+            self.members = members or []
+            # pool generation from the plugin when last synced
+            self.generation = None
+
+        def get_stats_service(self):
+            """ Enough of the service definition to collect stats """
+            return {'pool': {'id': self.pool_id,
+                             'tenant_id': self.tenant_id},
+                    'members': self.members}
 
         def __eq__(self, other):
             return self.__dict__ == other.__dict__
@@ -167,14 +185,36 @@ class LogicalServiceCache(object):
             port_id = None
         pool_id = service['pool']['id']
         tenant_id = service['pool']['tenant_id']
+        members = self._get_members(service)
         if pool_id not in self.services:
-            s = self.Service(port_id, pool_id, tenant_id, agent_host)
+            s = self.Service(port_id, pool_id, tenant_id, agent_host,
+                             members)
             self.services[pool_id] = s
         else:
             s = self.services[pool_id]
             s.tenant_id = tenant_id
             s.port_id = port_id
             s.agent_host = agent_host
+            s.members = members
+
+    @staticmethod
+    def _get_members(service):
+        """ The member attributes stats collection needs """
+        members = []
+        for member in service.get('members', []):
+            status = member['status']
+            if status == plugin_const.PENDING_DELETE:
+                continue
+            # services are cached once they are provisioned
+            if status in [plugin_const.PENDING_CREATE,
+                          plugin_const.PENDING_UPDATE]:
+                status = plugin_const.ACTIVE
+            members.append({'id': member['id'],
+                            'address': member['address'],
+                            'protocol_port': member['protocol_port'],
+                            'admin_state_up': member['admin_state_up'],
+                            'status': status})
+        return members
 
     def remove(self, service):
         if not isinstance(service, self.Service):
@@ -226,8 +266,20 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
         # create the cache of provisioned services
         self.cache = LogicalServiceCache()
         self.last_resync = datetime.datetime.now()
+        self.last_full_resync = self.last_resync
         self.needs_resync = False
+        # the first sync refreshes everything
+        self.full_resync = True
+        # set when BIG-IPs are added, so every service is synced
+        # rather than checked for on the first BIG-IP
+        self.refresh_all_services = False
+        # cleared if the plugin has no get_pools_state
+        self.incremental_sync = True
         self.plugin_rpc = None
+        # cleared if the plugin has no update_pools_stats
+        self.batch_pool_stats = True
+        # cleared if the plugin has no get_services_by_pool_ids
+        self.batch_services = True
 
         if conf.service_resync_interval:
             self.service_resync_interval = conf.service_resync_interval
@@ -382,6 +434,27 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
             if hasattr(self.lbdriver, 'service_queue'):
                 self.agent_state['configurations']['request_queue_depth'] = \
                     len(self.lbdriver.service_queue)
+                if hasattr(self.lbdriver.service_queue, 'get_statistics'):
+                    self._report_queue_statistics(
+                        self.lbdriver.service_queue.get_statistics())
+            if hasattr(self.lbdriver, 'get_icr_statistics'):
+                self._report_icr_statistics(
+                    self.lbdriver.get_icr_statistics())
+            if hasattr(self.lbdriver, 'get_folder_statistics'):
+                self._report_folder_statistics(
+                    self.lbdriver.get_folder_statistics())
+            if hasattr(self.lbdriver, 'get_sync_statistics'):
+                self._report_sync_statistics(
+                    self.lbdriver.get_sync_statistics())
+            if hasattr(self.lbdriver, 'get_object_cache_statistics'):
+                self._report_object_cache_statistics(
+                    self.lbdriver.get_object_cache_statistics())
+            if hasattr(self.lbdriver, 'get_fdb_statistics'):
+                self._report_fdb_statistics(
+                    self.lbdriver.get_fdb_statistics())
+            # only reported while some devices are not connected
+            self.agent_state['configurations'].pop(
+                'icontrol_endpoints_unreachable', None)
             if self.lbdriver.agent_configurations:
                 self.agent_state['configurations'].update(
                     self.lbdriver.agent_configurations
@@ -402,6 +475,77 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
         except Exception as e:
             LOG.exception(_("Failed reporting state!: " + str(e.message)))
 
+    def _report_queue_statistics(self, queue_stats):
+        """ Log request queue statistics for busy pools and tenants """
+        for key in sorted(queue_stats):
+            key_stats = queue_stats[key]
+            if not key_stats['requests']:
+                continue
+            if key != scheduler.GLOBAL_KEY and not key_stats['queue_depth']:
+                continue
+            LOG.debug('request queue %s: depth %d, requests %d, '
+                      'merged %d, '
+                      'avg wait %.5f secs, max wait %.5f secs, '
+                      'avg run %.5f secs, max run %.5f secs'
+                      % (key, key_stats['queue_depth'],
+                         key_stats['requests'], key_stats['merged'],
+                         key_stats['wait_time'] / key_stats['requests'],
+                         key_stats['max_wait_time'],
+                         key_stats['run_time'] / key_stats['requests'],
+                         key_stats['max_run_time']))
+
+    def _report_icr_statistics(self, icr_stats):
+        """ Log iControl REST connection reuse per device """
+        for hostname in sorted(icr_stats):
+            host_stats = icr_stats[hostname]
+            LOG.debug('iControl REST %s: requests %d, connections %d, '
+                      'reused %d'
+                      % (hostname, host_stats['requests'],
+                         host_stats['connections'], host_stats['reused']))
+
+    def _report_folder_statistics(self, folder_stats):
+        """ Log iControl SOAP folder switches per device """
+        for hostname in sorted(folder_stats):
+            host_stats = folder_stats[hostname]
+            LOG.debug('iControl folder %s: requests %d, switches %d, '
+                      'round trips avoided %d'
+                      % (hostname, host_stats['requests'],
+                         host_stats['switches'], host_stats['avoided']))
+
+    def _report_sync_statistics(self, sync_stats):
+        """ Log how many config-sync requests each sync served """
+        if not sync_stats['syncs']:
+            return
+        LOG.debug('cluster sync: requests %d, syncs %d, failures %d, '
+                  'waiting %d, avg sync %.5f secs, max sync %.5f secs'
+                  % (sync_stats['requests'], sync_stats['syncs'],
+                     sync_stats['failures'], sync_stats['waiting'],
+                     sync_stats['sync_time'] / sync_stats['syncs'],
+                     sync_stats['max_sync_time']))
+
+    def _report_fdb_statistics(self, fdb_stats):
+        """ Log how many fdb requests each tunnel update served """
+        if not fdb_stats['updates']:
+            return
+        LOG.debug('fdb updates: requests %d, entries %d, updates %d, '
+                  'failures %d, dropped %d, pending %d, avg update %.5f '
+                  'secs, max update %.5f secs'
+                  % (fdb_stats['requests'], fdb_stats['entries'],
+                     fdb_stats['updates'], fdb_stats['failures'],
+                     fdb_stats['dropped'], fdb_stats['pending'],
+                     fdb_stats['update_time'] / fdb_stats['updates'],
+                     fdb_stats['max_update_time']))
+
+    def _report_object_cache_statistics(self, cache_stats):
+        """ Log object existence cache hits per device """
+        for hostname in sorted(cache_stats):
+            host_stats = cache_stats[hostname]
+            LOG.debug('object cache %s: hits %d, misses %d, '
+                      'evictions %d, size %d'
+                      % (hostname, host_stats['hits'],
+                         host_stats['misses'], host_stats['evictions'],
+                         host_stats['size']))
+
     def initialize_service_hook(self, started_by):
         # Prior to Juno.2, multiple listeners were created, including
         # topic.host, but that was removed. We manually restore that
@@ -419,6 +563,15 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
     def periodic_resync(self, context):
         LOG.debug("tunnel_sync: periodic_resync called")
         now = datetime.datetime.now()
+        # devices connected late have none of the services yet
+        if getattr(self.lbdriver, 'bigips_added', False):
+            LOG.debug('Forcing resync of all services on new BIG-IPs.')
+            self.lbdriver.bigips_added = False
+            self.needs_resync = True
+            self.full_resync = True
+            self.refresh_all_services = True
+            self.last_full_resync = now
+            self.cache.services = {}
         # Only force resync if the agent thinks it is
         # synchronized and the resync timer has exired
         if (now - self.last_resync).seconds > \
@@ -428,9 +581,15 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
                 LOG.debug(
                     'Forcing resync of services on resync timer (%d seconds).'
                     % self.service_resync_interval)
-                self.cache.services = {}
                 self.last_resync = now
-                self.lbdriver.flush_cache()
+                if not self.incremental_sync or \
+                        (now - self.last_full_resync).seconds > \
+                        self.conf.service_full_resync_interval:
+                    LOG.debug('Forcing resync of all services.')
+                    self.full_resync = True
+                    self.last_full_resync = now
+                    self.cache.services = {}
+                    self.lbdriver.flush_cache()
         LOG.debug("tunnel_sync: periodic_resync need_resync: %s"
                   % str(self.needs_resync))
         # resync if we need to
@@ -445,18 +604,72 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
     def collect_stats(self, context):
         if not self.plugin_rpc:
             return
+        if not hasattr(self.lbdriver, 'get_stats_by_pool'):
+            self._collect_pool_stats()
+            return
+        services = []
+        for pool_id in self.cache.services.keys():
+            service = self.cache.services[pool_id]
+            if self.agent_host == service.agent_host:
+                services.append(service.get_stats_service())
+        if not services:
+            return
+        try:
+            start_time = time()
+            stats_by_pool = self.lbdriver.get_stats_by_pool(services)
+            if stats_by_pool is None:
+                return
+            LOG.debug('collected stats for %d of %d pools in %.5f secs'
+                      % (len(stats_by_pool), len(services),
+                         time() - start_time))
+            if stats_by_pool:
+                self._update_pools_stats(stats_by_pool)
+        except Exception as e:
+            LOG.exception(_('Error upating stats' + str(e.message)))
+            self.needs_resync = True
+
+    def _update_pools_stats(self, stats_by_pool):
+        """ Send collected stats to the plugin in batches """
+        if self.batch_pool_stats:
+            pool_ids = list(stats_by_pool.keys())
+            batch_size = constants.STATS_BATCH_SIZE
+            try:
+                for i in range(0, len(pool_ids), batch_size):
+                    batch = {}
+                    for pool_id in pool_ids[i:i + batch_size]:
+                        batch[pool_id] = stats_by_pool.pop(pool_id)
+                    self.plugin_rpc.update_pools_stats(batch)
+                return
+            except Exception as exc:
+                if getattr(exc, 'exc_type', None) not in \
+                        ['AttributeError', 'NoSuchMethod',
+                         'UnsupportedVersion']:
+                    raise
+                LOG.info(_('plugin does not support update_pools_stats, '
+                           'updating stats one pool at a time'))
+                self.batch_pool_stats = False
+                stats_by_pool.update(batch)
+        for pool_id in stats_by_pool:
+            self.plugin_rpc.update_pool_stats(pool_id,
+                                              stats_by_pool[pool_id])
+
+    def _collect_pool_stats(self):
+        """ Collect and send stats one pool at a time """
         pool_services = copy.deepcopy(self.cache.services)
-        for pool_id in pool_services:
+        pool_ids = [pool_id for pool_id in pool_services
+                    if self.agent_host == pool_services[pool_id].agent_host]
+        try:
+            services = self._get_services(pool_ids)
+        except Exception as e:
+            LOG.exception(_('Error upating stats' + str(e.message)))
+            self.needs_resync = True
+            return
+        for pool_id in pool_ids:
             service = pool_services[pool_id]
             if self.agent_host == service.agent_host:
                 try:
                     LOG.debug("collecting stats for pool %s" % service.pool_id)
-                    stats = self.lbdriver.get_stats(
-                        self.plugin_rpc.get_service_by_pool_id(
-                            service.pool_id,
-                            self.conf.f5_global_routed_mode
-                        )
-                    )
+                    stats = self.lbdriver.get_stats(services[pool_id])
                     if stats:
                         self.plugin_rpc.update_pool_stats(service.pool_id,
                                                           stats)
@@ -464,7 +677,7 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
                     LOG.exception(_('Error upating stats' + str(e.message)))
                     self.needs_resync = True
 
-    @periodic_task.periodic_task(spacing=600)
+    @periodic_task.periodic_task(spacing=60)
     def backup_configuration(self, context):
         self.lbdriver.backup_configuration()
 
@@ -475,6 +688,87 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
     def sync_state(self):
         if not self.plugin_rpc:
             return
+        if self.incremental_sync:
+            try:
+                self._sync_pools_state(full=self.full_resync,
+                                       refresh=self.refresh_all_services)
+                self.full_resync = False
+                # services which failed to sync are synced again
+                if not self.needs_resync:
+                    self.refresh_all_services = False
+                return False
+            except Exception as exc:
+                if getattr(exc, 'exc_type', None) not in \
+                        ['AttributeError', 'NoSuchMethod',
+                         'UnsupportedVersion']:
+                    LOG.exception(_('Unable to retrieve pools state'))
+                    return True
+                LOG.info(_('plugin does not support get_pools_state, '
+                           'refreshing all services on every resync'))
+                self.incremental_sync = False
+        resync = self._sync_all_services(
+            refresh=self.refresh_all_services)
+        if not resync and not self.needs_resync:
+            self.refresh_all_services = False
+        return resync
+
+    def _sync_pools_state(self, full=False, refresh=False):
+        """ Sync the services whose pool state changed since last time.
+
+            Services which fail to sync are left pending or in error
+            by the plugin, so the next sync retries them. With refresh
+            every service is synced, not only checked for.
+        """
+        start_time = time()
+        pools_state = self.plugin_rpc.get_pools_state()
+        all_pools = []
+        my_pools = {}
+        for pool in pools_state:
+            all_pools.append({'agent_host': pool['agent_host'],
+                              'pool_id': pool['pool_id'],
+                              'tenant_id': pool['tenant_id']})
+            if self.agent_host == pool['agent_host']:
+                my_pools[pool['pool_id']] = pool
+        known_services = set()
+        for service in self.cache.services:
+            if self.agent_host == self.cache.services[service].agent_host:
+                known_services.add(service)
+        # remove any pools in cache which Neutron plugin does
+        # not know about.
+        deleted_ids = known_services - set(my_pools)
+        for deleted_id in deleted_ids:
+            self.destroy_service(deleted_id)
+        changed_ids = []
+        for pool_id in my_pools:
+            pool = my_pools[pool_id]
+            service = self.cache.get_by_pool_id(pool_id)
+            if pool['pending'] or full or refresh or not service or \
+                    service.generation != pool['generation']:
+                changed_ids.append(pool_id)
+        services = self._get_services(changed_ids)
+        for pool_id in changed_ids:
+            pool = my_pools[pool_id]
+            if pool['pending'] or refresh:
+                self.refresh_service(pool_id, services[pool_id])
+            else:
+                self.validate_service(pool_id, services[pool_id])
+            service = self.cache.get_by_pool_id(pool_id)
+            if service:
+                service.generation = pool['generation']
+        # orphans are only left behind by pools which went away
+        if full or deleted_ids:
+            self.remove_orphans(all_pools)
+        LOG.debug(_('synced %d changed and %d deleted of %d pools '
+                    'in %.5f secs'
+                    % (len(changed_ids), len(deleted_ids), len(my_pools),
+                       time() - start_time)))
+
+    def _sync_all_services(self, refresh=False):
+        """ Sync all services, one plugin call per pool.
+
+            With refresh every active service is synced, not only
+            checked for.
+        """
         resync = False
         known_services = set()
         for service in self.cache.services:
@@ -498,7 +792,9 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
                 self.destroy_service(deleted_id)
             # validate each service we are supposed to know about
             for pool_id in active_pool_ids:
-                if not self.cache.get_by_pool_id(pool_id):
+                if refresh:
+                    self.refresh_service(pool_id)
+                elif not self.cache.get_by_pool_id(pool_id):
                     self.validate_service(pool_id)
             # this produces a list of pools with pending tasks
             # to be performed
@@ -528,15 +824,45 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
             resync = True
         return resync
 
+    def _get_services(self, pool_ids):
+        """ Get the services of many pools, a batch per plugin call """
+        services = {}
+        if self.batch_services:
+            batch_size = constants.SERVICES_BATCH_SIZE
+            try:
+                for i in range(0, len(pool_ids), batch_size):
+                    services.update(
+                        self.plugin_rpc.get_services_by_pool_ids(
+                            pool_ids[i:i + batch_size],
+                            self.conf.f5_global_routed_mode))
+                return services
+            except Exception as exc:
+                if getattr(exc, 'exc_type', None) not in \
+                        ['AttributeError', 'NoSuchMethod',
+                         'UnsupportedVersion']:
+                    raise
+                LOG.info(_('plugin does not support '
+                           'get_services_by_pool_ids, getting services '
+                           'one pool at a time'))
+                self.batch_services = False
+        for pool_id in pool_ids:
+            if pool_id not in services:
+                services[pool_id] = self.plugin_rpc.get_service_by_pool_id(
+                    pool_id,
+                    self.conf.f5_global_routed_mode
+                )
+        return services
+
     @log.log
-    def validate_service(self, pool_id):
+    def validate_service(self, pool_id, service=None):
         if not self.plugin_rpc:
             return
         try:
-            service = self.plugin_rpc.get_service_by_pool_id(
-                pool_id,
-                self.conf.f5_global_routed_mode
-            )
+            if service is None:
+                service = self.plugin_rpc.get_service_by_pool_id(
+                    pool_id,
+                    self.conf.f5_global_routed_mode
+                )
             self.cache.put(service, self.agent_host)
             if not self.lbdriver.exists(service):
                 LOG.error(_('active pool %s is not on BIG-IP.. syncing'
@@ -556,14 +882,15 @@ class LbaasAgentManagerBase(periodic_task.PeriodicTasks):
                                 str(e.message)), pool_id)
 
     @log.log
-    def refresh_service(self, pool_id):
+    def refresh_service(self, pool_id, service=None):
         if not self.plugin_rpc:
             return
         try:
-            service = self.plugin_rpc.get_service_by_pool_id(
-                pool_id,
-                self.conf.f5_global_routed_mode
-            )
+            if service is None:
+                service = self.plugin_rpc.get_service_by_pool_id(
+                    pool_id,
+                    self.conf.f5_global_routed_mode
+                )
             self.cache.put(service, self.agent_host)
             self.lbdriver.sync(service)
         except NeutronException as exc:
@@ -0,0 +1,103 @@
+""" Batches config-sync requests for a device group """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+from eventlet import event
+from eventlet import greenthread
+from time import time
+import sys
+
+LOG = logging.getLogger(__name__)
+
+
+class SyncCoordinator(object):
+    """ Runs one config-sync for many callers.
+
+        Callers ask for a sync after making their changes and wait
+        until a sync which started after they asked has finished.
+        Requests are collected for window seconds, and while a sync
+        runs, then all of them are served by the next sync. Each
+        caller gets the outcome of the sync which covered its changes,
+        including its exception if that sync failed.
+    """
+
+    def __init__(self, sync_method, window=0):
+        self.sync_method = sync_method
+        self.window = window
+        self.running = False
+        # list of (seq, event) tuples
+        self.waiters = []
+        self._next_seq = 0
+        self.stats = {'requests': 0,
+                      'syncs': 0,
+                      'failures': 0,
+                      'sync_time': 0.0,
+                      'max_sync_time': 0.0}
+
+    def sync(self):
+        """ Wait until a sync covers changes made before this call """
+        self._next_seq += 1
+        self.stats['requests'] += 1
+        done = event.Event()
+        self.waiters.append((self._next_seq, done))
+        if not self.running:
+            self.running = True
+            greenthread.spawn_n(self._run)
+        return done.wait()
+
+    def _run(self):
+        """ Sync until nobody is waiting """
+        try:
+            while self.waiters:
+                if self.window:
+                    greenthread.sleep(self.window)
+                # changes requested after this point may be
+                # too late for this sync and wait for the next
+                covered = self._next_seq
+                LOG.debug('syncing cluster for %d requests'
+                          % len(self.waiters))
+                start_time = time()
+                exc_info = None
+                try:
+                    result = self.sync_method()
+                except Exception:
+                    exc_info = sys.exc_info()
+                    self.stats['failures'] += 1
+                sync_time = time() - start_time
+                self.stats['syncs'] += 1
+                self.stats['sync_time'] += sync_time
+                self.stats['max_sync_time'] = max(
+                    self.stats['max_sync_time'], sync_time)
+
+                served = [waiter for waiter in self.waiters
+                          if waiter[0] <= covered]
+                self.waiters = [waiter for waiter in self.waiters
+                                if waiter[0] > covered]
+                for (seq, done) in served:
+                    if exc_info:
+                        done.send_exception(*exc_info)
+                    else:
+                        done.send(result)
+        finally:
+            self.running = False
+
+    def get_statistics(self):
+        """ Sync requests, syncs run and how long they took """
+        sync_stats = dict(self.stats)
+        sync_stats['waiting'] = len(self.waiters)
+        return sync_stats
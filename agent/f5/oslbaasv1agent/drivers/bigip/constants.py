@@ -16,6 +16,12 @@
 # Service resync interval
 RESYNC_INTERVAL = 300
 
+# Pools per update_pools_stats call
+STATS_BATCH_SIZE = 500
+
+# Pools per get_services_by_pool_ids call
+SERVICES_BATCH_SIZE = 100
+
 # Topic for tunnel notifications between the plugin and agent
 TUNNEL = 'tunnel'
 
@@ -16,3 +16,17 @@
 
 class InvalidNetworkType(Exception):
     pass
+
+
+class BigIPDeviceTimeout(Exception):
+    pass
+
+
+class BigIPDeviceFailures(Exception):
+    """ Work failed on one or more BIG-IP devices """
+    def __init__(self, failures):
+        self.failures = failures
+        message = 'failed on %d devices: ' % len(failures)
+        message += ', '.join(['%s: %s' % (device_name, failures[device_name])
+                              for device_name in sorted(failures)])
+        super(BigIPDeviceFailures, self).__init__(message)
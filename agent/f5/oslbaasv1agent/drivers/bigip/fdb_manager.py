@@ -0,0 +1,169 @@
+""" Coalesces L2 population fdb changes for tunnels """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+from eventlet import greenthread
+from time import time
+
+LOG = logging.getLogger(__name__)
+
+
+class FDBManager(object):
+    """ Applies bursts of fdb add and remove RPCs as one change.
+
+        Entries are collected for window seconds, and while changes
+        are being applied, keyed by network and mac address so the
+        last add or remove of a mac wins. The collected changes are
+        then applied with one apply_method(changes) call, where
+        changes is:
+
+        {'<network_id>':
+            {'network_type': <type>,
+             'segment_id': <int>,
+             'add': {'<mac_address>': ('<vtep>', '<ip_address>')},
+             'remove': {'<mac_address>': ('<vtep>', '<ip_address>')}}}
+
+        RPC callers do not wait for the changes to be applied. Changes
+        which fail to apply are queued again, unless a newer change
+        for the same mac address came in meanwhile, and are dropped
+        after max_attempts.
+    """
+
+    def __init__(self, apply_method, window=0, max_attempts=3,
+                 retry_delay=5):
+        self.apply_method = apply_method
+        self.window = window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.running = False
+        # network_id -> {'network_type', 'segment_id', 'records'},
+        # records are mac -> (operation, vtep, ip_address, attempts)
+        self.pending = {}
+        self.stats = {'requests': 0,
+                      'entries': 0,
+                      'updates': 0,
+                      'failures': 0,
+                      'dropped': 0,
+                      'update_time': 0.0,
+                      'max_update_time': 0.0}
+
+    def add(self, fdb):
+        """ Add records for the mac addresses in an fdb """
+        self._collect(fdb, 'add')
+
+    def remove(self, fdb):
+        """ Remove records for the mac addresses in an fdb """
+        self._collect(fdb, 'remove')
+
+    def _collect(self, fdb, operation):
+        """ Merge an fdb into the pending changes """
+        self.stats['requests'] += 1
+        for network_id in fdb:
+            net_fdb = fdb[network_id]
+            if net_fdb.get('network_type') not in ['vxlan', 'gre']:
+                continue
+            pending_net = self.pending.setdefault(
+                network_id, {'network_type': net_fdb['network_type'],
+                             'segment_id': net_fdb['segment_id'],
+                             'records': {}})
+            for vtep in net_fdb['ports']:
+                for mac_ip in net_fdb['ports'][vtep]:
+                    pending_net['records'][mac_ip[0]] = \
+                        (operation, vtep, mac_ip[1], 0)
+                    self.stats['entries'] += 1
+        if self.pending and not self.running:
+            self.running = True
+            greenthread.spawn_n(self._run)
+
+    def _take_changes(self):
+        """ Pending records split into adds and removes, and the
+            records taken """
+        changes = {}
+        for network_id in self.pending:
+            pending_net = self.pending[network_id]
+            net_changes = {'network_type': pending_net['network_type'],
+                           'segment_id': pending_net['segment_id'],
+                           'add': {},
+                           'remove': {}}
+            records = pending_net['records']
+            for mac in records:
+                (operation, vtep, ip_address, attempts) = records[mac]
+                net_changes[operation][mac] = (vtep, ip_address)
+            changes[network_id] = net_changes
+        taken = self.pending
+        self.pending = {}
+        return (changes, taken)
+
+    def _requeue(self, taken):
+        """ Queue records which failed to apply again """
+        for network_id in taken:
+            taken_net = taken[network_id]
+            pending_net = self.pending.setdefault(
+                network_id, {'network_type': taken_net['network_type'],
+                             'segment_id': taken_net['segment_id'],
+                             'records': {}})
+            for mac in taken_net['records']:
+                (operation, vtep, ip_address, attempts) = \
+                    taken_net['records'][mac]
+                if mac in pending_net['records']:
+                    # a newer change for the mac replaces this one
+                    continue
+                if attempts + 1 >= self.max_attempts:
+                    self.stats['dropped'] += 1
+                    LOG.error('dropping fdb %s of %s on network %s after '
+                              '%d attempts' % (operation, mac, network_id,
+                                               attempts + 1))
+                    continue
+                pending_net['records'][mac] = \
+                    (operation, vtep, ip_address, attempts + 1)
+            if not pending_net['records']:
+                del self.pending[network_id]
+
+    def _run(self):
+        """ Apply changes until none are pending """
+        try:
+            while self.pending:
+                if self.window:
+                    greenthread.sleep(self.window)
+                (changes, taken) = self._take_changes()
+                LOG.debug('applying fdb changes for %d networks'
+                          % len(changes))
+                start_time = time()
+                failed = False
+                try:
+                    self.apply_method(changes)
+                except Exception as exc:
+                    failed = True
+                    self.stats['failures'] += 1
+                    LOG.error('applying fdb changes failed: %s' % str(exc))
+                    self._requeue(taken)
+                update_time = time() - start_time
+                self.stats['updates'] += 1
+                self.stats['update_time'] += update_time
+                self.stats['max_update_time'] = max(
+                    self.stats['max_update_time'], update_time)
+                if failed and self.pending:
+                    greenthread.sleep(self.retry_delay)
+        finally:
+            self.running = False
+
+    def get_statistics(self):
+        """ Fdb requests, updates applied and how long they took """
+        fdb_stats = dict(self.stats)
+        fdb_stats['pending'] = len(self.pending)
+        return fdb_stats
@@ -45,14 +45,21 @@ from f5.oslbaasv1agent.drivers.bigip.lbaas_bigip \
     import LBaaSBuilderBigipObjects, LBaaSBuilderBigipIApp
 from f5.oslbaasv1agent.drivers.bigip.lbaas_bigiq import LBaaSBuilderBigiqIApp
 from f5.oslbaasv1agent.drivers.bigip.utils import serialized
+from f5.oslbaasv1agent.drivers.bigip.cluster_sync import SyncCoordinator
+from f5.oslbaasv1agent.drivers.bigip.fdb_manager import FDBManager
+from f5.oslbaasv1agent.drivers.bigip import exceptions as f5agentex
 
 from f5.bigip import bigip as f5_bigip
 from f5.common import constants as f5const
 from f5.bigip import exceptions as f5ex
 from f5.bigip import interfaces as bigip_interfaces
-from f5.bigip.interfaces import strip_domain_address
+from f5.bigip.interfaces import split_addr_route_domain
 
 from eventlet import greenthread
+from eventlet import greenpool
+from eventlet import timeout as eventlet_timeout
+import six
+import sys
 import uuid
 import urllib2
 import datetime
@@ -63,6 +70,8 @@ import logging as std_logging
 LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qlbaas-'
 __VERSION__ = '0.1.1'
+# longest a change waits to be saved while other changes keep coming
+CONFIG_SAVE_MAX_DELAY = 600
 
 # plugin_const.CREATED added in juno.  PLUGIN_CREATED_FLAG is used for
 # backward compatibility
@@ -137,6 +146,17 @@ OPTS = [
         'sync_mode', default='replication',
         help=_('The sync mechanism: autosync or replication'),
     ),
+    cfg.FloatOpt(
+        'f5_sync_window', default=0.5,
+        help=_('Seconds to collect config-sync requests for before'
+               ' syncing the device group once for all of them.'
+               ' Only used with more than one service worker'),
+    ),
+    cfg.FloatOpt(
+        'f5_fdb_window', default=0.5,
+        help=_('Seconds to collect L2 population fdb changes for before'
+               ' updating each tunnel once for all of them'),
+    ),
     cfg.StrOpt(
         'f5_sync_mode', default='replication',
         help=_('The sync mechanism: autosync or replication'),
@@ -217,6 +237,22 @@ OPTS = [
         'icontrol_connection_retry_interval', default=10,
         help=_('How many seconds to wait between retry connection attempts'),
     ),
+    cfg.IntOpt(
+        'icontrol_connection_pool_size', default=10,
+        help=_('How many iControl REST connections to keep open'
+               ' to each BIG-IP'),
+    ),
+    cfg.StrOpt(
+        'icontrol_wsdl_cache_dir',
+        default='/var/lib/neutron/f5-oslbaasv1-agent/wsdl',
+        help=_('Directory to cache parsed iControl WSDLs in,'
+               ' per TMOS version. Empty to disable.'),
+    ),
+    cfg.IntOpt(
+        'icontrol_object_cache_timeout', default=120,
+        help=_('Seconds to remember which objects exist on a BIG-IP.'
+               ' 0 to disable.'),
+    ),
     cfg.DictOpt(
         'common_network_ids', default={},
         help=_('network uuid to existing Common networks mapping')
@@ -230,6 +266,27 @@ OPTS = [
         help=_('How many routing tables the BIG-IP will allocate per tenant'
                ' in order to accommodate overlapping IP subnets'),
     ),
+    cfg.StrOpt(
+        'f5_route_domain_cache_file',
+        default='/var/lib/neutron/f5-oslbaasv1-agent/route_domains.json',
+        help=_('File to keep the tenant route domain, network and subnet'
+               ' map in across restarts. Empty to disable.'),
+    ),
+    cfg.IntOpt(
+        'f5_service_workers', default=1,
+        help=_('How many service requests for different pools can be'
+               ' provisioned concurrently'),
+    ),
+    cfg.IntOpt(
+        'f5_config_save_delay', default=60,
+        help=_('Seconds without changes to wait before saving the'
+               ' configuration of changed BIG-IPs'),
+    ),
+    cfg.IntOpt(
+        'f5_device_timeout', default=300,
+        help=_('Seconds each BIG-IP is given to connect, or to finish'
+               ' its part of a provisioning step. 0 disables the timeout'),
+    ),
 ]
 
 
@@ -272,6 +329,10 @@ class iControlDriver(LBaaSBaseDriver):
         # BIG-IP containers
         self.__bigips = {}
         self.__traffic_groups = []
+        # devices which could not be connected are retried in the
+        # background, and the agent resyncs services once they are
+        self.bigip_retry_running = False
+        self.bigips_added = False
 
         if self.conf.f5_global_routed_mode:
             LOG.info(_('WARNING - f5_global_routed_mode enabled.'
@@ -306,6 +367,18 @@ class iControlDriver(LBaaSBaseDriver):
 
         self.agent_configurations['device_drivers'] = [self.driver_name]
 
+        self.service_queue.resize(self.conf.f5_service_workers)
+        # with one worker nobody else can ask for a sync while
+        # waiting, so there is nothing to batch
+        if self.conf.f5_service_workers > 1:
+            sync_window = self.conf.f5_sync_window
+        else:
+            sync_window = 0
+        self.sync_coordinator = SyncCoordinator(self._sync_cluster,
+                                                sync_window)
+        self.fdb_manager = FDBManager(self._apply_fdb_changes,
+                                      self.conf.f5_fdb_window)
+
         self._init_bigip_hostnames()
 
         self.vcmp_manager = None
@@ -319,6 +392,12 @@ class iControlDriver(LBaaSBaseDriver):
         self.lbaas_builder_bigip_objects = None
         self.lbaas_builder_bigiq_iapp = None
 
+        # bumped by every change made to the devices. Each device
+        # records the generation it last saved.
+        self.config_generation = 0
+        self.config_changed = None
+        self.config_dirty_since = None
+
         self._init_bigip_managers()
         self.connect_bigips()
 
@@ -330,12 +409,67 @@ class iControlDriver(LBaaSBaseDriver):
     def connect_bigips(self):
         """ Connect big-ips """
         self._init_bigips()
+        self._config_changed()
         if self.conf.f5_global_routed_mode:
             local_ips = []
         else:
             local_ips = self.network_builder.initialize_tunneling()
+            if self.conf.use_namespaces:
+                self.network_builder.load_rds_cache()
         self._init_agent_config(local_ips)
 
+    def _start_bigip_retry(self, device_group_name):
+        """ Keep connecting the missing big-ips in the background """
+        if self.bigip_retry_running:
+            return
+        self.bigip_retry_running = True
+        greenthread.spawn_n(self._retry_bigips, device_group_name)
+
+    def _retry_bigips(self, device_group_name):
+        """ Connect the big-ips which could not be, until all are """
+        try:
+            while True:
+                greenthread.sleep(self.conf.icontrol_connection_retry_interval)
+                missing = [hostname for hostname in self.hostnames
+                           if hostname not in self.__bigips]
+                if not missing:
+                    break
+                # connecting can take long, so it is done before
+                # waiting for the service requests in flight
+                bigips = {}
+                unreachable = self._connect_bigips(
+                    missing, device_group_name, bigips)
+                if bigips:
+                    self._add_bigips(bigips)
+                if not unreachable:
+                    LOG.info(_('Connected to all %d BIG-IPs'
+                               % len(self.__bigips)))
+                    break
+        except Exception as exc:
+            LOG.exception(_('Retrying BIG-IP connections failed: %s'
+                            % str(exc)))
+        finally:
+            self.bigip_retry_running = False
+
+    @serialized('add_bigips')
+    def _add_bigips(self, bigips):
+        """ Provision with newly connected big-ips.
+
+            Runs with no other request in flight, since service
+            requests use the big-ips and the tunnels set up here.
+        """
+        self.__bigips.update(bigips)
+        # the new devices have none of the services yet
+        self.bigips_added = True
+        try:
+            if self.conf.f5_global_routed_mode:
+                local_ips = []
+            else:
+                local_ips = self.network_builder.initialize_tunneling()
+            self._init_agent_config(local_ips)
+        finally:
+            self._config_changed()
+
     def post_init(self):
         """ Run and Post Initialization Tasks """
         # run any post initialized tasks, now that the agent
@@ -465,20 +599,36 @@ class iControlDriver(LBaaSBaseDriver):
                 f5const.CONNECTION_TIMEOUT = \
                     self.conf.icontrol_connection_timeout
 
-            first_bigip = self._open_bigip(self.hostnames[0])
-            self._init_bigip(first_bigip, self.hostnames[0], None)
-            self.__bigips[self.hostnames[0]] = first_bigip
+            start_time = time()
+            # devices connected by an earlier attempt are kept
+            first_hostname = self.hostnames[0]
+            if first_hostname in self.__bigips:
+                first_bigip = self.__bigips[first_hostname]
+            else:
+                first_bigip = self._connect_bigip(first_hostname, None)
+                self.__bigips[first_hostname] = first_bigip
 
+            ha_start_time = time()
             device_group_name = self._validate_ha(first_bigip)
             self._init_traffic_groups(first_bigip)
-
-            # connect to the rest of the devices
-            for hostname in self.hostnames[1:]:
-                bigip = self._open_bigip(hostname)
-                self._init_bigip(bigip, hostname, device_group_name)
-                self.__bigips[hostname] = bigip
-
+            LOG.debug('validated HA on %s in %.5f secs'
+                      % (first_hostname, time() - ha_start_time))
+
+            # the first device told us which device group the rest
+            # must be in, so they can all be connected at once
+            unreachable = self._connect_bigips(
+                [hostname for hostname in self.hostnames[1:]
+                 if hostname not in self.__bigips],
+                device_group_name, self.__bigips)
+
+            # the first device and the device group are enough to
+            # provision, the others are connected when they can be
             self.connected = True
+            if unreachable:
+                self._start_bigip_retry(device_group_name)
+            LOG.info(_('Connected to %d of %d BIG-IPs in %.5f secs'
+                       % (len(self.__bigips), len(self.hostnames),
+                          time() - start_time)))
 
         except NeutronException as exc:
             LOG.error(_('Could not communicate with all ' +
@@ -491,13 +641,103 @@ class iControlDriver(LBaaSBaseDriver):
             greenthread.sleep(5)
             raise
 
+    def _connect_bigips(self, hostnames, device_group_name, bigips):
+        """ Open and prepare several big-ips concurrently.
+
+            Devices which connect are added to bigips even if others
+            fail, so a later attempt only has to connect the ones that
+            did not.
+            The devices which failed are returned, and reported in the
+            agent configurations until they connect.
+        """
+        if not hostnames:
+            self.agent_configurations.pop('icontrol_endpoints_unreachable',
+                                          None)
+            return []
+        pool = greenpool.GreenPool(len(hostnames))
+        threads = {}
+        for hostname in hostnames:
+            threads[hostname] = pool.spawn(
+                self._connect_bigip, hostname, device_group_name)
+        failures = []
+        for hostname in threads:
+            try:
+                bigips[hostname] = threads[hostname].wait()
+            except Exception as exc:
+                LOG.exception(_('Could not connect to %s: %s'
+                                % (hostname, str(exc))))
+                failures.append(hostname)
+        failures.sort()
+        if failures:
+            self.agent_configurations['icontrol_endpoints_unreachable'] = \
+                failures
+            LOG.error(_('Connected to %d of %d BIG-IPs, not connected: %s'
+                        % (len(self.hostnames) - len(failures),
+                           len(self.hostnames),
+                           ', '.join(failures))))
+        else:
+            self.agent_configurations.pop('icontrol_endpoints_unreachable',
+                                          None)
+        return failures
+
+    def _connect_bigip(self, hostname, device_group_name):
+        """ Open and prepare one big-ip within the device timeout """
+        device_timeout = self.conf.f5_device_timeout
+        if device_timeout > 0:
+            timer = eventlet_timeout.Timeout(
+                device_timeout,
+                f5agentex.BigIPDeviceTimeout(
+                    'connecting to %s did not finish within %d seconds'
+                    % (hostname, device_timeout)))
+        else:
+            timer = None
+        try:
+            start_time = time()
+            bigip = self._open_bigip(hostname)
+            open_time = time() - start_time
+            start_time = time()
+            self._init_bigip(bigip, hostname, device_group_name)
+            LOG.debug('connected to %s: open %.5f secs, init %.5f secs'
+                      % (hostname, open_time, time() - start_time))
+            return bigip
+        finally:
+            if timer:
+                timer.cancel()
+
     def _open_bigip(self, hostname):
         """ Open bigip connection """
         LOG.info(_('Opening iControl connection to %s @ %s' %
                    (self.conf.icontrol_username, hostname)))
         return f5_bigip.BigIP(hostname, self.conf.icontrol_username,
                               self.conf.icontrol_password,
-                              f5const.CONNECTION_TIMEOUT)
+                              f5const.CONNECTION_TIMEOUT,
+                              self.conf.icontrol_connection_pool_size,
+                              self.conf.icontrol_wsdl_cache_dir,
+                              self.conf.icontrol_object_cache_timeout)
+
+    def get_icr_statistics(self):
+        """ iControl REST connection reuse counters per big-ip """
+        icr_stats = {}
+        for hostname in self.__bigips:
+            icr_stats[hostname] = \
+                self.__bigips[hostname].get_icr_statistics()
+        return icr_stats
+
+    def get_folder_statistics(self):
+        """ iControl SOAP folder switches made and avoided per big-ip """
+        folder_stats = {}
+        for hostname in self.__bigips:
+            folder_stats[hostname] = \
+                self.__bigips[hostname].get_folder_statistics()
+        return folder_stats
+
+    def get_object_cache_statistics(self):
+        """ Object existence cache hits and misses per big-ip """
+        cache_stats = {}
+        for hostname in self.__bigips:
+            cache_stats[hostname] = \
+                self.__bigips[hostname].get_object_cache_statistics()
+        return cache_stats
 
     def _init_bigip(self, bigip, hostname, check_group_name=None):
         """ Prepare a bigip for usage """
@@ -552,6 +792,8 @@ class iControlDriver(LBaaSBaseDriver):
         bigip.assured_networks = []
         bigip.assured_tenant_snat_subnets = {}
         bigip.assured_gateway_subnets = []
+        bigip.tunnel_directory = None
+        bigip.saved_config_generation = 0
 
         if self.conf.f5_ha_type != 'standalone':
             if self.conf.f5_sync_mode == 'autosync':
@@ -692,6 +934,8 @@ class iControlDriver(LBaaSBaseDriver):
             bigip.assured_networks = []
             bigip.assured_tenant_snat_subnets = {}
             bigip.assured_gateway_subnets = []
+            bigip.tunnel_directory = None
+            bigip.object_cache.clear()
 
     # pylint: disable=unused-argument
     @serialized('create_vip')
@@ -803,11 +1047,7 @@ class iControlDriver(LBaaSBaseDriver):
         """Get service stats"""
         # use pool stats because the pool_id is the
         # the service definition...
-        stats = {}
-        stats[lb_const.STATS_IN_BYTES] = 0
-        stats[lb_const.STATS_OUT_BYTES] = 0
-        stats[lb_const.STATS_ACTIVE_CONNECTIONS] = 0
-        stats[lb_const.STATS_TOTAL_CONNECTIONS] = 0
+        stats = self._new_pool_stats()
         # add a members stats return dictionary
         members = {}
         for hostbigip in self.get_all_bigips():
@@ -824,85 +1064,153 @@ class iControlDriver(LBaaSBaseDriver):
                 folder=pool['tenant_id'],
                 config_mode=self.conf.icontrol_config_mode)
             if 'STATISTIC_SERVER_SIDE_BYTES_IN' in pool_stats:
-                stats[lb_const.STATS_IN_BYTES] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_BYTES_IN']
-                stats[lb_const.STATS_OUT_BYTES] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_BYTES_OUT']
-                stats[lb_const.STATS_ACTIVE_CONNECTIONS] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS']
-                stats[lb_const.STATS_TOTAL_CONNECTIONS] += \
-                    pool_stats['STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS']
-                # are there members to update status
-                if 'members' in service:
-                    # only query BIG-IP pool members if they
-                    # not in a state indicating provisioning or error
-                    # provisioning the pool member
-                    some_members_require_status_update = False
-                    update_if_status = [plugin_const.ACTIVE,
-                                        plugin_const.DOWN,
-                                        plugin_const.INACTIVE]
-                    if PLUGIN_CREATED_FLAG not in update_if_status:
-                        update_if_status.append(PLUGIN_CREATED_FLAG)
-
-                    for member in service['members']:
-                        if member['status'] in update_if_status:
-                            some_members_require_status_update = True
-                    # are we have members who are in a
-                    # state to update there status
-                    if some_members_require_status_update:
-                        # query pool members on each BIG-IP
-                        monitor_states = \
-                            hostbigip.pool.get_members_monitor_status(
-                                name=pool['id'],
-                                folder=pool['tenant_id'],
-                                config_mode=self.conf.icontrol_config_mode
-                            )
-                        for member in service['members']:
-                            if member['status'] in update_if_status:
-                                # create the entry for this
-                                # member in the return status
-                                # dictionary set to ACTIVE
-                                if not member['id'] in members:
-                                    members[member['id']] = \
-                                        {'status': plugin_const.INACTIVE}
-                                # check if it down or up by monitor
-                                # and update the status
-                                for state in monitor_states:
-                                    # matched the pool member
-                                    # by address and port number
-                                    if member['address'] == \
-                                            strip_domain_address(
-                                            state['addr']) and \
-                                            int(member['protocol_port']) == \
-                                            int(state['port']):
-                                        # if the monitor says member is up
-                                        if state['state'] == \
-                                                'MONITOR_STATUS_UP' or \
-                                           state['state'] == \
-                                                'MONITOR_STATUS_UNCHECKED':
-                                            # set ACTIVE as long as the
-                                            # status was not set to 'DOWN'
-                                            # on another BIG-IP
-                                            if members[
-                                                member['id']]['status'] != \
-                                                    'DOWN':
-                                                if member['admin_state_up']:
-                                                    members[member['id']][
-                                                        'status'] = \
-                                                        plugin_const.ACTIVE
-                                                else:
-                                                    members[member['id']][
-                                                        'status'] = \
-                                                        plugin_const.INACTIVE
-                                        else:
-                                            members[member['id']]['status'] = \
-                                                plugin_const.DOWN
+                self._add_pool_stats(stats, pool_stats)
+                # only query BIG-IP pool members if they
+                # not in a state indicating provisioning or error
+                # provisioning the pool member
+                if self._get_status_members(service):
+                    # query pool members on each BIG-IP
+                    monitor_states = \
+                        hostbigip.pool.get_members_monitor_status(
+                            name=pool['id'],
+                            folder=pool['tenant_id'],
+                            config_mode=self.conf.icontrol_config_mode
+                        )
+                    self._add_members_status(service, monitor_states,
+                                             members)
         stats['members'] = members
         return stats
 
+    @is_connected
+    def get_stats_by_pool(self, services):
+        """ Get stats for many services, keyed by pool id.
+
+            Each big-ip is asked once for the statistics and member
+            monitor states of all of its pools, rather than once per
+            pool. Pools which are missing on any big-ip are left out.
+        """
+        services_by_key = {}
+        for service in services:
+            if not service or not service.get('pool'):
+                continue
+            pool = service['pool']
+            key = (bigip_interfaces.prefixed(pool['tenant_id']),
+                   bigip_interfaces.prefixed(pool['id']))
+            services_by_key[key] = service
+        if not services_by_key:
+            return {}
+        need_status = False
+        for service in services_by_key.values():
+            if self._get_status_members(service):
+                need_status = True
+                break
+
+        bigip_stats = self.run_on_bigips(
+            self.get_all_bigips(), self._get_bigip_all_stats, need_status)
+
+        stats_by_pool = {}
+        for key in services_by_key:
+            service = services_by_key[key]
+            stats = self._new_pool_stats()
+            members = {}
+            for device_name in bigip_stats:
+                (all_stats, all_states) = bigip_stats[device_name]
+                if key not in all_stats:
+                    stats = None
+                    break
+                pool_stats = all_stats[key]
+                if 'STATISTIC_SERVER_SIDE_BYTES_IN' not in pool_stats:
+                    continue
+                self._add_pool_stats(stats, pool_stats)
+                if key in all_states and \
+                        self._get_status_members(service):
+                    self._add_members_status(service, all_states[key],
+                                             members)
+            if stats is None:
+                continue
+            stats['members'] = members
+            stats_by_pool[service['pool']['id']] = stats
+        return stats_by_pool
+
+    def _get_bigip_all_stats(self, bigip, need_status):
+        """ Pool statistics and member monitor states from a big-ip """
+        all_stats = bigip.pool.get_all_statistics()
+        all_states = {}
+        if need_status:
+            all_states = bigip.pool.get_all_members_monitor_status()
+        return (all_stats, all_states)
+
+    @staticmethod
+    def _new_pool_stats():
+        """ Empty neutron pool stats """
+        stats = {}
+        stats[lb_const.STATS_IN_BYTES] = 0
+        stats[lb_const.STATS_OUT_BYTES] = 0
+        stats[lb_const.STATS_ACTIVE_CONNECTIONS] = 0
+        stats[lb_const.STATS_TOTAL_CONNECTIONS] = 0
+        return stats
+
+    @staticmethod
+    def _add_pool_stats(stats, pool_stats):
+        """ Add one big-ip's pool statistics to the neutron stats """
+        stats[lb_const.STATS_IN_BYTES] += \
+            pool_stats['STATISTIC_SERVER_SIDE_BYTES_IN']
+        stats[lb_const.STATS_OUT_BYTES] += \
+            pool_stats['STATISTIC_SERVER_SIDE_BYTES_OUT']
+        stats[lb_const.STATS_ACTIVE_CONNECTIONS] += \
+            pool_stats['STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS']
+        stats[lb_const.STATS_TOTAL_CONNECTIONS] += \
+            pool_stats['STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS']
+
+    @staticmethod
+    def _get_status_members(service):
+        """ Members whose status the monitor states may update """
+        update_if_status = [plugin_const.ACTIVE,
+                            plugin_const.DOWN,
+                            plugin_const.INACTIVE]
+        if PLUGIN_CREATED_FLAG not in update_if_status:
+            update_if_status.append(PLUGIN_CREATED_FLAG)
+        status_members = []
+        for member in service.get('members', []):
+            if member['status'] in update_if_status:
+                status_members.append(member)
+        return status_members
+
+    def _add_members_status(self, service, monitor_states, members):
+        """ Fold one big-ip's member monitor states into members """
+        states = {}
+        for state in monitor_states:
+            (addr, rd) = split_addr_route_domain(state['addr'])
+            states[(addr, int(state['port']))] = state['state']
+        for member in self._get_status_members(service):
+            # create the entry for this member in the return
+            # status dictionary set to INACTIVE
+            if not member['id'] in members:
+                members[member['id']] = {'status': plugin_const.INACTIVE}
+            # matched the pool member by address and port number
+            (addr, rd) = split_addr_route_domain(member['address'])
+            key = (addr, int(member['protocol_port']))
+            if key not in states:
+                continue
+            # if the monitor says member is up
+            if states[key] == 'MONITOR_STATUS_UP' or \
+                    states[key] == 'MONITOR_STATUS_UNCHECKED':
+                # set ACTIVE as long as the status was
+                # not set to 'DOWN' on another BIG-IP
+                if members[member['id']]['status'] != 'DOWN':
+                    if member['admin_state_up']:
+                        members[member['id']]['status'] = \
+                            plugin_const.ACTIVE
+                    else:
+                        members[member['id']]['status'] = \
+                            plugin_const.INACTIVE
+            else:
+                members[member['id']]['status'] = plugin_const.DOWN
+
     @serialized('remove_orphans')
     def remove_orphans(self, all_pools):
         """ Remove out-of-date configuration on big-ips """
+        self._config_changed()
         existing_tenants = []
         existing_pools = []
         for pool in all_pools:
@@ -925,20 +1233,32 @@ class iControlDriver(LBaaSBaseDriver):
     def fdb_add(self, fdb):
         """ Add (L2toL3) forwarding database entries """
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.bigip_l2_manager.add_bigip_fdb(bigip, fdb)
+        self.fdb_manager.add(fdb)
 
     def fdb_remove(self, fdb):
         """ Remove (L2toL3) forwarding database entries """
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.bigip_l2_manager.remove_bigip_fdb(bigip, fdb)
+        self.fdb_manager.remove(fdb)
 
     def fdb_update(self, fdb):
         """ Update (L2toL3) forwarding database entries """
         self.remove_ips_from_fdb_update(fdb)
-        for bigip in self.get_all_bigips():
-            self.bigip_l2_manager.update_bigip_fdb(bigip, fdb)
+        self.fdb_manager.add(fdb)
+
+    def _apply_fdb_changes(self, changes):
+        """ Apply fdb changes collected by the fdb manager """
+        try:
+            self.run_on_bigips(self.get_all_bigips(),
+                               self.bigip_l2_manager.apply_bigip_fdb_changes,
+                               changes)
+        finally:
+            # only once written, so a save in between cannot
+            # record the changes as saved
+            self._config_changed()
+
+    def get_fdb_statistics(self):
+        """ Fdb requests and the tunnel updates which served them """
+        return self.fdb_manager.get_statistics()
 
     # remove ips from fdb update so we do not try to
     # add static arps for them because we do not have
@@ -986,14 +1306,54 @@ class iControlDriver(LBaaSBaseDriver):
         else:
             LOG.debug("Attempted sync of deleted pool")
 
+    def backup_configuration(self):
+        """ Save Configuration on Devices changed since their last save.
+
+            Changes are saved once none have been made for
+            f5_config_save_delay seconds, or CONFIG_SAVE_MAX_DELAY
+            seconds after the first unsaved change at the latest.
+            Nothing is queued when there is nothing to save, since
+            saving has to wait for all other requests to finish.
+        """
+        if self.network_builder and self.conf.use_namespaces:
+            self.network_builder.save_rds_cache()
+        if self.connected and not self._config_save_due():
+            return
+        self._save_configuration()
+
+    def _config_changed(self):
+        """ Record a change to the device configurations """
+        self.config_generation += 1
+        self.config_changed = time()
+        if self.config_dirty_since is None:
+            self.config_dirty_since = self.config_changed
+
+    def _config_save_due(self):
+        """ Are there changes to save, and have they settled? """
+        if self.config_dirty_since is None:
+            return False
+        now = time()
+        if now - self.config_changed >= self.conf.f5_config_save_delay:
+            return True
+        return now - self.config_dirty_since >= CONFIG_SAVE_MAX_DELAY
+
     @serialized('backup_configuration')
     @is_connected
-    def backup_configuration(self):
-        """ Save Configuration on Devices """
+    def _save_configuration(self):
+        """ Save changed devices, one after the other """
+        generation = self.config_generation
         for bigip in self.get_all_bigips():
+            if bigip.saved_config_generation >= generation:
+                continue
+            start_time = time()
             LOG.debug(_('_backup_configuration: saving device %s.'
                         % bigip.icontrol.hostname))
             bigip.cluster.save_config()
+            bigip.saved_config_generation = generation
+            LOG.debug(_('_backup_configuration: saved device %s in %.5f secs'
+                        % (bigip.icontrol.hostname, time() - start_time)))
+        if generation == self.config_generation:
+            self.config_dirty_since = None
 
     def _service_exists(self, service):
         """ Returns whether the bigip has a pool for the service """
@@ -1016,11 +1376,22 @@ class iControlDriver(LBaaSBaseDriver):
 
     def _common_service_handler(self, service):
         """ Assure that the service is configured on bigip(s) """
-        start_time = time()
-
         if not service['pool']:
             LOG.error("_common_service_handler: Service pool is None")
             return
+        try:
+            self._assure_service(service)
+        finally:
+            # once written, so the next save includes the changes
+            self._config_changed()
+
+        start_time = time()
+        self.sync_if_clustered()
+        LOG.debug("    final sync took %.5f secs" % (time() - start_time))
+
+    def _assure_service(self, service):
+        """ Configure the service on the bigip(s) or bigiq """
+        start_time = time()
 
         # Here we look to see if the tenant has big-ips and
         # so we should use bigiq (if enabled) or fall back
@@ -1092,10 +1463,6 @@ class iControlDriver(LBaaSBaseDriver):
 
         self._update_service_status(service)
 
-        start_time = time()
-        self.sync_if_clustered()
-        LOG.debug("    final sync took %.5f secs" % (time() - start_time))
-
     def _update_service_status(self, service):
         """ Update status of objects in OpenStack """
 
@@ -1270,6 +1637,72 @@ class iControlDriver(LBaaSBaseDriver):
         else:
             return [self.get_bigip()]
 
+    def run_on_config_bigips(self, method, *args, **kwargs):
+        """ Run method(bigip, *args, **kwargs) for each big-ip
+            returned by get_config_bigips. """
+        return self.run_on_bigips(self.get_config_bigips(),
+                                  method, *args, **kwargs)
+
+    def run_on_bigips(self, bigips, method, *args, **kwargs):
+        """ Run method(bigip, *args, **kwargs) for each big-ip,
+            concurrently when there is more than one, and return
+            the results keyed by device name.
+
+            Every device is allowed to finish even if another one
+            fails. A single failure is re-raised as is. Failures on
+            several devices are raised together as BigIPDeviceFailures.
+        """
+        bigips = list(bigips)
+        if len(bigips) == 1:
+            bigip = bigips[0]
+            return {bigip.device_name:
+                    self._run_on_bigip(bigip, method, args, kwargs)}
+
+        pool = greenpool.GreenPool(max(len(bigips), 1))
+        threads = {}
+        for bigip in bigips:
+            threads[bigip.device_name] = pool.spawn(
+                self._run_on_bigip, bigip, method, args, kwargs)
+        results = {}
+        failures = {}
+        # the traceback of each failure, from inside its greenthread
+        exc_infos = {}
+        for device_name in threads:
+            try:
+                results[device_name] = threads[device_name].wait()
+            except Exception as exc:
+                LOG.error('%s failed on %s: %s'
+                          % (method.__name__, device_name, str(exc)))
+                failures[device_name] = exc
+                exc_infos[device_name] = sys.exc_info()
+        if len(failures) == 1:
+            six.reraise(*list(exc_infos.values())[0])
+        elif failures:
+            raise f5agentex.BigIPDeviceFailures(failures)
+        return results
+
+    def _run_on_bigip(self, bigip, method, args, kwargs):
+        """ Run method for one big-ip within the device timeout """
+        start_time = time()
+        device_timeout = self.conf.f5_device_timeout
+        if device_timeout > 0:
+            timer = eventlet_timeout.Timeout(
+                device_timeout,
+                f5agentex.BigIPDeviceTimeout(
+                    '%s did not finish on %s within %d seconds'
+                    % (method.__name__, bigip.device_name, device_timeout)))
+        else:
+            timer = None
+        try:
+            return method(bigip, *args, **kwargs)
+        finally:
+            if timer:
+                timer.cancel()
+            if time() - start_time > .001:
+                LOG.debug("    %s on %s took %.5f secs" %
+                          (method.__name__, bigip.device_name,
+                           time() - start_time))
+
     def get_inbound_throughput(self, bigip, global_statistics=None):
         if bigip:
             return bigip.stat.get_inbound_throughput(
@@ -1338,8 +1771,15 @@ class iControlDriver(LBaaSBaseDriver):
                 self.conf.f5_sync_mode == 'replication' or \
                 len(self.get_all_bigips()) < 2:
             return
-        bigip = self.get_bigip()
-        self._sync_with_retries(bigip)
+        self.sync_coordinator.sync()
+
+    def _sync_cluster(self):
+        """ sync device group, for everyone waiting on the coordinator """
+        self._sync_with_retries(self.get_bigip())
+
+    def get_sync_statistics(self):
+        """ Device group sync requests and the syncs which served them """
+        return self.sync_coordinator.get_statistics()
 
     def _sync_with_retries(self, bigip, force_now=False,
                            attempts=4, retry_delay=130):
@@ -264,6 +264,9 @@ class BigipL2Manager(object):
             description=network['id'],
             folder=network_folder,
             route_domain_id=network['route_domain_id'])
+        self._add_tunnel_to_directory(bigip, tunnel_name, network_folder,
+                                      network['provider:segmentation_id'],
+                                      '/Common/vxlan_ovs')
         if self.fdb_connector:
             self.fdb_connector.notify_vtep_added(network, bigip.local_ip)
 
@@ -286,10 +289,43 @@ class BigipL2Manager(object):
             description=network['id'],
             folder=network_folder,
             route_domain_id=network['route_domain_id'])
+        self._add_tunnel_to_directory(bigip, tunnel_name, network_folder,
+                                      network['provider:segmentation_id'],
+                                      '/Common/gre_ovs')
 
         if self.fdb_connector:
             self.fdb_connector.notify_vtep_added(network, bigip.local_ip)
 
+    def get_tunnel_folder(self, bigip, tunnel_name):
+        """ Folder of a tunnel on a bigip, or None if it does not exist.
+            Tunnels are looked up in a directory read once per device
+            and kept current as this agent creates and deletes them.
+        """
+        if bigip.tunnel_directory is None:
+            bigip.tunnel_directory = bigip.get_tunnel_directory()
+        tunnel = bigip.tunnel_directory.get(prefixed(tunnel_name))
+        if tunnel:
+            return tunnel['folder']
+        return None
+
+    @staticmethod
+    def _add_tunnel_to_directory(bigip, tunnel_name, folder, key, profile):
+        """ Record a tunnel created on a bigip """
+        if bigip.tunnel_directory is None:
+            return
+        folder = str(folder).replace('/', '')
+        if folder != 'Common':
+            folder = prefixed(folder)
+        bigip.tunnel_directory[prefixed(tunnel_name)] = {
+            'folder': folder, 'key': key, 'profile': profile}
+
+    @staticmethod
+    def _remove_tunnel_from_directory(bigip, tunnel_name):
+        """ Forget a tunnel deleted from a bigip """
+        if bigip.tunnel_directory is None:
+            return
+        bigip.tunnel_directory.pop(prefixed(tunnel_name), None)
+
     def _is_vlan_assoc_with_vcmp_guest(self, bigip, vlan):
         """Is a vlan associated with a vcmp_guest?"""
         try:
@@ -468,6 +504,7 @@ class BigipL2Manager(object):
                                            folder=network_folder)
         bigip.vxlan.delete_tunnel(name=tunnel_name,
                                   folder=network_folder)
+        self._remove_tunnel_from_directory(bigip, tunnel_name)
         if self.fdb_connector:
             self.fdb_connector.notify_vtep_removed(network, bigip.local_ip)
 
@@ -480,6 +517,7 @@ class BigipL2Manager(object):
                                            folder=network_folder)
         bigip.l2gre.delete_tunnel(name=tunnel_name,
                                   folder=network_folder)
+        self._remove_tunnel_from_directory(bigip, tunnel_name)
         if self.fdb_connector:
             self.fdb_connector.notify_vtep_removed(network, bigip.local_ip)
 
@@ -627,10 +665,8 @@ class BigipL2Manager(object):
         """ Add entries from the fdb relevant to the bigip """
         for fdb_operation in \
             [{'network_type': 'vxlan',
-              'get_tunnel_folder': bigip.vxlan.get_tunnel_folder,
               'fdb_method': bigip.vxlan.add_fdb_entries},
              {'network_type': 'gre',
-              'get_tunnel_folder': bigip.l2gre.get_tunnel_folder,
               'fdb_method': bigip.l2gre.add_fdb_entries}]:
             self._operate_bigip_fdb(bigip, fdb, fdb_operation)
 
@@ -653,7 +689,6 @@ class BigipL2Manager(object):
                  u'network_type': u'vxlan'}}
         """
         network_type = fdb_operation['network_type']
-        get_tunnel_folder = fdb_operation['get_tunnel_folder']
         fdb_method = fdb_operation['fdb_method']
 
         for network in fdb:
@@ -663,7 +698,7 @@ class BigipL2Manager(object):
                        'provider:network_type': net_fdb['network_type'],
                        'provider:segmentation_id': net_fdb['segment_id']}
                 tunnel_name = _get_tunnel_name(net)
-                folder = get_tunnel_folder(tunnel_name=tunnel_name)
+                folder = self.get_tunnel_folder(bigip, tunnel_name)
                 net_info = {'network': network,
                             'folder': folder,
                             'tunnel_name': tunnel_name,
@@ -723,14 +758,54 @@ class BigipL2Manager(object):
         """ Update l2 records """
         self.add_bigip_fdb(bigip, fdb)
 
+    def apply_bigip_fdb_changes(self, bigip, changes):
+        """ Add and remove L2 records with one update per tunnel.
+            changes are collected by the FDBManager:
+            {'<network_id>':
+                'network_type': <type>
+                'segment_id': <int>
+                'add': {'<mac_address>': ('<vtep>', '<ip_address>')}
+                'remove': {'<mac_address>': ('<vtep>', '<ip_address>')}}
+        """
+        for network in changes:
+            net_changes = changes[network]
+            if net_changes['network_type'] == 'vxlan':
+                tunnel_interface = bigip.vxlan
+            elif net_changes['network_type'] == 'gre':
+                tunnel_interface = bigip.l2gre
+            else:
+                continue
+            net = {'name': network,
+                   'provider:network_type': net_changes['network_type'],
+                   'provider:segmentation_id': net_changes['segment_id']}
+            tunnel_name = _get_tunnel_name(net)
+            folder = self.get_tunnel_folder(bigip, tunnel_name)
+            if not folder:
+                continue
+            records = {}
+            for operation in ['add', 'remove']:
+                records[operation] = {}
+                for mac_address in net_changes[operation]:
+                    (vtep, ip_address) = net_changes[operation][mac_address]
+                    # bigip does not need to set fdb entries
+                    # for local addresses
+                    if vtep == bigip.local_ip or \
+                            mac_address == '00:00:00:00:00:00':
+                        continue
+                    records[operation][mac_address] = \
+                        {'endpoint': vtep, 'ip_address': ip_address}
+            if records['add'] or records['remove']:
+                tunnel_interface.update_fdb_entries(
+                    tunnel_name=tunnel_name, folder=folder,
+                    add_records=records['add'],
+                    remove_records=records['remove'])
+
     def remove_bigip_fdb(self, bigip, fdb):
         """ Add L2 records for MAC addresses behind tunnel endpoints """
         for fdb_operation in \
             [{'network_type': 'vxlan',
-              'get_tunnel_folder': bigip.vxlan.get_tunnel_folder,
               'fdb_method': bigip.vxlan.delete_fdb_entries},
              {'network_type': 'gre',
-              'get_tunnel_folder': bigip.l2gre.get_tunnel_folder,
               'fdb_method': bigip.l2gre.delete_fdb_entries}]:
             self._operate_bigip_fdb(bigip, fdb, fdb_operation)
 
@@ -14,6 +14,8 @@
 # limitations under the License.
 #
 
+from f5.oslbaasv1agent.drivers.bigip.scheduler import ServiceScheduler
+
 
 class LBaaSBaseDriver(object):
     """ Abstract base LBaaS Driver class for interfacing
@@ -23,7 +25,7 @@ class LBaaSBaseDriver(object):
         self.agent_id = None
         self.plugin_rpc = None
         self.connected = False
-        self.service_queue = []
+        self.service_queue = ServiceScheduler()
         self.agent_configurations = {}
 
     def set_context(self, context):
@@ -23,15 +23,23 @@ from neutron.plugins.common import constants as plugin_const
 from neutron.common.exceptions import NeutronException
 
 from f5.bigip import exceptions as f5ex
+from f5.bigip.interfaces import prefixed
 from f5.bigip.interfaces import strip_domain_address
 from f5.oslbaasv1agent.drivers.bigip.selfips import BigipSelfIpManager
 from f5.oslbaasv1agent.drivers.bigip.snats import BigipSnatManager
+from f5.oslbaasv1agent.drivers.bigip.subnet_ranges import SubnetRanges
 
-import itertools
+import hashlib
+import json
 import netaddr
+import os
+import tempfile
 
 LOG = logging.getLogger(__name__)
 
+# format of the route domain cache file
+RDS_CACHE_VERSION = 2
+
 
 class NetworkBuilderDirect(object):
     """Create network connectivity for a bigip """
@@ -45,6 +53,10 @@ class NetworkBuilderDirect(object):
         self.bigip_snat_manager = BigipSnatManager(
             driver, bigip_l2_manager, l3_binding)
         self.rds_cache = {}
+        # subnet ranges in rds_cache by tenant and route domain
+        self.rds_ranges = {}
+        # rds_cache changed since it was last written to disk
+        self.rds_cache_dirty = False
 
     def initialize_tunneling(self):
         """ setup tunneling
@@ -90,12 +102,9 @@ class NetworkBuilderDirect(object):
 
         # Per Device Network Connectivity (VLANs or Tunnels)
         subnetsinfo = _get_subnets_to_assure(service)
-        for (assure_bigip, subnetinfo) in \
-                itertools.product(self.driver.get_all_bigips(), subnetsinfo):
-            self.bigip_l2_manager.assure_bigip_network(
-                assure_bigip, subnetinfo['network'])
-            self.bigip_selfip_manager.assure_bigip_selfip(
-                assure_bigip, service, subnetinfo)
+        self.driver.run_on_bigips(self.driver.get_all_bigips(),
+                                  self._assure_bigip_networks,
+                                  service, subnetsinfo)
 
         # L3 Shared Config
         assure_bigips = self.driver.get_config_bigips()
@@ -111,6 +120,14 @@ class NetworkBuilderDirect(object):
                     self.bigip_selfip_manager.assure_gateway_on_subnet(
                         assure_bigip, subnetinfo, traffic_group)
 
+    def _assure_bigip_networks(self, bigip, service, subnetsinfo):
+        """ Assure the service networks and selfips on one bigip """
+        for subnetinfo in subnetsinfo:
+            self.bigip_l2_manager.assure_bigip_network(
+                bigip, subnetinfo['network'])
+            self.bigip_selfip_manager.assure_bigip_selfip(
+                bigip, service, subnetinfo)
+
     def _annotate_service_route_domains(self, service):
         """ Add route domain notation to pool member and vip addresses. """
         LOG.debug("Service before route domains: %s" % service)
@@ -168,27 +185,13 @@ class NetworkBuilderDirect(object):
         placed_route_domain_id = None
         for route_domain_id in self.rds_cache[tenant_id]:
             LOG.debug("checking rd %s" % route_domain_id)
-            rd_entry = self.rds_cache[tenant_id][route_domain_id]
-            overlapping_subnet = None
-            for net_shortname in rd_entry:
-                LOG.debug("checking net %s" % net_shortname)
-                net_entry = rd_entry[net_shortname]
-                for exist_subnet_id in net_entry['subnets']:
-                    if exist_subnet_id == subnet['id']:
-                        continue
-                    exist_subnet = net_entry['subnets'][exist_subnet_id]
-                    exist_cidr = exist_subnet['cidr']
-                    if check_cidr in exist_cidr or exist_cidr in check_cidr:
-                        overlapping_subnet = exist_subnet
-                        LOG.debug('rd %s: overlaps with subnet %s id: %s' % (
-                            (route_domain_id, exist_subnet, exist_subnet_id)))
-                        break
-                if overlapping_subnet:
-                    # no need to keep looking
-                    break
-            if not overlapping_subnet:
-                placed_route_domain_id = route_domain_id
-                break
+            rd_ranges = self._get_rd_ranges(tenant_id, route_domain_id)
+            if rd_ranges.overlaps(check_cidr, subnet['id']):
+                LOG.debug('rd %s: overlaps with subnet %s' %
+                          (route_domain_id, check_cidr))
+                continue
+            placed_route_domain_id = route_domain_id
+            break
 
         if placed_route_domain_id is None:
             if (len(self.rds_cache[tenant_id]) <
@@ -208,8 +211,18 @@ class NetworkBuilderDirect(object):
             rd_entry[net_short_name] = {'subnets': {}}
         net_subnets = rd_entry[net_short_name]['subnets']
         net_subnets[subnet['id']] = {'cidr': check_cidr}
+        self._get_rd_ranges(tenant_id, placed_route_domain_id).add(
+            subnet['id'], check_cidr)
+        self.rds_cache_dirty = True
         network['route_domain_id'] = placed_route_domain_id
 
+    def _get_rd_ranges(self, tenant_id, route_domain_id):
+        """ subnet ranges of a route domain in rds_cache """
+        tenant_ranges = self.rds_ranges.setdefault(tenant_id, {})
+        if route_domain_id not in tenant_ranges:
+            tenant_ranges[route_domain_id] = SubnetRanges()
+        return tenant_ranges[route_domain_id]
+
     def _create_aux_rd(self, tenant_id):
         """ Create a new route domain """
         route_domain_id = None
@@ -251,8 +264,10 @@ class NetworkBuilderDirect(object):
         if tenant_id not in self.rds_cache:
             LOG.debug("rds_cache: adding tenant %s" % tenant_id)
             self.rds_cache[tenant_id] = {}
+            self.rds_ranges[tenant_id] = {}
             for bigip in self.driver.get_all_bigips():
                 self.update_rds_cache_bigip(tenant_id, bigip)
+            self.rds_cache_dirty = True
             LOG.debug("rds_cache updated: " + str(self.rds_cache))
 
     def update_rds_cache_bigip(self, tenant_id, bigip):
@@ -260,22 +275,23 @@ class NetworkBuilderDirect(object):
             with information from bigip's vlan and tunnels """
         LOG.debug("rds_cache: processing bigip %s" % bigip.device_name)
 
-        route_domain_ids = bigip.route.get_domain_ids(folder=tenant_id)
-        # LOG.debug("rds_cache: got bigip route domains: %s" % route_domains)
-        for route_domain_id in route_domain_ids:
+        # one query for the vlans of all route domains and one
+        # for all selfips of the tenant. vlans include tunnels.
+        domain_vlans = bigip.route.get_domain_vlans(folder=tenant_id)
+        selfips_by_vlan = bigip.selfip.get_selfips_by_vlan(folder=tenant_id)
+        for route_domain_id in domain_vlans:
             self.update_rds_cache_bigip_rd_vlans(
-                tenant_id, bigip, route_domain_id)
+                tenant_id, bigip, route_domain_id,
+                domain_vlans[route_domain_id], selfips_by_vlan)
 
     def update_rds_cache_bigip_rd_vlans(
-            self, tenant_id, bigip, route_domain_id):
+            self, tenant_id, bigip, route_domain_id, rd_vlans,
+            selfips_by_vlan):
         """ Update the route domain cache with information
             from the bigip vlans and tunnels from
             this route domain """
         LOG.debug("rds_cache: processing bigip %s rd %s"
                   % (bigip.device_name, route_domain_id))
-        # this gets tunnels too
-        rd_vlans = bigip.route.get_vlans_in_domain_by_id(
-            folder=tenant_id, route_domain_id=route_domain_id)
         LOG.debug("rds_cache: bigip %s rd %s vlans: %s"
                   % (bigip.device_name, route_domain_id, rd_vlans))
         if len(rd_vlans) == 0:
@@ -289,10 +305,11 @@ class NetworkBuilderDirect(object):
         # for every VLAN or TUNNEL on this bigip...
         for rd_vlan in rd_vlans:
             self.update_rds_cache_bigip_vlan(
-                tenant_id, bigip, route_domain_id, rd_vlan)
+                tenant_id, bigip, route_domain_id, rd_vlan,
+                selfips_by_vlan.get(rd_vlan, []))
 
     def update_rds_cache_bigip_vlan(
-            self, tenant_id, bigip, route_domain_id, rd_vlan):
+            self, tenant_id, bigip, route_domain_id, rd_vlan, selfips):
         """ Update the route domain cache with information
             from the bigip vlan or tunnel """
         LOG.debug("rds_cache: processing bigip %s rd %d vlan %s"
@@ -306,8 +323,8 @@ class NetworkBuilderDirect(object):
         if net_short_name not in rd_entry:
             rd_entry[net_short_name] = {'subnets': {}}
         net_subnets = rd_entry[net_short_name]['subnets']
+        rd_ranges = self._get_rd_ranges(tenant_id, route_domain_id)
 
-        selfips = bigip.selfip.get_selfips(folder=tenant_id, vlan=rd_vlan)
         LOG.debug("rds_cache: got selfips: %s" % selfips)
         for selfip in selfips:
             LOG.debug("rds_cache: processing bigip %s rd %s vlan %s self %s" %
@@ -330,7 +347,7 @@ class NetworkBuilderDirect(object):
             LOG.debug("rds_cache: updating subnet %s with %s"
                       % (subnet_id, str(netip.cidr)))
             net_subnets[subnet_id] = {'cidr': netip.cidr}
-            LOG.debug("rds_cache: now %s" % self.rds_cache)
+            rd_ranges.add(subnet_id, netip.cidr)
 
     def get_route_domain_from_cache(self, network):
         """ Get route domain from cache by network """
@@ -349,8 +366,153 @@ class NetworkBuilderDirect(object):
             for route_domain_id in tenant_cache:
                 if net_short_name in tenant_cache[route_domain_id]:
                     net_entry = tenant_cache[route_domain_id][net_short_name]
-                    if subnet['id'] in net_entry:
-                        del net_entry[subnet['id']]
+                    if subnet['id'] in net_entry['subnets']:
+                        del net_entry['subnets'][subnet['id']]
+                        self._get_rd_ranges(
+                            tenant_id, route_domain_id).remove(subnet['id'])
+                        self.rds_cache_dirty = True
+
+    def load_rds_cache(self):
+        """ Load the route domain cache written before a restart.
+
+            Only tenants whose route domains, their vlans and the
+            selfips are the same on every bigip as when the cache was
+            written are loaded. The others are read from the bigips when they
+            are next used.
+        """
+        path = self.conf.f5_route_domain_cache_file
+        if not path:
+            return
+        try:
+            with open(path) as cache_file:
+                snapshot = json.load(cache_file)
+        except (IOError, OSError):
+            LOG.debug("rds_cache: no cache file %s" % path)
+            return
+        except ValueError as exc:
+            LOG.warning("rds_cache: ignoring unreadable cache file %s: %s"
+                        % (path, exc))
+            return
+        if snapshot.get('version') != RDS_CACHE_VERSION:
+            LOG.info("rds_cache: ignoring cache file %s of another version"
+                     % path)
+            return
+        try:
+            device_networks = self._get_device_networks()
+        except Exception as exc:
+            LOG.warning("rds_cache: not loading cache file %s: %s"
+                        % (path, exc))
+            return
+
+        loaded = 0
+        diverged = 0
+        for tenant_id in snapshot['tenants']:
+            if tenant_id in self.rds_cache:
+                continue
+            tenant_entry = snapshot['tenants'][tenant_id]
+            if tenant_entry['fingerprints'] != \
+                    self._get_tenant_fingerprints(device_networks, tenant_id):
+                diverged += 1
+                continue
+            tenant_cache = {}
+            tenant_ranges = {}
+            for route_domain_id in tenant_entry['route_domains']:
+                rd_entry = tenant_entry['route_domains'][route_domain_id]
+                route_domain_id = int(route_domain_id)
+                tenant_cache[route_domain_id] = {}
+                tenant_ranges[route_domain_id] = SubnetRanges()
+                for net_short_name in rd_entry:
+                    net_subnets = {}
+                    subnets = rd_entry[net_short_name]
+                    for subnet_id in subnets:
+                        cidr = netaddr.IPNetwork(subnets[subnet_id])
+                        net_subnets[subnet_id] = {'cidr': cidr}
+                        tenant_ranges[route_domain_id].add(subnet_id, cidr)
+                    tenant_cache[route_domain_id][net_short_name] = \
+                        {'subnets': net_subnets}
+            self.rds_cache[tenant_id] = tenant_cache
+            self.rds_ranges[tenant_id] = tenant_ranges
+            loaded += 1
+        LOG.info("rds_cache: loaded %d tenants from %s, %d changed on "
+                 "the bigips since" % (loaded, path, diverged))
+
+    def save_rds_cache(self):
+        """ Write the route domain cache if it changed """
+        path = self.conf.f5_route_domain_cache_file
+        if not path or not self.rds_cache_dirty:
+            return
+        # changes made while writing are written next time
+        self.rds_cache_dirty = False
+        tmp_path = None
+        try:
+            device_networks = self._get_device_networks()
+            tenants = {}
+            for tenant_id in self.rds_cache:
+                route_domains = {}
+                tenant_cache = self.rds_cache[tenant_id]
+                for route_domain_id in tenant_cache:
+                    rd_entry = {}
+                    for net_short_name in tenant_cache[route_domain_id]:
+                        net_entry = \
+                            tenant_cache[route_domain_id][net_short_name]
+                        subnets = {}
+                        for subnet_id in net_entry['subnets']:
+                            subnets[subnet_id] = \
+                                str(net_entry['subnets'][subnet_id]['cidr'])
+                        rd_entry[net_short_name] = subnets
+                    route_domains[str(route_domain_id)] = rd_entry
+                tenants[tenant_id] = {
+                    'route_domains': route_domains,
+                    'fingerprints': self._get_tenant_fingerprints(
+                        device_networks, tenant_id)}
+            snapshot = json.dumps({'version': RDS_CACHE_VERSION,
+                                   'tenants': tenants})
+
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # write a temporary file and rename it so a restart
+            # never finds a partial cache
+            (fd, tmp_path) = tempfile.mkstemp(
+                dir=directory or None, prefix='.route_domains')
+            with os.fdopen(fd, 'w') as cache_file:
+                cache_file.write(snapshot)
+            os.rename(tmp_path, path)
+            LOG.debug("rds_cache: wrote %d tenants to %s"
+                      % (len(tenants), path))
+        except Exception as exc:
+            LOG.warning("rds_cache: could not write cache file %s: %s"
+                        % (path, exc))
+            self.rds_cache_dirty = True
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _get_device_networks(self):
+        """ Route domain vlans and selfip addresses by bigip and folder,
+            two queries per bigip """
+        device_networks = {}
+        for bigip in self.driver.get_all_bigips():
+            device_networks[bigip.device_name] = {
+                'domains': bigip.route.get_domain_vlans_by_folder(),
+                'selfips': bigip.selfip.get_selfip_addresses_by_folder()}
+        return device_networks
+
+    @staticmethod
+    def _get_tenant_fingerprints(device_networks, tenant_id):
+        """ Checksum of the tenant route domains, vlans and selfips
+            by bigip """
+        folder = prefixed(tenant_id)
+        tenant_fingerprints = {}
+        for device_name in device_networks:
+            networks = device_networks[device_name]
+            domain_vlans = networks['domains'].get(folder, {})
+            domains = sorted([(route_domain_id, sorted(vlans))
+                              for (route_domain_id, vlans)
+                              in domain_vlans.items()])
+            selfips = sorted(networks['selfips'].get(folder, {}).items())
+            tenant_fingerprints[device_name] = hashlib.md5(
+                json.dumps([domains, selfips]).encode('utf-8')).hexdigest()
+        return tenant_fingerprints
 
     @staticmethod
     def get_bigip_net_short_name(bigip, tenant_id, network_name):
@@ -436,19 +598,18 @@ class NetworkBuilderDirect(object):
 
         # Delete shared config objects
         deleted_names = set()
-        for bigip in self.driver.get_config_bigips():
-            LOG.debug('    post_service_networking: calling '
-                      '_assure_delete_networks del nets sh for bigip %s %s'
-                      % (bigip.device_name, all_subnet_hints))
-            subnet_hints = all_subnet_hints[bigip.device_name]
-            deleted_names = deleted_names.union(
-                self._assure_delete_nets_shared(bigip, service,
-                                                subnet_hints))
+        results = self.driver.run_on_config_bigips(
+            self._assure_bigip_delete_nets_shared, service, all_subnet_hints)
+        for bigip_deleted_names in results.values():
+            deleted_names = deleted_names.union(bigip_deleted_names)
 
         # avoids race condition:
-        # deletion of shared ip objects must sync before we
-        # remove the selfips or vlans from the peer bigips.
-        self.driver.sync_if_clustered()
+        # deletion of shared ip objects, members and vips must sync
+        # before we remove the selfips or vlans from the peer bigips.
+        # The service's final sync covers everything else.
+        if [hints for hints in all_subnet_hints.values()
+                if hints['check_for_delete_subnets']]:
+            self.driver.sync_if_clustered()
 
         # Delete non shared config objects
         for bigip in self.driver.get_all_bigips():
@@ -474,22 +635,35 @@ class NetworkBuilderDirect(object):
             self.driver.plugin_rpc.delete_port_by_name(
                 port_name=port_name)
 
+    def _assure_bigip_delete_nets_shared(self, bigip, service,
+                                         all_subnet_hints):
+        """ Delete shared config objects on one bigip """
+        LOG.debug('    post_service_networking: calling '
+                  '_assure_delete_networks del nets sh for bigip %s %s'
+                  % (bigip.device_name, all_subnet_hints))
+        subnet_hints = all_subnet_hints[bigip.device_name]
+        return self._assure_delete_nets_shared(bigip, service, subnet_hints)
+
     def update_bigip_l2(self, service):
         """ Update fdb entries on bigip """
+        self.driver.run_on_bigips(self.driver.get_all_bigips(),
+                                  self._update_bigip_l2, service)
+
+    def _update_bigip_l2(self, bigip, service):
+        """ Update fdb entries on one bigip """
         vip = service['vip']
         pool = service['pool']
 
-        for bigip in self.driver.get_all_bigips():
-            for member in service['members']:
-                if member['status'] == plugin_const.PENDING_DELETE:
-                    self.delete_bigip_member_l2(bigip, pool, member)
-                else:
-                    self.update_bigip_member_l2(bigip, pool, member)
-            if 'id' in vip:
-                if vip['status'] == plugin_const.PENDING_DELETE:
-                    self.delete_bigip_vip_l2(bigip, vip)
-                else:
-                    self.update_bigip_vip_l2(bigip, vip)
+        for member in service['members']:
+            if member['status'] == plugin_const.PENDING_DELETE:
+                self.delete_bigip_member_l2(bigip, pool, member)
+            else:
+                self.update_bigip_member_l2(bigip, pool, member)
+        if 'id' in vip:
+            if vip['status'] == plugin_const.PENDING_DELETE:
+                self.delete_bigip_vip_l2(bigip, vip)
+            else:
+                self.update_bigip_vip_l2(bigip, vip)
 
     def update_bigip_member_l2(self, bigip, pool, member):
         """ update pool member l2 records """
@@ -22,6 +22,7 @@ except ImportError:
     from oslo_log import log as logging
     from neutron_lbaas.services.loadbalancer import constants as lb_const
 from neutron.plugins.common import constants as plugin_const
+from f5.bigip.interfaces import split_addr_route_domain
 from time import time
 
 LOG = logging.getLogger(__name__)
@@ -34,22 +35,54 @@ class BigipPoolManager(object):
         self.driver = driver
         self.bigip_l2_manager = bigip_l2_manager
 
-    def assure_bigip_pool_create(self, bigip, pool):
-        """ Create pool on the bigip """
-        if not pool['status'] == plugin_const.PENDING_DELETE:
-            desc = pool['name'] + ':' + pool['description']
+    def get_bigip_pool_state(self, bigip, pool):
+        """ Read the pool, its monitors and members from the bigip.
+            Returns None if the pool does not exist. """
+        return bigip.pool.get_config(name=pool['id'],
+                                     folder=pool['tenant_id'])
+
+    def assure_bigip_pool_create(self, bigip, service, pool_state):
+        """ Create pool on the bigip or correct its attributes.
+            Returns the pool state as it is after the changes. """
+        pool = service['pool']
+        if pool['status'] == plugin_const.PENDING_DELETE:
+            return pool_state
+        desc = pool['name'] + ':' + pool['description']
+        lb_method = self._get_lb_method(service)
+        if pool_state is None:
             bigip.pool.create(name=pool['id'],
-                              lb_method=pool['lb_method'],
+                              lb_method=lb_method,
                               description=desc,
                               folder=pool['tenant_id'])
-            if pool['status'] == plugin_const.PENDING_UPDATE:
-                # make sure pool attributes are correct
-                bigip.pool.set_lb_method(name=pool['id'],
-                                         lb_method=pool['lb_method'],
-                                         folder=pool['tenant_id'])
-                bigip.pool.set_description(name=pool['id'],
-                                           description=desc,
-                                           folder=pool['tenant_id'])
+            return {'lb_method': lb_method,
+                    'description': desc,
+                    'monitors': [],
+                    'members': []}
+        # make sure pool attributes are correct
+        if pool_state['lb_method'] != lb_method:
+            bigip.pool.set_lb_method(name=pool['id'],
+                                     lb_method=lb_method,
+                                     folder=pool['tenant_id'])
+            pool_state['lb_method'] = lb_method
+        if pool_state['description'] != desc:
+            bigip.pool.set_description(name=pool['id'],
+                                       description=desc,
+                                       folder=pool['tenant_id'])
+            pool_state['description'] = desc
+        return pool_state
+
+    def _get_lb_method(self, service):
+        """ LB method the pool should have. If members are using
+            weights, the pool must also weight by the ratio. """
+        pool = service['pool']
+        lb_method = str(pool['lb_method']).upper()
+        for member in service['members']:
+            if member['status'] != plugin_const.PENDING_DELETE and \
+                    member['weight'] > 1:
+                if lb_method == lb_const.LB_METHOD_LEAST_CONNECTIONS:
+                    return 'RATIO_LEAST_CONNECTIONS'
+                return 'RATIO'
+        return lb_method
 
     def assure_bigip_pool_delete(self, bigip, service):
         """ Assure pool is deleted from big-ip """
@@ -57,12 +90,14 @@ class BigipPoolManager(object):
         bigip.pool.delete(name=service['pool']['id'],
                           folder=service['pool']['tenant_id'])
 
-    def assure_bigip_pool_monitors(self, bigip, service):
+    def assure_bigip_pool_monitors(self, bigip, service, pool_state):
         """ Create pool monitors on bigip """
         pool = service['pool']
         # Current monitors on the pool according to BigIP
-        existing_monitors = bigip.pool.get_monitors(name=pool['id'],
-                                                    folder=pool['tenant_id'])
+        if pool_state is None:
+            existing_monitors = []
+        else:
+            existing_monitors = list(pool_state['monitors'])
 
         health_monitors_status = {}
         for monitor in pool['health_monitors_status']:
@@ -92,7 +127,13 @@ class BigipPoolManager(object):
                     pass
                 # pylint: enable=bare-except
             else:
-                if not found_existing_monitor:
+                monitor_state = None
+                if found_existing_monitor:
+                    monitor_state = bigip.monitor.get_config(
+                        name=monitor['id'],
+                        mon_type=monitor['type'],
+                        folder=monitor['tenant_id'])
+                if monitor_state is None:
                     timeout = int(monitor['max_retries']) * \
                         int(monitor['timeout'])
                     bigip.monitor.create(name=monitor['id'],
@@ -102,11 +143,11 @@ class BigipPoolManager(object):
                                          send_text=None,
                                          recv_text=None,
                                          folder=monitor['tenant_id'])
-                    self._update_monitor(bigip, monitor, set_times=False)
-                else:
-                    if health_monitors_status[monitor['id']] == \
-                            plugin_const.PENDING_UPDATE:
-                        self._update_monitor(bigip, monitor)
+                    monitor_state = {'interval': int(monitor['delay']),
+                                     'timeout': timeout,
+                                     'send': None,
+                                     'recv': None}
+                self._update_monitor(bigip, monitor, monitor_state)
 
                 if not found_existing_monitor:
                     bigip.pool.add_monitor(name=pool['id'],
@@ -124,25 +165,26 @@ class BigipPoolManager(object):
                                  mon_type=None,
                                  folder=pool['tenant_id'])
 
-    def _update_monitor(self, bigip, monitor, set_times=True):
-        """ Update monitor on bigip """
-        if set_times:
-            timeout = int(monitor['max_retries']) * \
-                int(monitor['timeout'])
-            # make sure monitor attributes are correct
+    def _update_monitor(self, bigip, monitor, monitor_state):
+        """ Update monitor attributes which differ on bigip """
+        timeout = int(monitor['max_retries']) * \
+            int(monitor['timeout'])
+        # make sure monitor attributes are correct
+        if int(monitor_state['interval']) != int(monitor['delay']):
             bigip.monitor.set_interval(name=monitor['id'],
                                        mon_type=monitor['type'],
                                        interval=monitor['delay'],
                                        folder=monitor['tenant_id'])
+        if int(monitor_state['timeout']) != timeout:
             bigip.monitor.set_timeout(name=monitor['id'],
                                       mon_type=monitor['type'],
                                       timeout=timeout,
                                       folder=monitor['tenant_id'])
 
         if monitor['type'] == 'HTTP' or monitor['type'] == 'HTTPS':
-            self._update_http_monitor(bigip, monitor)
+            self._update_http_monitor(bigip, monitor, monitor_state)
 
-    def _update_http_monitor(self, bigip, monitor):
+    def _update_http_monitor(self, bigip, monitor, monitor_state):
         """ Update pool monitor on bigip """
         if 'url_path' in monitor:
             send_text = "GET " + monitor['url_path'] + \
@@ -180,95 +222,95 @@ class BigipPoolManager(object):
         else:
             recv_text = "HTTP/1.(0|1) 200"
 
-        LOG.debug('setting monitor send: %s, receive: %s'
-                  % (send_text, recv_text))
-
-        bigip.monitor.set_send_string(name=monitor['id'],
-                                      mon_type=monitor['type'],
-                                      send_text=send_text,
-                                      folder=monitor['tenant_id'])
-        bigip.monitor.set_recv_string(name=monitor['id'],
-                                      mon_type=monitor['type'],
-                                      recv_text=recv_text,
-                                      folder=monitor['tenant_id'])
-
-    def assure_bigip_members(self, bigip, service, subnet_hints):
+        if monitor_state['send'] != send_text:
+            LOG.debug('setting monitor send: %s' % send_text)
+            bigip.monitor.set_send_string(name=monitor['id'],
+                                          mon_type=monitor['type'],
+                                          send_text=send_text,
+                                          folder=monitor['tenant_id'])
+        if monitor_state['recv'] != recv_text:
+            LOG.debug('setting monitor receive: %s' % recv_text)
+            bigip.monitor.set_recv_string(name=monitor['id'],
+                                          mon_type=monitor['type'],
+                                          recv_text=recv_text,
+                                          folder=monitor['tenant_id'])
+
+    def assure_bigip_members(self, bigip, service, subnet_hints, pool_state):
         """ Ensure pool members are on bigip """
         pool = service['pool']
         start_time = time()
         # Does pool exist... If not don't bother
-        if not bigip.pool.exists(name=pool['id'], folder=pool['tenant_id']):
+        if pool_state is None:
             return
         # Current members on the BigIP
-        pool['existing_members'] = bigip.pool.get_members(
-            name=pool['id'], folder=pool['tenant_id'])
-        # Flag if we need to change the pool's LB method to
-        # include weighting by the ratio attribute
-        any_using_ratio = False
-        # Members according to Neutron
+        existing_members = self.index_members(pool_state['members'])
+        # Member changes are collected and then made together
+        member_changes = {'add': [], 'update': [], 'remove': []}
+        # Members according to Neutron. Each one found is taken
+        # out of the index, leaving those bigip needs to remove.
         for member in service['members']:
-            member_hints = \
-                self._assure_bigip_member(bigip, subnet_hints, pool, member)
-            if member_hints['using_ratio']:
-                any_using_ratio = True
-
-            # Remove member from the list of members bigip needs to remove
-            if member_hints['found_existing']:
-                pool['existing_members'].remove(member_hints['found_existing'])
+            self._assure_bigip_member(
+                subnet_hints, pool, member, existing_members, member_changes)
 
         LOG.debug(_("Pool: %s removing members %s"
-                    % (pool['id'], pool['existing_members'])))
+                    % (pool['id'], existing_members.values())))
         # remove any members which are no longer in the service
-        for need_to_delete in pool['existing_members']:
-            bigip.pool.remove_member(name=pool['id'],
-                                     ip_address=need_to_delete['addr'],
-                                     port=int(need_to_delete['port']),
-                                     folder=pool['tenant_id'])
-
-        # if members are using weights, change the LB to RATIO
-        if any_using_ratio:
-            # LOG.debug(_("Pool: %s changing to ratio based lb"
-            #        % pool['id']))
-            if pool['lb_method'] == lb_const.LB_METHOD_LEAST_CONNECTIONS:
-                bigip.pool.set_lb_method(name=pool['id'],
-                                         lb_method='RATIO_LEAST_CONNECTIONS',
-                                         folder=pool['tenant_id'])
-            else:
-                bigip.pool.set_lb_method(name=pool['id'],
-                                         lb_method='RATIO',
-                                         folder=pool['tenant_id'])
-        else:
-            # We must update the pool lb_method for the case where
-            # the pool object was not updated, but the member
-            # used to have a weight (setting ration) and now does
-            # not.
-            bigip.pool.set_lb_method(name=pool['id'],
-                                     lb_method=pool['lb_method'],
-                                     folder=pool['tenant_id'])
+        for need_to_delete in existing_members.values():
+            member_changes['remove'].append(
+                {'addr': need_to_delete['addr'],
+                 'port': int(need_to_delete['port'])})
+
+        if member_changes['add'] or member_changes['update'] or \
+                member_changes['remove']:
+            LOG.debug("        pool %s: adding %d, updating %d and "
+                      "removing %d members"
+                      % (pool['id'], len(member_changes['add']),
+                         len(member_changes['update']),
+                         len(member_changes['remove'])))
+            bigip.pool.update_members(
+                name=pool['id'],
+                add_members=member_changes['add'],
+                update_members=member_changes['update'],
+                remove_members=member_changes['remove'],
+                existing_members=pool_state['members'],
+                folder=pool['tenant_id'])
         if time() - start_time > .001:
-            LOG.debug("        _assure_members setting pool lb method" +
-                      " took %.5f secs" % (time() - start_time))
-
-    def _assure_bigip_member(self, bigip, subnet_hints, pool, member):
-        """ Ensure pool member is on bigip """
-        start_time = time()
-
+            LOG.debug("        _assure_members took %.5f secs" %
+                      (time() - start_time))
+
+    @staticmethod
+    def member_key(address, port):
+        """ Key identifying a member by address, route domain and port """
+        (addr, route_domain) = split_addr_route_domain(address)
+        return (addr, route_domain, int(port))
+
+    def index_members(self, existing_members):
+        """ Index members read from the bigip by member_key """
+        index = {}
+        for existing_member in existing_members:
+            key = self.member_key(existing_member['addr'],
+                                  existing_member['port'])
+            index[key] = existing_member
+        return index
+
+    def _assure_bigip_member(self, subnet_hints, pool, member,
+                             existing_members, member_changes):
+        """ Work out the changes to make a pool member match """
         network = member['network']
         subnet = member['subnet']
         member_hints = {'found_existing': None,
-                        'using_ratio': False,
                         'deleted_members': []}
 
         ip_address = member['address']
-        for existing_member in pool['existing_members']:
-            if ip_address.startswith(existing_member['addr']) and \
-               (member['protocol_port'] == existing_member['port']):
-                member_hints['found_existing'] = existing_member
-                break
+        member_hints['found_existing'] = existing_members.pop(
+            self.member_key(ip_address, member['protocol_port']), None)
 
         # Delete those pending delete
         if member['status'] == plugin_const.PENDING_DELETE:
-            self._assure_bigip_delete_member(bigip, pool, member, ip_address)
+            if member_hints['found_existing']:
+                member_changes['remove'].append(
+                    {'addr': member_hints['found_existing']['addr'],
+                     'port': int(member['protocol_port'])})
             member_hints['deleted_members'].append(member)
             if subnet and \
                subnet['id'] not in subnet_hints['do_not_delete_subnets']:
@@ -277,24 +319,19 @@ class BigipPoolManager(object):
                      'subnet': subnet,
                      'is_for_member': True}
         else:
-            just_added = False
+            member_state = member_hints['found_existing']
+            if not member_state:
+                # new members are enabled with a ratio of 1
+                member_state = {'session': 'user-enabled', 'ratio': 1}
+            member_update = self._get_member_update(member, member_state)
+            member_update['port'] = int(member['protocol_port'])
             if not member_hints['found_existing']:
-                add_start_time = time()
-                port = int(member['protocol_port'])
-                if bigip.pool.add_member(name=pool['id'],
-                                         ip_address=ip_address,
-                                         port=port,
-                                         folder=pool['tenant_id'],
-                                         no_checks=True):
-                    just_added = True
-                LOG.debug("           bigip.pool.add_member %s took %.5f" %
-                          (ip_address, time() - add_start_time))
-            if just_added or member['status'] == plugin_const.PENDING_UPDATE:
-                member_info = {'pool': pool, 'member': member,
-                               'ip_address': ip_address,
-                               'just_added': just_added}
-                member_hints['using_ratio'] = \
-                    self._assure_update_member(bigip, member_info)
+                member_update['addr'] = ip_address
+                member_changes['add'].append(member_update)
+            elif 'session' in member_update or 'ratio' in member_update:
+                # use the name the bigip knows the member by
+                member_update['addr'] = member_state['addr']
+                member_changes['update'].append(member_update)
             if subnet and \
                subnet['id'] in subnet_hints['check_for_delete_subnets']:
                 del subnet_hints['check_for_delete_subnets'][subnet['id']]
@@ -302,60 +339,19 @@ class BigipPoolManager(object):
                subnet['id'] not in subnet_hints['do_not_delete_subnets']:
                 subnet_hints['do_not_delete_subnets'].append(subnet['id'])
 
-        if time() - start_time > .001:
-            LOG.debug("        assuring member %s took %.5f secs" %
-                      (member['address'], time() - start_time))
         return member_hints
 
-    def _assure_update_member(self, bigip, member_info):
-        """ Update properties of pool member on bigip """
-        pool = member_info['pool']
-        member = member_info['member']
-        ip_address = member_info['ip_address']
-        just_added = member_info['just_added']
-
-        using_ratio = False
+    def _get_member_update(self, member, member_state):
+        """ Member attributes which differ on bigip """
+        member_update = {}
         # Is it enabled or disabled?
-        # no_checks because we add the member above if not found
-        start_time = time()
-        member_port = int(member['protocol_port'])
-        if member['admin_state_up']:
-            bigip.pool.enable_member(name=pool['id'],
-                                     ip_address=ip_address,
-                                     port=member_port,
-                                     folder=pool['tenant_id'],
-                                     no_checks=True)
-        else:
-            bigip.pool.disable_member(name=pool['id'],
-                                      ip_address=ip_address,
-                                      port=member_port,
-                                      folder=pool['tenant_id'],
-                                      no_checks=True)
-        LOG.debug("            member enable/disable took %.5f secs" %
-                  (time() - start_time))
+        enabled = member_state['session'] != 'user-disabled'
+        if member['admin_state_up'] and not enabled:
+            member_update['session'] = 'user-enabled'
+        elif not member['admin_state_up'] and enabled:
+            member_update['session'] = 'user-disabled'
         # Do we have weights for ratios?
-        if member['weight'] > 1:
-            if not just_added:
-                start_time = time()
-                set_ratio = bigip.pool.set_member_ratio
-                set_ratio(name=pool['id'],
-                          ip_address=ip_address,
-                          port=member_port,
-                          ratio=int(member['weight']),
-                          folder=pool['tenant_id'],
-                          no_checks=True)
-                if time() - start_time > .0001:
-                    LOG.debug("            member set ratio took %.5f secs" %
-                              (time() - start_time))
-            using_ratio = True
-
-        return using_ratio
-
-    def _assure_bigip_delete_member(self, bigip,
-                                    pool, member, ip_address):
-        """ Ensure pool member is deleted from bigip """
-        member_port = int(member['protocol_port'])
-        bigip.pool.remove_member(name=pool['id'],
-                                 ip_address=ip_address,
-                                 port=member_port,
-                                 folder=pool['tenant_id'])
+        ratio = max(int(member['weight']), 1)
+        if int(member_state['ratio']) != ratio:
+            member_update['ratio'] = ratio
+        return member_update
@@ -0,0 +1,330 @@
+""" Keyed request scheduler for driver provisioning calls """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+from eventlet import event
+from eventlet import greenpool
+from collections import OrderedDict
+from time import time
+import sys
+import uuid
+
+LOG = logging.getLogger(__name__)
+
+GLOBAL_KEY = 'global'
+
+# Requests which must run with nothing else in flight.
+GLOBAL_EXCLUSIVE_METHODS = ['remove_orphans', 'backup_configuration',
+                            'add_bigips']
+
+# Requests which can tear down tenant networking (selfips, snats,
+# route domains, the tenant folder) and therefore must not overlap
+# any other request for the same tenant.
+TENANT_EXCLUSIVE_METHODS = ['delete_vip', 'delete_pool',
+                            'delete_member', 'sync']
+
+# Requests which only read from the devices.
+READ_ONLY_METHODS = ['exists']
+
+# Requests which do nothing but assure the service definition they
+# were given. A queued request of one of these kinds can absorb a
+# later one for the same pool and run once with the newer service.
+COALESCE_METHODS = ['create_vip', 'update_vip', 'delete_vip',
+                    'create_pool', 'update_pool',
+                    'create_member', 'update_member', 'delete_member',
+                    'create_pool_health_monitor']
+
+
+def pool_key(pool_id):
+    """ Scheduler key for a pool """
+    return 'pool:' + str(pool_id)
+
+
+def tenant_key(tenant_id):
+    """ Scheduler key for a tenant """
+    return 'tenant:' + str(tenant_id)
+
+
+class ServiceRequest(object):
+    """ A provisioning request waiting for, or holding, its keys """
+
+    def __init__(self, seq, method_name, service, claims):
+        self.seq = seq
+        self.request_id = uuid.uuid4()
+        self.method_name = method_name
+        self.service = service
+        # list of (key, exclusive) tuples
+        self.claims = claims
+        self.ready = event.Event()
+        self.done = event.Event()
+        self.signaled = False
+        self.enqueued = time()
+        self.started = None
+        # requests absorbed by this one
+        self.merged = []
+
+    def can_absorb(self, method_name, claims):
+        """ Could this queued request run on behalf of another? """
+        return self.started is None and \
+            self.method_name in COALESCE_METHODS and \
+            method_name in COALESCE_METHODS and \
+            self.claims == claims
+
+
+class _KeyState(object):
+    """ Pending requests for one key, in submission order """
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.exclusive = OrderedDict()
+
+    def add(self, request, exclusive):
+        """ Append a request to this key """
+        self.pending[request.seq] = request
+        if exclusive:
+            self.exclusive[request.seq] = request
+
+    def remove(self, request):
+        """ Remove a finished request from this key """
+        self.pending.pop(request.seq, None)
+        self.exclusive.pop(request.seq, None)
+
+    def is_free_for(self, request, exclusive):
+        """ Can the request hold this key right now? """
+        if exclusive:
+            return next(iter(self.pending)) == request.seq
+        if not self.exclusive:
+            return True
+        return next(iter(self.exclusive)) >= request.seq
+
+
+class ServiceScheduler(object):
+    """ Runs driver requests on a bounded greenthread pool.
+
+        Every request claims a set of keys: its pool, its tenant and
+        the global key. A claim is either shared or exclusive. Requests
+        are granted their claims strictly in submission order per key,
+        so requests for the same pool always run in the order they
+        arrived, requests which tear down tenant networking never
+        overlap other requests for that tenant, and requests without
+        a service (orphan removal, config backup) run alone. Requests
+        for independent pools run concurrently, up to the pool size.
+
+        Waiting requests sleep on an event which is sent when the
+        request which blocked them completes.
+
+        A request which only assures its service definition is merged
+        into the last queued request for the same pool, if that one
+        has not started yet. The queued request runs once with the
+        newest service and all of the merged callers get its result.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(int(workers), 1)
+        self.pool = greenpool.GreenPool(self.workers)
+        self.keys = {}
+        self.stats = {}
+        self.running = 0
+        self._next_seq = 0
+
+    def __len__(self):
+        """ Number of requests queued or running """
+        if GLOBAL_KEY in self.keys:
+            return len(self.keys[GLOBAL_KEY].pending)
+        return 0
+
+    def resize(self, workers):
+        """ Change how many requests may run concurrently """
+        self.workers = max(int(workers), 1)
+        self.pool.resize(self.workers)
+
+    def get_claims(self, method_name, service):
+        """ Keys a request needs and whether it needs them exclusively """
+        if method_name in GLOBAL_EXCLUSIVE_METHODS or \
+                not service or not service.get('pool'):
+            return [(GLOBAL_KEY, True)]
+        pool = service['pool']
+        claims = [(GLOBAL_KEY, False)]
+        if 'tenant_id' in pool:
+            claims.append((tenant_key(pool['tenant_id']),
+                           method_name in TENANT_EXCLUSIVE_METHODS))
+        claims.append((pool_key(pool['id']),
+                       method_name not in READ_ONLY_METHODS))
+        return claims
+
+    def run(self, method_name, service, invoke):
+        """ Wait for the request's keys and run it in the pool.
+
+            invoke is called with the service definition to provision,
+            which is newer than service if later requests were merged.
+        """
+        claims = self.get_claims(method_name, service)
+        survivor = self._find_survivor(method_name, claims)
+        if survivor:
+            return self._merge(survivor, method_name, service)
+        request = self._submit(method_name, service, claims)
+        if not request.signaled:
+            LOG.debug('%s request %s is blocking - queue depth: %d'
+                      % (str(method_name), request.request_id, len(self)))
+            request.ready.wait()
+        request.started = time()
+        self.running += 1
+        try:
+            LOG.debug('%s request %s is running with queue depth: %d'
+                      % (str(method_name), request.request_id, len(self)))
+            result = self.pool.spawn(invoke, request.service).wait()
+            LOG.debug('%s request %s took %.5f secs'
+                      % (str(method_name), request.request_id,
+                         time() - request.started))
+        except:
+            LOG.error('%s request %s FAILED'
+                      % (str(method_name), request.request_id))
+            exc_info = sys.exc_info()
+            self.running -= 1
+            self._complete(request)
+            if request.merged:
+                request.done.send_exception(*exc_info)
+            raise
+        self.running -= 1
+        self._complete(request)
+        if request.merged:
+            request.done.send(result)
+        return result
+
+    def _find_survivor(self, method_name, claims):
+        """ The queued request for this pool which can absorb this one """
+        if method_name not in COALESCE_METHODS:
+            return None
+        (key, exclusive) = claims[-1]
+        if key not in self.keys:
+            return None
+        # Only the last request queued for the pool can absorb it,
+        # and only if nothing exclusive was queued behind that one
+        # on any of its keys.
+        state = self.keys[key]
+        survivor = state.pending[next(reversed(state.pending))]
+        if not survivor.can_absorb(method_name, claims):
+            return None
+        for (claim_key, claim_exclusive) in survivor.claims:
+            claim_state = self.keys[claim_key]
+            if claim_state.exclusive and \
+                    next(reversed(claim_state.exclusive)) > survivor.seq:
+                return None
+        return survivor
+
+    def _merge(self, survivor, method_name, service):
+        """ Hand this request's service to a queued request and wait """
+        request_id = uuid.uuid4()
+        survivor.service = service
+        survivor.merged.append((request_id, method_name))
+        for (key, exclusive) in survivor.claims:
+            key_stats = self.stats.setdefault(key, self._new_stats())
+            key_stats['merged'] += 1
+        LOG.debug('%s request %s merged into %s request %s, which now '
+                  'stands for %d requests'
+                  % (str(method_name), request_id,
+                     survivor.method_name, survivor.request_id,
+                     len(survivor.merged) + 1))
+        return survivor.done.wait()
+
+    def get_statistics(self, key=None):
+        """ Queue depth, wait and run times per key """
+        if key:
+            return self._key_statistics(key)
+        all_stats = {}
+        for stat_key in set(self.stats.keys()) | set(self.keys.keys()):
+            all_stats[stat_key] = self._key_statistics(stat_key)
+        return all_stats
+
+    def _key_statistics(self, key):
+        """ Statistics for one key """
+        key_stats = dict(self.stats.get(key, self._new_stats()))
+        if key in self.keys:
+            key_stats['queue_depth'] = len(self.keys[key].pending)
+        else:
+            key_stats['queue_depth'] = 0
+        return key_stats
+
+    @staticmethod
+    def _new_stats():
+        """ Empty statistics entry """
+        return {'requests': 0,
+                'merged': 0,
+                'wait_time': 0.0,
+                'max_wait_time': 0.0,
+                'run_time': 0.0,
+                'max_run_time': 0.0}
+
+    def _submit(self, method_name, service, claims):
+        """ Queue a request on all of its keys.
+
+            NOTE: this method, _merge (up to its wait) and _complete
+            alter scheduler state that other greenthreads are waiting
+            on. They do no I/O and must not yield.
+        """
+        self._next_seq += 1
+        request = ServiceRequest(self._next_seq, method_name, service,
+                                 claims)
+        for (key, exclusive) in request.claims:
+            if key not in self.keys:
+                self.keys[key] = _KeyState()
+            self.keys[key].add(request, exclusive)
+        if self._is_ready(request):
+            request.signaled = True
+        return request
+
+    def _complete(self, request):
+        """ Release a request's keys and wake whoever it blocked """
+        finished = time()
+        wait_time = request.started - request.enqueued
+        run_time = finished - request.started
+        candidates = OrderedDict()
+        for (key, exclusive) in request.claims:
+            key_stats = self.stats.setdefault(key, self._new_stats())
+            key_stats['requests'] += 1
+            key_stats['wait_time'] += wait_time
+            key_stats['max_wait_time'] = max(key_stats['max_wait_time'],
+                                             wait_time)
+            key_stats['run_time'] += run_time
+            key_stats['max_run_time'] = max(key_stats['max_run_time'],
+                                            run_time)
+            state = self.keys[key]
+            state.remove(request)
+            if not state.pending:
+                del self.keys[key]
+                continue
+            # A shared claim only ever blocked an exclusive claim
+            # queued behind it, which can only be the new head.
+            # An exclusive claim blocked everything up to the
+            # next exclusive claim.
+            for seq in state.pending:
+                waiter = state.pending[seq]
+                candidates[waiter.seq] = waiter
+                if not exclusive or seq in state.exclusive:
+                    break
+        for waiter in candidates.values():
+            if not waiter.signaled and self._is_ready(waiter):
+                waiter.signaled = True
+                waiter.ready.send(True)
+
+    def _is_ready(self, request):
+        """ Is every claim of the request available to it? """
+        for (key, exclusive) in request.claims:
+            if not self.keys[key].is_free_for(request, exclusive):
+                return False
+        return True
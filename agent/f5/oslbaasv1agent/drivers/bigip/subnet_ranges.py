@@ -0,0 +1,115 @@
+""" Address ranges of the subnets in a route domain """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from bisect import bisect_left
+from bisect import bisect_right
+
+import netaddr
+
+
+def cidr_range(cidr):
+    """ (start, end) integers of a cidr.
+
+        The IP version is put above the address bits so IPv4 and
+        IPv6 ranges never overlap each other.
+    """
+    net = netaddr.IPNetwork(cidr)
+    version = net.version << 128
+    return (version + net.first, version + net.last)
+
+
+class SubnetRanges(object):
+    """ Sorted (start, end) address ranges of subnets.
+
+        Ranges are sorted by start, along with the greatest end of
+        any range up to each position. A range overlaps the ranges
+        when one of them starts inside it, or when one which starts
+        before it ends at or after its start. Both are found by
+        binary search.
+    """
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.subnet_ids = []
+        self.known_ids = set()
+        # greatest end of the ranges up to each position
+        self.max_ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __contains__(self, subnet_id):
+        return subnet_id in self.known_ids
+
+    def add(self, subnet_id, cidr):
+        """ add or move the range of a subnet """
+        self.remove(subnet_id)
+        (start, end) = cidr_range(cidr)
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.subnet_ids.insert(position, subnet_id)
+        self.known_ids.add(subnet_id)
+        self.max_ends.insert(position, end)
+        self._update_max_ends(position)
+
+    def remove(self, subnet_id):
+        """ remove the range of a subnet """
+        if subnet_id not in self.known_ids:
+            return
+        self.known_ids.remove(subnet_id)
+        position = self.subnet_ids.index(subnet_id)
+        del self.starts[position]
+        del self.ends[position]
+        del self.subnet_ids[position]
+        del self.max_ends[position]
+        self._update_max_ends(position)
+
+    def overlaps(self, cidr, ignore_subnet_id=None):
+        """ whether a cidr overlaps the range of another subnet """
+        if ignore_subnet_id in self.known_ids:
+            others = SubnetRanges()
+            for position in range(len(self.starts)):
+                if self.subnet_ids[position] != ignore_subnet_id:
+                    others._append(self.starts[position],
+                                   self.ends[position],
+                                   self.subnet_ids[position])
+            return others.overlaps(cidr)
+        (start, end) = cidr_range(cidr)
+        # a range starts inside the cidr
+        if bisect_left(self.starts, start) < bisect_right(self.starts, end):
+            return True
+        # a range which starts before the cidr reaches into it
+        position = bisect_left(self.starts, start)
+        return position > 0 and self.max_ends[position - 1] >= start
+
+    def _append(self, start, end, subnet_id):
+        """ add a range which sorts after all others """
+        self.starts.append(start)
+        self.ends.append(end)
+        self.subnet_ids.append(subnet_id)
+        self.known_ids.add(subnet_id)
+        if self.max_ends:
+            end = max(end, self.max_ends[-1])
+        self.max_ends.append(end)
+
+    def _update_max_ends(self, position):
+        """ recompute greatest ends from position on """
+        max_end = -1
+        if position > 0:
+            max_end = self.max_ends[position - 1]
+        for index in range(position, len(self.ends)):
+            max_end = max(max_end, self.ends[index])
+            self.max_ends[index] = max_end
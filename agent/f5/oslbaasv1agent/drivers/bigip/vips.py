@@ -38,8 +38,29 @@ class BigipVipManager(object):
         """ Called for every bigip only in replication mode,
             otherwise called once for autosync mode. """
         vip = service['vip']
-        pool = service['pool']
         ip_address = vip['address']
+
+        vip_state = bigip.virtual_server.get_config(name=vip['id'],
+                                                    folder=vip['tenant_id'])
+        just_added_vip = False
+        if vip_state is None:
+            vip_info = self._get_bigip_vip_info(bigip, service,
+                                                traffic_group)
+            just_added_vip = self._create_bigip_vip(bigip, service, vip_info)
+            vip_state = {}
+
+        update_profiles = vip['status'] == plugin_const.PENDING_CREATE or \
+            vip['status'] == plugin_const.PENDING_UPDATE or \
+            just_added_vip
+        self._update_bigip_vip(bigip, service, vip_state, update_profiles)
+        if update_profiles and self.l3_binding:
+            self.l3_binding.bind_address(subnet_id=vip['subnet_id'],
+                                         ip_address=ip_address)
+
+    def _get_bigip_vip_info(self, bigip, service, traffic_group):
+        """ Network placement of a new vip """
+        vip = service['vip']
+        pool = service['pool']
         snat_pool_name = None
         network = vip['network']
         preserve_network_name = False
@@ -59,21 +80,11 @@ class BigipVipManager(object):
                 snat_pool_name = bigip_interfaces.decorate_name(tenant_id,
                                                                 tenant_id)
 
-        vip_info = {'network_name': network_name,
-                    'preserve_network_name': preserve_network_name,
-                    'ip_address': ip_address,
-                    'traffic_group': traffic_group,
-                    'snat_pool_name': snat_pool_name}
-
-        just_added_vip = self._create_bigip_vip(bigip, service, vip_info)
-
-        if vip['status'] == plugin_const.PENDING_CREATE or \
-           vip['status'] == plugin_const.PENDING_UPDATE or \
-           just_added_vip:
-            self._update_bigip_vip(bigip, service)
-            if self.l3_binding:
-                self.l3_binding.bind_address(subnet_id=vip['subnet_id'],
-                                             ip_address=ip_address)
+        return {'network_name': network_name,
+                'preserve_network_name': preserve_network_name,
+                'ip_address': vip['address'],
+                'traffic_group': traffic_group,
+                'snat_pool_name': snat_pool_name}
 
     def assure_bigip_delete_vip(self, bigip, service):
         """ Remove vip from big-ip """
@@ -187,26 +198,54 @@ class BigipVipManager(object):
             ):
                 return True
 
-    def _update_bigip_vip(self, bigip, service):
-        """ Update vip on big-ip """
+    def _update_bigip_vip(self, bigip, service, vip_state, update_profiles):
+        """ Update vip attributes which differ on big-ip. Profiles
+            and rules are only assured when update_profiles is set. """
         vip = service['vip']
         pool = service['pool']
         bigip_vs = bigip.virtual_server
 
         desc = vip['name'] + ':' + vip['description']
-        bigip_vs.set_description(name=vip['id'],
-                                 description=desc,
-                                 folder=pool['tenant_id'])
-
-        bigip_vs.set_pool(name=vip['id'],
-                          pool_name=pool['id'],
-                          folder=pool['tenant_id'])
-        if vip['admin_state_up']:
-            bigip_vs.enable_virtual_server(name=vip['id'],
-                                           folder=pool['tenant_id'])
-        else:
-            bigip_vs.disable_virtual_server(name=vip['id'],
-                                            folder=pool['tenant_id'])
+        if vip_state.get('description') != desc:
+            bigip_vs.set_description(name=vip['id'],
+                                     description=desc,
+                                     folder=pool['tenant_id'])
+
+        if vip_state.get('pool') != pool['id']:
+            bigip_vs.set_pool(name=vip['id'],
+                              pool_name=pool['id'],
+                              folder=pool['tenant_id'])
+        if vip_state.get('enabled') != bool(vip['admin_state_up']):
+            if vip['admin_state_up']:
+                bigip_vs.enable_virtual_server(name=vip['id'],
+                                               folder=pool['tenant_id'])
+            else:
+                bigip_vs.disable_virtual_server(name=vip['id'],
+                                                folder=pool['tenant_id'])
+
+        conn_limit = 0
+        if vip['connection_limit'] > 0 and 'protocol' in vip:
+            # spec says you need to do this for HTTP
+            # and HTTPS, but unless you can decrypt
+            # you can't measure HTTP rps for HTTPs
+            if not (vip['protocol'] == 'HTTP' and
+                    self.driver.conf.f5_http_rps_throttle):
+                # if not HTTP.. use connection limits
+                conn_limit = int(vip['connection_limit'])
+        if vip_state.get('connection_limit') != conn_limit:
+            LOG.debug('setting connection limit')
+            bigip_vs.set_connection_limit(name=vip['id'],
+                                          connection_limit=conn_limit,
+                                          folder=pool['tenant_id'])
+
+        if update_profiles:
+            self._update_bigip_vip_profiles(bigip, service)
+
+    def _update_bigip_vip_profiles(self, bigip, service):
+        """ Update vip persistence profiles and throttle rules """
+        vip = service['vip']
+        pool = service['pool']
+        bigip_vs = bigip.virtual_server
 
         if 'session_persistence' in vip and vip['session_persistence']:
             # branch on persistence type
@@ -241,41 +280,32 @@ class BigipVipManager(object):
             bigip_vs.remove_all_persist_profiles(name=vip['id'],
                                                  folder=vip['tenant_id'])
 
-        if vip['connection_limit'] > 0 and 'protocol' in vip:
-            # spec says you need to do this for HTTP
-            # and HTTPS, but unless you can decrypt
-            # you can't measure HTTP rps for HTTPs
+        if vip['connection_limit'] > 0 and \
+           vip.get('protocol') == 'HTTP' and \
+           self.driver.conf.f5_http_rps_throttle:
             conn_limit = int(vip['connection_limit'])
-            if vip['protocol'] == 'HTTP' and \
-               self.driver.conf.f5_http_rps_throttle:
-                LOG.debug('adding http profile and RPS throttle rule')
-                # add an http profile
-                bigip_vs.add_profile(
-                    name=vip['id'],
-                    profile_name='/Common/http',
-                    folder=vip['tenant_id'])
-                # create the rps irule
-                rule_definition = \
-                    self._create_http_rps_throttle_rule(conn_limit)
-                # try to create the irule
-                bigip.rule.create(name=RPS_THROTTLE_RULE_PREFIX + vip['id'],
-                                  rule_definition=rule_definition,
-                                  folder=vip['tenant_id'])
-                # for the rule text to update becuase
-                # connection limit may have changed
-                bigip.rule.update(name=RPS_THROTTLE_RULE_PREFIX + vip['id'],
-                                  rule_definition=rule_definition,
-                                  folder=vip['tenant_id'])
-                # add the throttle to the vip
-                rule_name = RPS_THROTTLE_RULE_PREFIX + vip['id']
-                bigip_vs.add_rule(name=vip['id'], rule_name=rule_name,
-                                  priority=500, folder=vip['tenant_id'])
-            else:
-                LOG.debug('setting connection limit')
-                # if not HTTP.. use connection limits
-                bigip_vs.set_connection_limit(name=vip['id'],
-                                              connection_limit=conn_limit,
-                                              folder=pool['tenant_id'])
+            LOG.debug('adding http profile and RPS throttle rule')
+            # add an http profile
+            bigip_vs.add_profile(
+                name=vip['id'],
+                profile_name='/Common/http',
+                folder=vip['tenant_id'])
+            # create the rps irule
+            rule_definition = \
+                self._create_http_rps_throttle_rule(conn_limit)
+            # try to create the irule
+            bigip.rule.create(name=RPS_THROTTLE_RULE_PREFIX + vip['id'],
+                              rule_definition=rule_definition,
+                              folder=vip['tenant_id'])
+            # for the rule text to update becuase
+            # connection limit may have changed
+            bigip.rule.update(name=RPS_THROTTLE_RULE_PREFIX + vip['id'],
+                              rule_definition=rule_definition,
+                              folder=vip['tenant_id'])
+            # add the throttle to the vip
+            rule_name = RPS_THROTTLE_RULE_PREFIX + vip['id']
+            bigip_vs.add_rule(name=vip['id'], rule_name=rule_name,
+                              priority=500, folder=vip['tenant_id'])
         else:
             # clear throttle rule
             LOG.debug('removing RPS throttle rule if present')
@@ -284,11 +314,6 @@ class BigipVipManager(object):
                                  rule_name=rule_name,
                                  priority=500,
                                  folder=vip['tenant_id'])
-            # clear the connection limits
-            LOG.debug('removing connection limits')
-            bigip_vs.set_connection_limit(name=vip['id'],
-                                          connection_limit=0,
-                                          folder=pool['tenant_id'])
 
     def _set_bigip_vip_cookie_persist(self, bigip, service):
         """ Setup VIP Cookie Persistence """
@@ -15,13 +15,18 @@
 #
 
 import os
+import json
 import logging
 import requests
-import socket
+
+from eventlet import semaphore
 
 from f5.bigip.pycontrol import pycontrol as pc
 from f5.common import constants as const
+from f5.bigip import exceptions
 from f5.bigip import interfaces as bigip_interfaces
+from f5.bigip.transport import IcrSession
+from f5.bigip.object_cache import ObjectCache
 
 from f5.bigip.interfaces.cluster import Cluster
 from f5.bigip.interfaces.device import Device
@@ -48,11 +53,30 @@ LOG = logging.getLogger(__name__)
 
 class BigIP(object):
     """ An interface to a single BIG-IP """
-    def __init__(self, hostname, username, password, timeout=None):
-        # get icontrol connection stub
-        self.icontrol = self._get_icontrol(hostname, username, password)
-        self.icr_session = self._get_icr_session(hostname, username, password)
+    def __init__(self, hostname, username, password, timeout=None,
+                 pool_size=None, wsdl_cache_dir=None,
+                 object_cache_timeout=None):
+        self.icr_session = self._get_icr_session(hostname, username, password,
+                                                 timeout, pool_size)
         self.icr_url = 'https://%s/mgmt/tm' % hostname
+        # parsed WSDLs are cached per TMOS version
+        version = None
+        if wsdl_cache_dir:
+            version = self._get_tmos_version()
+        # get icontrol connection stub
+        self.icontrol = self._get_icontrol(hostname, username, password,
+                                           wsdl_cache_dir=wsdl_cache_dir,
+                                           version=version)
+        # SOAP calls share the session's active folder, so each one
+        # switches it and runs without others in between
+        self.icontrol_lock = semaphore.Semaphore()
+        self.icontrol.call_hook = self._icontrol_call
+
+        # what the interfaces know exists on the device
+        self.object_cache = ObjectCache(object_cache_timeout)
+        # updates of a tunnel's fdb records read, change and write
+        # the whole record list, so they must not interleave
+        self.fdb_locks = {}
 
         # interface instance cache
         self.interfaces = {}
@@ -297,6 +321,35 @@ class BigIP(object):
         else:
             return None
 
+    def get_fdb_lock(self, folder, tunnel_name):
+        """ Lock held while updating the fdb records of a tunnel """
+        key = (folder, tunnel_name)
+        if key not in self.fdb_locks:
+            self.fdb_locks[key] = semaphore.Semaphore()
+        return self.fdb_locks[key]
+
+    def get_tunnel_directory(self):
+        """ Folder, key and profile of vxlan and gre tunnels by name,
+            read with one query """
+        request_url = self.icr_url + '/net/tunnels/tunnel'
+        request_url += '?$select=name,partition,key,profile'
+        response = self.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+        directory = {}
+        if response.status_code < 400:
+            return_obj = json.loads(response.text)
+            for tunnel in return_obj.get('items', []):
+                if tunnel['profile'].find('vxlan') > 0 or \
+                        tunnel['profile'].find('gre') > 0:
+                    directory[tunnel['name']] = {
+                        'folder': tunnel['partition'],
+                        'key': tunnel.get('key'),
+                        'profile': tunnel['profile']}
+        elif response.status_code != 404:
+            LOG.error('could not read tunnels: %s' % response.text)
+            raise exceptions.TunnelQueryException(response.text)
+        return directory
+
     def icr_link(self, selfLink):
         """ Create iControl REST link """
         return selfLink.replace('https://localhost/mgmt/tm', self.icr_url)
@@ -307,7 +360,8 @@ class BigIP(object):
         return bigip_interfaces.prefixed(folder)
 
     @staticmethod
-    def _get_icontrol(hostname, username, password, timeout=None):
+    def _get_icontrol(hostname, username, password, timeout=None,
+                      wsdl_cache_dir=None, version=None):
         """ Initialize iControl interface """
         # Logger.log(Logger.DEBUG,
         #           "Opening iControl connections to %s for interfaces %s"
@@ -318,13 +372,17 @@ class BigIP(object):
                                 username=username,
                                 password=password,
                                 directory=const.WSDL_CACHE_DIR,
-                                wsdls=[])
+                                wsdls=[],
+                                wsdl_cache_dir=wsdl_cache_dir,
+                                version=version)
         else:
             icontrol = pc.BIGIP(hostname=hostname,
                                 username=username,
                                 password=password,
                                 fromurl=True,
-                                wsdls=[])
+                                wsdls=[],
+                                wsdl_cache_dir=wsdl_cache_dir,
+                                version=version)
 
         if timeout:
             icontrol.set_timeout(timeout)
@@ -333,22 +391,68 @@ class BigIP(object):
 
         return icontrol
 
+    def get_icr_statistics(self):
+        """ iControl REST connection reuse counters """
+        return self.icr_session.get_statistics()
+
+    def get_folder_statistics(self):
+        """ iControl SOAP folder switches made and avoided """
+        return self.system.get_folder_statistics()
+
+    def get_object_cache_statistics(self):
+        """ Existence checks answered from and missing in the cache """
+        return self.object_cache.get_statistics()
+
+    def _icontrol_call(self, wsdl, method, *args, **kwargs):
+        """ Run a SOAP call in the folder its greenthread set """
+        if wsdl == pc.SESSION_WSDL:
+            return method(*args, **kwargs)
+        with self.icontrol_lock:
+            self.system.sync_folder()
+            return method(*args, **kwargs)
+
+    def get_wsdl_cache_statistics(self):
+        """ WSDLs read from and missing in the on-disk cache """
+        wsdl_cache = self.icontrol.wsdl_cache
+        if not wsdl_cache:
+            return None
+        return {'hits': wsdl_cache.hits, 'misses': wsdl_cache.misses}
+
+    def _get_tmos_version(self):
+        """ TMOS version, build and edition, Ex: 11.6.0-0.0.6-Final """
+        request_url = self.icr_url + '/sys/version'
+        try:
+            response = self.icr_session.get(
+                request_url, timeout=const.CONNECTION_TIMEOUT)
+        except requests.exceptions.RequestException as exc:
+            LOG.error('could not read TMOS version: %s' % exc)
+            return None
+        if response.status_code >= 400:
+            LOG.error('could not read TMOS version: %s' % response.text)
+            return None
+        entries = json.loads(response.text).get('entries', {})
+        for key in entries:
+            stats = entries[key].get('nestedStats', {}).get('entries', {})
+            if 'Version' not in stats:
+                continue
+            version = []
+            for name in ['Version', 'Build', 'Edition']:
+                if name in stats:
+                    version.append(stats[name]['description'])
+            return '-'.join(version)
+        return None
+
     @staticmethod
-    def _get_icr_session(hostname, username, password, timeout=None):
+    def _get_icr_session(hostname, username, password, timeout=None,
+                         pool_size=None):
         """ Get iControl REST Session """
-        icr_session = requests.session()
-        icr_session.auth = (username, password)
-        icr_session.verify = False
+        icr_session = IcrSession(username, password, timeout=timeout,
+                                 pool_size=pool_size)
         if hasattr(requests, 'packages'):
             ul3 = requests.packages.urllib3  # @UndefinedVariable
             ul3.disable_warnings(
                 category=ul3.exceptions.InsecureRequestWarning
             )
-        icr_session.headers.update({'Content-Type': 'application/json'})
-        if timeout:
-            socket.setdefaulttimeout(timeout)
-        else:
-            socket.setdefaulttimeout(const.CONNECTION_TIMEOUT)
         return icr_session
 
     @staticmethod
@@ -270,6 +270,10 @@ class SystemDeleteException(Exception):
     pass
 
 
+class TunnelQueryException(Exception):
+    pass
+
+
 class VirtualServerCreationException(Exception):
     pass
 
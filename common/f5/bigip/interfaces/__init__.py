@@ -240,6 +240,25 @@ def split_addr_port(dest):
     return (parts[0], parts[1])
 
 
+def split_addr_route_domain(address):
+    """ Split addr%rd into a normalized address and route domain id """
+    parts = str(address).split('%', 1)
+    addr = parts[0]
+    route_domain = 0
+    if len(parts) > 1 and parts[1]:
+        try:
+            route_domain = int(parts[1])
+        except ValueError:
+            LOG.warn('invalid route domain in address ' + str(address))
+    if ':' in addr:
+        # IPv6 addresses have more than one spelling
+        try:
+            addr = str(netaddr.IPAddress(addr))
+        except (netaddr.AddrFormatError, ValueError):
+            addr = addr.lower()
+    return (addr, route_domain)
+
+
 def log(method):
     """Decorator helping to log method calls."""
     def wrapper(*args, **kwargs):
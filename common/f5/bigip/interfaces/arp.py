@@ -20,6 +20,7 @@ from f5.common import constants as const
 from f5.bigip.interfaces import icontrol_rest_folder
 from f5.bigip.interfaces import icontrol_folder
 from f5.bigip.interfaces import log
+from f5.bigip.interfaces import split_addr_route_domain
 
 from f5.bigip import exceptions
 
@@ -68,21 +69,8 @@ class ARP(object):
     @log
     def create(self, ip_address=None, mac_address=None, folder='Common'):
         """ Create an ARP static entry """
-        if not self.exists(ip_address=ip_address, folder=folder):
-            # ARP entries can't handle %0 on them like other
-            # TMOS objects.
-            ip_address = self._remove_route_domain_zero(ip_address)
-            try:
-                create_arp = self.net_arp.typefactory.create
-                entry = create_arp('Networking.ARP.StaticEntry')
-                entry.address = ip_address
-                entry.mac_address = mac_address
-                self.net_arp.add_static_entry([entry])
-                return True
-            except Exception as exc:
-                Log.error('ARP', 'create exception: ' + exc.message)
-                raise exceptions.StaticARPCreationException(exc.message)
-        return False
+        return self.create_many(entries={ip_address: mac_address},
+                                folder=folder) > 0
 
     # pylint: disable=pointless-string-statement
     '''
@@ -110,34 +98,142 @@ class ARP(object):
     @log
     def delete(self, ip_address=None, folder='Common'):
         """ Delete an ARP static entry """
-        if self.exists(ip_address=ip_address, folder=folder):
+        return self.delete_many(ip_addresses=[ip_address],
+                                folder=folder) > 0
+
+    @icontrol_folder
+    @log
+    def create_many(self, entries=None, folder='Common'):
+        """ Create ARP static entries, {ip_address: mac_address},
+            which do not exist yet with one add_static_entry call """
+        if not entries:
+            return 0
+        index = self._get_index()
+        create_arp = self.net_arp.typefactory.create
+        new_entries = []
+        for ip_address in entries:
+            if index.get(ip_address, folder):
+                continue
+            entry = create_arp('Networking.ARP.StaticEntry')
             # ARP entries can't handle %0 on them like other
             # TMOS objects.
-            ip_address = self._remove_route_domain_zero(ip_address)
+            entry.address = self._remove_route_domain_zero(ip_address)
+            entry.mac_address = entries[ip_address]
+            new_entries.append(entry)
+        if new_entries:
             try:
-                self.net_arp.delete_static_entry_v2(
-                    ['/' + folder + '/' + ip_address])
-                return True
+                self.net_arp.add_static_entry(new_entries)
+            except Exception as exc:
+                self.bigip.object_cache.invalidate('arp', '/', 'index')
+                Log.error('ARP', 'create exception: ' + exc.message)
+                raise exceptions.StaticARPCreationException(exc.message)
+            for entry in new_entries:
+                index.add(folder, entry.address, entry.address,
+                          entry.mac_address)
+        return len(new_entries)
+
+    @icontrol_folder
+    @log
+    def delete_many(self, ip_addresses=None, folder='Common'):
+        """ Delete ARP static entries which exist with one
+            delete_static_entry_v2 call """
+        if not ip_addresses:
+            return 0
+        index = self._get_index()
+        # entry full path -> ip address
+        entry_names = {}
+        for ip_address in ip_addresses:
+            entry = index.get(ip_address, folder)
+            if entry:
+                entry_names['/' + folder + '/' + entry[0]] = ip_address
+        if entry_names:
+            try:
+                self.net_arp.delete_static_entry_v2(list(entry_names.keys()))
             except Exception as exc:
+                self.bigip.object_cache.invalidate('arp', '/', 'index')
                 Log.error('ARP', 'delete exception: ' + exc.message)
                 raise exceptions.StaticARPDeleteException(exc.message)
-        return False
+            for ip_address in entry_names.values():
+                index.remove(ip_address)
+        return len(entry_names)
+
+    @icontrol_folder
+    @log
+    def replace_subnet(self, subnet=None, entries=None, folder='Common'):
+        """ Make entries, {ip_address: mac_address}, the ARP static
+            entries of a subnet. Entries on the subnet which are not
+            wanted, or have another MAC address, are deleted with one
+            call and the missing ones are created with another. """
+        network = self._get_network(subnet, None)
+        if not network:
+            return (0, 0)
+        route_domain = split_addr_route_domain(subnet.split('/')[0])[1]
+        if entries is None:
+            entries = {}
+        index = self._get_index()
+        wanted = {}
+        for ip_address in entries:
+            wanted[split_addr_route_domain(ip_address)] = \
+                entries[ip_address].lower()
+        stale = []
+        for (ip_address, mac_address) in index.find_network(
+                network, folder, route_domain):
+            if wanted.get(split_addr_route_domain(ip_address)) != \
+                    mac_address.lower():
+                stale.append(ip_address)
+        deleted = self.delete_many(ip_addresses=stale, folder=folder)
+        created = self.create_many(entries=entries, folder=folder)
+        return (created, deleted)
+
+    def _get_index(self):
+        """ ARPIndex of the device, read with one request and then
+            kept in the object cache """
+        (known, index) = self.bigip.object_cache.get('arp', '/', 'index')
+        if known:
+            return index
+        index = ARPIndex()
+        request_url = self.bigip.icr_url + '/net/arp'
+        request_url += '?$select=name,partition,ipAddress,macAddress'
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+        if response.status_code < 400:
+            response_obj = json.loads(response.text)
+            if 'items' in response_obj:
+                for arp in response_obj['items']:
+                    index.add(arp['partition'], arp['name'],
+                              arp['ipAddress'], arp['macAddress'])
+        elif response.status_code != 404:
+            Log.error('ARP', response.text)
+            raise exceptions.StaticARPQueryException(response.text)
+        self.bigip.object_cache.put('arp', '/', 'index', index)
+        return index
 
     @icontrol_folder
     @log
     def delete_by_mac(self, mac_address=None, folder='Common'):
         """ Delete an ARP static entry by MAC address """
         if mac_address:
-            arps = self.get_arps(None, folder)
-            for arp in arps:
-                for ip_address in arp:
-                    if arp[ip_address] == mac_address:
-                        self.delete(ip_address=ip_address, folder=folder)
+            self.delete_by_macs(mac_addresses=[mac_address], folder=folder)
+
+    @icontrol_folder
+    @log
+    def delete_by_macs(self, mac_addresses=None, folder='Common'):
+        """ Delete ARP static entries for any of the MAC addresses """
+        if mac_addresses:
+            ip_addresses = self._get_index().find_macs(
+                mac_addresses, folder)
+            self.delete_many(ip_addresses=ip_addresses, folder=folder)
 
     @icontrol_folder
     @log
     def delete_by_subnet(self, subnet=None, mask=None, folder='Common'):
         """ Delete ARP static entries on subnet """
+        if subnet:
+            return self._delete_by_network(folder,
+                                           self._get_network(subnet, mask))
+
+    def _get_network(self, subnet, mask):
+        """ IPNetwork of a subnet, without its route domain """
         if subnet:
             mask_div = subnet.find('/')
             if mask_div > 0:
@@ -150,9 +246,9 @@ class ARP(object):
                         network = netaddr.IPNetwork(subnet)
                 except Exception as exc:
                     Log.error('ARP', exc.message)
-                    return []
+                    return None
             elif not mask:
-                return []
+                return None
             else:
                 try:
                     rd_div = subnet.find('%')
@@ -163,36 +259,18 @@ class ARP(object):
                         network = netaddr.IPNetwork(subnet + '/' + mask)
                 except Exception as exc:
                     Log.error('ARP', exc.message)
-                    return []
-
-            return self._delete_by_network(folder, network)
+                    return None
+            return network
+        return None
 
     def _delete_by_network(self, folder, network):
         """ Delete for network """
         if not network:
             return []
-        mac_addresses = []
-        request_url = self.bigip.icr_url + '/net/arp'
-        request_filter = 'partition eq ' + folder
-        request_url += '?$filter=' + request_filter
-        response = self.bigip.icr_session.get(
-            request_url, timeout=const.CONNECTION_TIMEOUT)
-        if response.status_code < 400:
-            response_obj = json.loads(response.text)
-            if 'items' in response_obj:
-                for arp in response_obj['items']:
-                    ad_rd_div = arp['ipAddress'].find('%')
-                    if ad_rd_div > -1:
-                        address = netaddr.IPAddress(
-                            arp['ipAddress'][0:ad_rd_div])
-                    else:
-                        address = netaddr.IPAddress(arp['ipAddress'])
-
-                    if address in network:
-                        mac_addresses.append(arp['macAddress'])
-                        self.delete(arp['ipAddress'],
-                                    folder=arp['partition'])
-        return mac_addresses
+        arps = self._get_index().find_network(network, folder)
+        self.delete_many(ip_addresses=[arp[0] for arp in arps],
+                         folder=folder)
+        return [arp[1] for arp in arps]
 
     @icontrol_rest_folder
     @log
@@ -281,6 +359,8 @@ class ARP(object):
         except Exception as exc:
             Log.error('ARP', 'delete exception: ' + exc.message)
             raise exceptions.StaticARPDeleteException(exc.message)
+        finally:
+            self.bigip.object_cache.invalidate('arp', '/', 'index')
 
     # pylint: disable=pointless-string-statement
     '''
@@ -304,17 +384,7 @@ class ARP(object):
     @log
     def exists(self, ip_address=None, folder='Common'):
         """ Does ARP entry exist? """
-        # ARP entries can't handle %0 on them like other
-        # TMOS objects.
-        ip_address = self._remove_route_domain_zero(ip_address)
-        try:
-            arp_list = self.net_arp.get_static_entry_list()
-        except Exception as exc:
-            Log.error('ARP', 'query exception: %s on %s' %
-                      (exc.message, self.bigip.device_name))
-            raise exceptions.StaticARPQueryException(exc.message)
-
-        if '/' + folder + '/' + ip_address in arp_list:
+        if self._get_index().get(ip_address, folder):
             return True
         else:
             return False
@@ -325,3 +395,84 @@ class ARP(object):
         if decorator_index > 0:
             ip_address = ip_address[:decorator_index]
         return ip_address
+
+
+class ARPIndex(object):
+    """ Static ARP entries of a device by route domain and address.
+
+        Addresses are normalized, so an entry is found whichever way
+        its address is spelled, and route domain 0 is the same as no
+        route domain.
+    """
+    def __init__(self):
+        # route domain id -> {address: (name, folder, mac_address)}
+        self.route_domains = {}
+
+    def __len__(self):
+        return sum([len(addresses)
+                    for addresses in self.route_domains.values()])
+
+    def add(self, folder, name, ip_address, mac_address):
+        """ index an entry """
+        (address, route_domain) = split_addr_route_domain(ip_address)
+        addresses = self.route_domains.setdefault(route_domain, {})
+        addresses[address] = (name, folder, mac_address)
+
+    def remove(self, ip_address):
+        """ stop indexing an entry """
+        (address, route_domain) = split_addr_route_domain(ip_address)
+        addresses = self.route_domains.get(route_domain, {})
+        addresses.pop(address, None)
+        if not addresses:
+            self.route_domains.pop(route_domain, None)
+
+    def get(self, ip_address, folder):
+        """ (name, mac_address) of the entry in a folder, or None """
+        (address, route_domain) = split_addr_route_domain(ip_address)
+        entry = self.route_domains.get(route_domain, {}).get(address)
+        if entry and entry[1] == folder:
+            return (entry[0], entry[2])
+        return None
+
+    def find_network(self, network, folder, route_domain=None):
+        """ (ip_address, mac_address) of the entries in a folder which
+            are on an IPNetwork, in one or all route domains """
+        if route_domain is None:
+            route_domains = list(self.route_domains.keys())
+        else:
+            route_domains = [route_domain]
+        found = []
+        for route_domain in route_domains:
+            addresses = self.route_domains.get(route_domain, {})
+            for address in addresses:
+                (name, entry_folder, mac_address) = addresses[address]
+                if entry_folder != folder:
+                    continue
+                ip_addr = netaddr.IPAddress(address)
+                if ip_addr.version == network.version and \
+                        ip_addr in network:
+                    found.append((_join_addr_route_domain(
+                        address, route_domain), mac_address))
+        return found
+
+    def find_macs(self, mac_addresses, folder):
+        """ ip addresses of the entries in a folder for the MAC
+            addresses """
+        mac_addresses = set([mac.lower() for mac in mac_addresses])
+        found = []
+        for route_domain in self.route_domains:
+            addresses = self.route_domains[route_domain]
+            for address in addresses:
+                (name, entry_folder, mac_address) = addresses[address]
+                if entry_folder == folder and \
+                        mac_address.lower() in mac_addresses:
+                    found.append(_join_addr_route_domain(address,
+                                                         route_domain))
+        return found
+
+
+def _join_addr_route_domain(address, route_domain):
+    """ address%rd, or just the address in route domain 0 """
+    if route_domain:
+        return address + '%' + str(route_domain)
+    return address
@@ -18,6 +18,7 @@ from f5.common.logger import Log
 from f5.bigip import exceptions
 from f5.bigip.interfaces import log, undecorate_name
 
+from eventlet import greenthread
 import time
 import os
 import json
@@ -148,7 +149,7 @@ class Cluster(object):
         attempts = 0
         if force_now:
             self.sync_local_device_to_group(name)
-            time.sleep(sleep_delay)
+            self._wait_for_sync(name, dev_name, sleep_delay)
             attempts += 1
 
         while attempts < const.MAX_SYNC_ATTEMPTS:
@@ -163,47 +164,19 @@ class Cluster(object):
                     "Device %s - Synchronizing initial config to group %s"
                     % (dev_name, name))
                 self.sync_local_device_to_group(name)
-                time.sleep(sleep_delay)
+                self._wait_for_sync(name, dev_name, sleep_delay)
 
             elif state in ['Disconnected',
                            'Not All Devices Synced',
                            'Changes Pending']:
                 attempts += 1
-
-                last_log_time = 0
-                now = time.time()
-                wait_start_time = now
-                # Keep checking the sync state in a quick loop.
-                # We want to detect In Sync as quickly as possible.
-                while now - wait_start_time < sleep_delay:
-                    # Only log once per second
-                    if now - last_log_time >= 1:
-                        Log.info(
-                            'Cluster',
-                            'Device %s, Group %s not synced. '
-                            % (dev_name, name) +
-                            'Waiting. State is: %s'
-                            % state)
-                        last_log_time = now
-                    state = self.get_sync_status()
-                    if state in ['Standalone', 'In Sync']:
-                        break
-                    time.sleep(.5)
-                    now = time.time()
-                else:
-                    # if we didn't break out due to the group being in sync
-                    # then attempt to force a sync.
-                    self.sync_local_device_to_group(name)
-                    sleep_delay += const.SYNC_DELAY
-                    # no need to sleep here because we already spent the sleep
-                    # interval checking status.
-                    continue
-
-                # Only a break from the inner while loop due to Standalone or
-                # In Sync will reach here.
-                # Normal exit of the while loop reach the else statement
-                # above which continues the outer loop
-                break
+                state = self._wait_for_sync(name, dev_name, sleep_delay)
+                if state in ['Standalone', 'In Sync']:
+                    break
+                # the group did not get in sync by itself,
+                # so attempt to force a sync.
+                self.sync_local_device_to_group(name)
+                sleep_delay += const.SYNC_DELAY
 
             elif state == 'Sync Failure':
                 Log.info('Cluster',
@@ -225,7 +198,7 @@ class Cluster(object):
                          "Synchronizing config attempt %s to group %s:"
                          % (attempts, name) + " current state: %s" % state)
                 self.sync_local_device_to_group(name)
-                time.sleep(sleep_delay)
+                self._wait_for_sync(name, dev_name, sleep_delay)
                 sleep_delay += const.SYNC_DELAY
         else:
             if state == 'Disconnected':
@@ -253,6 +226,34 @@ class Cluster(object):
         Log.debug('Cluster', 'SYNC SECONDS(Success): ' +
                   str(time.time() - sync_start_time))
 
+    def _wait_for_sync(self, name, dev_name, timeout):
+        """ Wait up to timeout seconds for the group to get in sync.
+
+            The sync state is checked quickly at first, to notice In Sync
+            as soon as possible, then less and less often. Waiting yields
+            to other greenthreads. Returns the last state seen.
+        """
+        wait_start_time = time.time()
+        poll_delay = const.SYNC_POLL_DELAY
+        last_log_time = 0
+        while True:
+            state = self.get_sync_status()
+            if state in ['Standalone', 'In Sync']:
+                return state
+            now = time.time()
+            remaining = timeout - (now - wait_start_time)
+            if remaining <= 0:
+                return state
+            # Only log once per second
+            if now - last_log_time >= 1:
+                Log.info('Cluster',
+                         'Device %s, Group %s not synced. '
+                         % (dev_name, name) +
+                         'Waiting. State is: %s' % state)
+                last_log_time = now
+            greenthread.sleep(min(poll_delay, remaining))
+            poll_delay = min(poll_delay * 2, const.SYNC_POLL_MAX_DELAY)
+
     @log
     def sync_failover_dev_group_exists(self, name):
         """ Does the sync failover device group exist? """
@@ -319,7 +320,7 @@ class Cluster(object):
                     else:
                         self.bigip.device.release_lock()
                         return
-                    time.sleep(const.PEER_ADD_ATTEMPT_DELAY)
+                    greenthread.sleep(const.PEER_ADD_ATTEMPT_DELAY)
                     attempts += 1
                 else:
                     raise exceptions.BigIPClusterPeerAddFailure(
@@ -58,9 +58,9 @@ class IApp(object):
             response = self.bigip.icr_session.post(
                 request_url, data=json.dumps(service),
                 timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                return True
-            elif response.status_code == 409 or response.status_code == 404:
+            if response.status_code < 400 or response.status_code == 409 or \
+                    response.status_code == 404:
+                self.bigip.object_cache.invalidate(folder=folder)
                 return True
             else:
                 Log.error('IAPP', response.text)
@@ -95,6 +95,7 @@ class IApp(object):
             request_url, data=json.dumps(service),
             timeout=const.CONNECTION_TIMEOUT)
         if response.status_code < 400:
+            self.bigip.object_cache.invalidate(folder=folder)
             return True
         else:
             # ignore this anomaly for now
@@ -114,9 +115,9 @@ class IApp(object):
         request_url += '~' + folder + '~' + name + '.app~' + name
         response = self.bigip.icr_session.delete(
             request_url, timeout=const.CONNECTION_TIMEOUT)
-        if response.status_code < 400:
-            return True
-        elif response.status_code == 404:
+        if response.status_code < 400 or response.status_code == 404:
+            # the service took the objects it created with it
+            self.bigip.object_cache.invalidate(folder=folder)
             return True
         else:
             Log.error('IAPP', response.text)
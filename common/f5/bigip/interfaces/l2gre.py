@@ -17,7 +17,6 @@ from f5.common.logger import Log
 from f5.common import constants as const
 from f5.bigip.interfaces import icontrol_rest_folder
 from f5.bigip.interfaces import strip_folder_and_prefix
-from f5.bigip.interfaces import prefixed
 from f5.bigip.interfaces import log
 from f5.bigip import exceptions
 
@@ -126,9 +125,10 @@ class L2GRE(object):
             response_obj = json.loads(response.text)
             if const.FDB_POPULATE_STATIC_ARP:
                 if 'records' in response_obj:
-                    for record in response_obj['records']:
-                        self.bigip.arp.delete_by_mac(
-                            mac_address=record['name'], folder=folder)
+                    self.bigip.arp.delete_by_macs(
+                        mac_addresses=[record['name'] for record
+                                       in response_obj['records']],
+                        folder=folder)
             payload = dict()
             payload['records'] = []
             tunnel_link = self.bigip.icr_link(response_obj['selfLink'])
@@ -142,6 +142,8 @@ class L2GRE(object):
             Log.error('fdb', response.text)
             raise exceptions.L2GRETunnelQueryException(response.text)
 
+        self.bigip.object_cache.invalidate('fdb', folder, name)
+        self.bigip.fdb_locks.pop((folder, name), None)
         request_url = self.bigip.icr_url + '/net/tunnels/tunnel/'
         request_url += '~' + folder + '~' + name
         response = self.bigip.icr_session.delete(
@@ -219,105 +221,25 @@ class L2GRE(object):
                       vtep_ip_address=None,
                       arp_ip_address=None,
                       folder=None):
-        folder = str(folder).replace('/', '')
-        request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
-        request_url += '~' + folder + '~' + tunnel_name + '?ver=11.5.0'
-        records = self.get_fdb_entry(tunnel_name=tunnel_name,
-                                     mac=None,
-                                     folder=folder)
-        fdb_entry = dict()
-        fdb_entry['name'] = mac_address
-        fdb_entry['endpoint'] = vtep_ip_address
-
-        for i in range(len(records)):
-            if records[i]['name'] == mac_address:
-                records[i] = fdb_entry
-                break
-        else:
-            records.append(fdb_entry)
-
-        payload = dict()
-        payload['records'] = records
-        response = self.bigip.icr_session.patch(
-            request_url, data=json.dumps(payload),
-            timeout=const.CONNECTION_TIMEOUT)
-        if response.status_code < 400:
-            if const.FDB_POPULATE_STATIC_ARP:
-                if arp_ip_address:
-                    try:
-                        if self.bigip.arp.create(ip_address=arp_ip_address,
-                                                 mac_address=mac_address,
-                                                 folder=folder):
-                            return True
-                        else:
-                            return False
-                    except Exception as e:
-                        Log.error('L2GRE',
-                                  'could not create static arp: %s'
-                                  % e.message)
-                        return False
-            return True
-        else:
-            Log.error('L2GRE', response.text)
-            raise exceptions.L2GRETunnelUpdateException(response.text)
-        return False
+        """ Add fdb entry for a tunnel """
+        records = {mac_address: {'endpoint': vtep_ip_address,
+                                 'ip_address': arp_ip_address}}
+        return self.update_fdb_entries(tunnel_name=tunnel_name,
+                                       folder=folder,
+                                       add_records=records)
 
     @icontrol_rest_folder
     @log
     def add_fdb_entries(self, fdb_entries=None):
         """ Add fdb entries for a tunnel """
+        changed = False
         for tunnel_name in fdb_entries:
-            folder = fdb_entries[tunnel_name]['folder']
-            if folder != 'Common':
-                folder = prefixed(folder)
-            request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
-            request_url += '~' + folder + '~' + self.OBJ_PREFIX + \
-                tunnel_name + '?ver=11.5.0'
-            existing_records = self.get_fdb_entry(tunnel_name=tunnel_name,
-                                                  mac=None,
-                                                  folder=folder)
-            new_records = []
-            new_mac_addresses = []
-            new_arp_addresses = {}
-
-            tunnel_records = fdb_entries[tunnel_name]['records']
-            for mac in tunnel_records:
-                fdb_entry = dict()
-                fdb_entry['name'] = mac
-                fdb_entry['endpoint'] = tunnel_records[mac]['endpoint']
-                new_records.append(fdb_entry)
-                new_mac_addresses.append(mac)
-                if tunnel_records[mac]['ip_address']:
-                    new_arp_addresses[mac] = tunnel_records[mac]['ip_address']
-
-            for record in existing_records:
-                if not record['name'] in new_mac_addresses:
-                    new_records.append(record)
-                else:
-                    # This fdb entry exists and is not being updated.
-                    # So, do not update the ARP record either.
-                    if record['name'] in new_arp_addresses:
-                        del new_arp_addresses[record['name']]
-
-            payload = dict()
-            payload['records'] = new_records
-            response = self.bigip.icr_session.patch(
-                request_url, data=json.dumps(payload),
-                timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                if const.FDB_POPULATE_STATIC_ARP:
-                    for mac in new_arp_addresses:
-                        try:
-                            self.bigip.arp.create(
-                                ip_address=new_arp_addresses[mac],
-                                mac_address=mac,
-                                folder=folder)
-                        except Exception as exc:
-                            Log.error('L2GRE',
-                                      'could not create static arp: %s'
-                                      % exc.message)
-            return True
-        return False
+            if self.update_fdb_entries(
+                    tunnel_name=tunnel_name,
+                    folder=fdb_entries[tunnel_name]['folder'],
+                    add_records=fdb_entries[tunnel_name]['records']):
+                changed = True
+        return changed
 
     @icontrol_rest_folder
     @log
@@ -327,77 +249,118 @@ class L2GRE(object):
                          arp_ip_address=None,
                          folder='Common'):
         """ Delete fdb entry for a tunnel """
-        folder = str(folder).replace('/', '')
-        if const.FDB_POPULATE_STATIC_ARP:
-            if arp_ip_address:
-                self.bigip.arp.delete(ip_address=arp_ip_address,
-                                      folder=folder)
-        request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
-        request_url += '~' + folder + '~' + tunnel_name + '?ver=11.5.0'
-        records = self.get_fdb_entry(tunnel_name=tunnel_name,
-                                     mac=None,
-                                     folder=folder)
-        if not records:
-            return False
-        original_len = len(records)
-        records = [record for record in records
-                   if record.get('name') != mac_address]
-        if original_len != len(records):
-            if len(records) == 0:
-                records = None
-            payload = dict()
-            payload['records'] = records
-            response = self.bigip.icr_session.patch(
-                request_url, data=json.dumps(payload),
-                timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                return True
-            elif response.status_code == 404:
-                return True
-            else:
-                Log.error('L2GRE', response.text)
-                raise exceptions.L2GRETunnelUpdateException(response.text)
-            return False
-        return False
+        records = {mac_address: {'endpoint': None,
+                                 'ip_address': arp_ip_address}}
+        return self.update_fdb_entries(tunnel_name=tunnel_name,
+                                       folder=folder,
+                                       remove_records=records)
 
     @icontrol_rest_folder
     @log
     def delete_fdb_entries(self, tunnel_name=None, fdb_entries=None):
         """ Delete fdb entries for a tunnel """
+        changed = False
         for tunnel_name in fdb_entries:
-            folder = fdb_entries[tunnel_name]['folder']
-            if folder != 'Common':
-                folder = prefixed(folder)
-            request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
-            request_url += '~' + folder + '~' + tunnel_name + '?ver=11.5.0'
-            existing_records = self.get_fdb_entry(tunnel_name=tunnel_name,
-                                                  mac=None,
-                                                  folder=folder)
-            arps_to_delete = {}
-            new_records = []
-
-            for record in existing_records:
-                for mac in fdb_entries[tunnel_name]['records']:
-                    if record['name'] == mac and mac['ip_address']:
-                        arps_to_delete[mac] = mac['ip_address']
-                        break
-                else:
-                    new_records.append(record)
+            if self.update_fdb_entries(
+                    tunnel_name=tunnel_name,
+                    folder=fdb_entries[tunnel_name]['folder'],
+                    remove_records=fdb_entries[tunnel_name]['records']):
+                changed = True
+        return changed
 
-            if len(new_records) == 0:
-                new_records = None
-            payload = dict()
-            payload['records'] = new_records
-            response = self.bigip.icr_session.patch(
-                request_url, data=json.dumps(payload),
-                timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                if const.FDB_POPULATE_STATIC_ARP:
-                    for mac in arps_to_delete:
-                        self.bigip.arp.delete(ip_address=arps_to_delete[mac],
-                                              folder='Common')
-            return True
-        return False
+    @icontrol_rest_folder
+    @log
+    def update_fdb_entries(self, tunnel_name=None, folder='Common',
+                           add_records=None, remove_records=None):
+        """ Add and remove fdb entries for a tunnel with one update.
+
+            Records map mac addresses to {'endpoint': <vtep ip>,
+            'ip_address': <arp ip>}. The tunnel is only patched when
+            the records differ from what it has, and a record, with
+            its static arp entry, is only removed while it still points
+            at its endpoint, if one is given. Returns whether the tunnel
+            records changed.
+        """
+        folder = str(folder).replace('/', '')
+        # the records are read, changed and written back whole
+        with self.bigip.get_fdb_lock(folder, tunnel_name):
+            records = self._get_fdb_records(tunnel_name, folder)
+            changed = False
+            old_arps = []
+            new_arps = {}
+            if remove_records:
+                for mac in remove_records:
+                    endpoint = remove_records[mac]['endpoint']
+                    if mac in records and \
+                            (not endpoint or records[mac] == endpoint):
+                        del records[mac]
+                        changed = True
+                        # a record kept for another endpoint keeps its arp
+                        if remove_records[mac]['ip_address']:
+                            old_arps.append(
+                                remove_records[mac]['ip_address'])
+            if add_records:
+                for mac in add_records:
+                    endpoint = add_records[mac]['endpoint']
+                    if records.get(mac) != endpoint:
+                        records[mac] = endpoint
+                        changed = True
+                    if add_records[mac]['ip_address']:
+                        new_arps[add_records[mac]['ip_address']] = mac
+
+            if changed:
+                request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
+                request_url += '~' + folder + '~' + tunnel_name + '?ver=11.5.0'
+                payload = dict()
+                payload['records'] = [{'name': mac, 'endpoint': records[mac]}
+                                      for mac in sorted(records)] or None
+                response = self.bigip.icr_session.patch(
+                    request_url, data=json.dumps(payload),
+                    timeout=const.CONNECTION_TIMEOUT)
+                if response.status_code < 400:
+                    self.bigip.object_cache.put('fdb', folder, tunnel_name,
+                                                records)
+                elif response.status_code == 404:
+                    self.bigip.object_cache.invalidate('fdb', folder,
+                                                       tunnel_name)
+                    return False
+                else:
+                    self.bigip.object_cache.invalidate('fdb', folder,
+                                                       tunnel_name)
+                    Log.error('L2GRE', response.text)
+                    raise exceptions.L2GRETunnelUpdateException(response.text)
+
+        if const.FDB_POPULATE_STATIC_ARP and (old_arps or new_arps):
+            try:
+                if old_arps:
+                    self.bigip.arp.delete_many(ip_addresses=old_arps,
+                                               folder=folder)
+                if new_arps:
+                    self.bigip.arp.create_many(entries=new_arps,
+                                               folder=folder)
+            except Exception as exc:
+                Log.error('L2GRE',
+                          'could not update static arps: %s on %s'
+                          % (exc.message, self.bigip.device_name))
+        return changed
+
+    def _get_fdb_records(self, tunnel_name, folder):
+        """ Endpoints of the tunnel records by mac address.
+
+            The records are kept in the object cache, so only the
+            first update of a tunnel reads them from the device.
+        """
+        (known, records) = self.bigip.object_cache.get('fdb', folder,
+                                                       tunnel_name)
+        if not known:
+            records = {}
+            for record in self.get_fdb_entry(tunnel_name=tunnel_name,
+                                             mac=None,
+                                             folder=folder):
+                records[record['name']] = record.get('endpoint')
+            self.bigip.object_cache.put('fdb', folder, tunnel_name,
+                                        records)
+        return dict(records)
 
     @icontrol_rest_folder
     @log
@@ -406,9 +369,11 @@ class L2GRE(object):
         folder = str(folder).replace('/', '')
         request_url = self.bigip.icr_url + '/net/fdb/tunnel/'
         request_url += '~' + folder + '~' + tunnel_name + '?ver=11.5.0'
-        response = self.bigip.icr_session.patch(
-            request_url, data=json.dumps({'records': None}),
-            timeout=const.CONNECTION_TIMEOUT)
+        with self.bigip.get_fdb_lock(folder, tunnel_name):
+            response = self.bigip.icr_session.patch(
+                request_url, data=json.dumps({'records': None}),
+                timeout=const.CONNECTION_TIMEOUT)
+            self.bigip.object_cache.invalidate('fdb', folder, tunnel_name)
         if response.status_code < 400 or response.status_code == 404:
             return True
         else:
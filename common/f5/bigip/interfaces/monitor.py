@@ -65,9 +65,9 @@ class Monitor(object):
         response = self.bigip.icr_session.post(
             request_url, data=json.dumps(payload),
             timeout=const.CONNECTION_TIMEOUT)
-        if response.status_code < 400:
-            return True
-        elif response.status_code == 409:
+        if response.status_code < 400 or response.status_code == 409:
+            self.bigip.object_cache.put('monitor', folder,
+                                        mon_type + '/' + name, True)
             return True
         else:
             Log.error('monitor', response.text)
@@ -85,9 +85,9 @@ class Monitor(object):
             request_url += '~' + folder + '~' + name
             response = self.bigip.icr_session.delete(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                return True
-            elif response.status_code == 404:
+            if response.status_code < 400 or response.status_code == 404:
+                self.bigip.object_cache.put('monitor', folder,
+                                            mon_type + '/' + name, False)
                 return True
             else:
                 Log.error('monitor', response.text)
@@ -132,6 +132,7 @@ class Monitor(object):
                                     Log.error('monitor', response.text)
                                     raise exceptions.MonitorDeleteException(
                                         response.text)
+            self.bigip.object_cache.invalidate('monitor', folder)
             return True
         elif response.status_code != 404:
             Log.error('monitor', response.text)
@@ -383,17 +384,50 @@ class Monitor(object):
         folder = str(folder).replace('/', '')
         if name and mon_type:
             mon_type = self._get_monitor_rest_type(mon_type)
+            cache_name = mon_type + '/' + name
+            (known, found) = self.bigip.object_cache.get('monitor', folder,
+                                                         cache_name)
+            if known:
+                return found
             request_url = self.bigip.icr_url + '/ltm/monitor/' + mon_type + '/'
             request_url += '~' + folder + '~' + name
             response = self.bigip.icr_session.get(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400:
+                self.bigip.object_cache.put('monitor', folder, cache_name,
+                                            True)
                 return True
             else:
+                if response.status_code == 404:
+                    self.bigip.object_cache.put('monitor', folder,
+                                                cache_name, False)
                 return False
         else:
             return False
 
+    @icontrol_rest_folder
+    @log
+    def get_config(self, name=None, mon_type=None, folder='Common'):
+        """ Get monitor interval, timeout, send and receive strings """
+        folder = str(folder).replace('/', '')
+        if name and mon_type:
+            mon_type = self._get_monitor_rest_type(mon_type)
+            request_url = self.bigip.icr_url + '/ltm/monitor/' + mon_type + '/'
+            request_url += '~' + folder + '~' + name
+            request_url += '/?$select=interval,timeout,send,recv'
+            response = self.bigip.icr_session.get(
+                request_url, timeout=const.CONNECTION_TIMEOUT)
+            if response.status_code < 400:
+                return_obj = json.loads(response.text)
+                return {'interval': return_obj.get('interval', 0),
+                        'timeout': return_obj.get('timeout', 0),
+                        'send': return_obj.get('send', None),
+                        'recv': return_obj.get('recv', None)}
+            elif response.status_code != 404:
+                Log.error('monitor', response.text)
+                raise exceptions.MonitorQueryException(response.text)
+        return None
+
     @icontrol_rest_folder
     @log
     def get_monitors(self, folder='Common'):
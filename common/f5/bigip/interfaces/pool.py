@@ -47,9 +47,8 @@ class Pool(object):
             response = self.bigip.icr_session.post(
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                return True
-            elif response.status_code == 409:
+            if response.status_code < 400 or response.status_code == 409:
+                self.bigip.object_cache.put('pool', folder, name, True)
                 return True
             else:
                 Log.error('pool', response.text)
@@ -79,6 +78,7 @@ class Pool(object):
             response = self.bigip.icr_session.delete(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400 or response.status_code == 404:
+                self.bigip.object_cache.put('pool', folder, name, False)
                 for node_address in node_addresses:
                     node_url = self.bigip.icr_url + '/ltm/node/'
                     node_url += '~' + folder + '~' + urllib.quote(node_address)
@@ -123,7 +123,7 @@ class Pool(object):
             except Exception as exc:
                 Log.error('ARP', exc.message)
             fdb_req = self.bigip.icr_url + '/net/fdb/tunnel'
-            fdb_req += '?$select=records,selfLink'
+            fdb_req += '?$select=name,records'
             fdb_req += '&$filter=partition eq ' + folder
             response = self.bigip.icr_session.get(
                 fdb_req, timeout=const.CONNECTION_TIMEOUT)
@@ -135,21 +135,23 @@ class Pool(object):
             for tunnel in fdb_obj['items']:
                 if 'records' not in tunnel:
                     continue
-                records = list(tunnel['records'])
-                need_to_update = False
                 for record in tunnel['records']:
-                    if record['name'] == arp['macAddress']:
-                        records.remove(record)
-                        need_to_update = True
-                if need_to_update:
-                    payload = dict()
-                    payload['records'] = records
-                    response = self.bigip.icr_session.put(
-                        self.bigip.icr_link(tunnel['selfLink']),
-                        data=json.dumps(payload),
-                        timeout=const.CONNECTION_TIMEOUT)
-                if response.status_code > 399:
-                    Log.error('fdb', response.text)
+                    if record['name'] != arp['macAddress']:
+                        continue
+                    # the tunnel interface serializes record updates
+                    if '_tunnel-gre-' in tunnel['name']:
+                        tunnel_interface = self.bigip.l2gre
+                    else:
+                        tunnel_interface = self.bigip.vxlan
+                    try:
+                        tunnel_interface.update_fdb_entries(
+                            tunnel_name=tunnel['name'], folder=folder,
+                            remove_records={
+                                record['name']: {'endpoint': None,
+                                                 'ip_address': None}})
+                    except Exception as exc:
+                        Log.error('fdb', exc.message)
+                    break
 
     @icontrol_rest_folder
     @log
@@ -199,6 +201,45 @@ class Pool(object):
             return members
         return None
 
+    @icontrol_rest_folder
+    @log
+    def get_config(self, name=None, folder='Common'):
+        # lb method, description, monitors and members in one
+        # request. None means the pool does not exist.
+        if name:
+            folder = str(folder).replace('/', '')
+            request_url = self.bigip.icr_url + '/ltm/pool/'
+            request_url += '~' + folder + '~' + name
+            request_url += '?expandSubcollections=true'
+            response = self.bigip.icr_session.get(
+                request_url, timeout=const.CONNECTION_TIMEOUT)
+            if response.status_code < 400:
+                response_obj = json.loads(response.text)
+                config = dict()
+                config['lb_method'] = self._get_lb_method_from_rest_type(
+                    response_obj.get('loadBalancingMode', 'round-robin'))
+                config['description'] = response_obj.get('description', '')
+                config['monitors'] = []
+                if 'monitor' in response_obj:
+                    for w in response_obj['monitor'].split():
+                        if w.startswith('/'):
+                            config['monitors'].append(
+                                strip_folder_and_prefix(w))
+                config['members'] = []
+                members_obj = response_obj.get('membersReference', {})
+                for member in members_obj.get('items', []):
+                    (addr, port) = split_addr_port(member['name'])
+                    config['members'].append(
+                        {'addr': addr,
+                         'port': int(port),
+                         'session': member.get('session', 'user-enabled'),
+                         'ratio': int(member.get('ratio', 1))})
+                return config
+            elif response.status_code != 404:
+                Log.error('pool', response.text)
+                raise exceptions.PoolQueryException(response.text)
+        return None
+
     @icontrol_rest_folder
     @log
     def get_pools(self, folder='Common'):
@@ -359,6 +400,112 @@ class Pool(object):
             raise exceptions.PoolQueryException(response.text)
         return return_stats
 
+    @icontrol_rest_folder
+    @log
+    def get_all_statistics(self, folder=None):
+        # statistics for every pool in one request,
+        # keyed by (folder, pool name)
+        request_url = self.bigip.icr_url + '/ltm/pool/stats'
+        if folder:
+            folder = str(folder).replace('/', '')
+            request_url += '?$filter=partition%20eq%20' + folder
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+        all_stats = {}
+        if response.status_code < 400:
+            return_obj = json.loads(response.text)
+            for stats in self._get_nested_stats(return_obj):
+                pool_stats = {}
+                for name in stats:
+                    value = None
+                    if 'value' in stats[name]:
+                        value = stats[name]['value']
+                    if 'description' in stats[name]:
+                        value = stats[name]['description']
+                    if value is None:
+                        continue
+                    if name == 'tmName':
+                        pool_stats['POOL_PATH'] = value
+                    (st, val) = self._get_icontrol_stat(name, value)
+                    if st:
+                        pool_stats[st] = val
+                if 'POOL_PATH' not in pool_stats:
+                    Log.error('poolstats', 'stats without pool name')
+                    continue
+                all_stats[self._get_pool_key(pool_stats['POOL_PATH'])] = \
+                    pool_stats
+        elif response.status_code != 404:
+            Log.error('pool', response.text)
+            raise exceptions.PoolQueryException(response.text)
+        return all_stats
+
+    @icontrol_rest_folder
+    @log
+    def get_all_members_monitor_status(self, folder=None):
+        # member monitor states for every pool, one page of
+        # pools per request, keyed by (folder, pool name)
+        request_url = self.bigip.icr_url + '/ltm/pool'
+        request_url += '?expandSubcollections=true'
+        request_url += '&$select=name,partition,subPath,membersReference'
+        if folder:
+            folder = str(folder).replace('/', '')
+            request_url += '&$filter=partition%20eq%20' + folder
+        request_url += '&$top=' + str(const.POOL_QUERY_PAGE_SIZE)
+        all_members = {}
+        skip = 0
+        while True:
+            response = self.bigip.icr_session.get(
+                request_url + '&$skip=' + str(skip),
+                timeout=const.CONNECTION_TIMEOUT)
+            if response.status_code >= 400:
+                if response.status_code == 404:
+                    break
+                Log.error('pool', response.text)
+                raise exceptions.PoolQueryException(response.text)
+            return_obj = json.loads(response.text)
+            items = return_obj.get('items', [])
+            for pool in items:
+                path = '/' + pool['partition'] + '/'
+                if 'subPath' in pool:
+                    path += pool['subPath'] + '/'
+                path += pool['name']
+                members = []
+                members_ref = pool.get('membersReference', {})
+                for member in members_ref.get('items', []):
+                    (addr, port) = split_addr_port(member['name'])
+                    members.append(
+                        {'addr': addr,
+                         'port': port,
+                         'state': 'MONITOR_STATUS_' +
+                                  member['state'].upper()})
+                all_members[self._get_pool_key(path)] = members
+            # a device which does not page returns everything at once
+            if not items or 'nextLink' not in return_obj:
+                break
+            skip += len(items)
+        return all_members
+
+    @staticmethod
+    def _get_nested_stats(stats_obj):
+        # the per pool stats entries in a stats collection, which
+        # TMOS versions nest at different depths
+        found = []
+        entries = stats_obj.get('entries', {})
+        if 'tmName' in entries:
+            found.append(entries)
+            return found
+        for key in entries:
+            if 'nestedStats' in entries[key]:
+                found.extend(
+                    Pool._get_nested_stats(entries[key]['nestedStats']))
+        return found
+
+    @staticmethod
+    def _get_pool_key(path):
+        # (folder, name) for /folder/name or /folder/name.app/name
+        path = str(path).replace('~', '/')
+        return (path.split('/')[1], os.path.basename(path))
+
     @icontrol_rest_folder
     @log
     def add_member(self, name=None, ip_address=None, port=None,
@@ -507,25 +654,134 @@ class Pool(object):
                 request_url, timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400 or response.status_code == 404:
                 # delete nodes
-                node_req = self.bigip.icr_url + '/ltm/node/'
-                node_req += '~' + folder + '~' + urllib.quote(ip_address)
-                response = self.bigip.icr_session.delete(
-                    node_req, timeout=const.CONNECTION_TIMEOUT)
-                if response.status_code == 400 and \
-                        response.text.find('is referenced') > 0:
-                    # Node address is part of multiple pools
-                    pass
-                elif response.status_code > 399 and \
-                        (not response.status_code == 404):
-                    Log.error('node', response.text)
-                    raise exceptions.PoolDeleteException(response.text)
-                else:
-                    self._del_arp_and_fdb(ip_address, folder)
+                self._delete_node(ip_address, folder)
             else:
                 Log.error('pool', response.text)
                 raise exceptions.PoolDeleteException(response.text)
         return False
 
+    def _delete_node(self, ip_address, folder):
+        node_req = self.bigip.icr_url + '/ltm/node/'
+        node_req += '~' + folder + '~' + urllib.quote(ip_address)
+        response = self.bigip.icr_session.delete(
+            node_req, timeout=const.CONNECTION_TIMEOUT)
+        if response.status_code == 400 and \
+                response.text.find('is referenced') > 0:
+            # Node address is part of multiple pools
+            pass
+        elif response.status_code > 399 and \
+                (not response.status_code == 404):
+            Log.error('node', response.text)
+            raise exceptions.PoolDeleteException(response.text)
+        else:
+            self._del_arp_and_fdb(ip_address, folder)
+
+    @icontrol_rest_folder
+    @log
+    def update_members(self, name=None, add_members=None,
+                       update_members=None, remove_members=None,
+                       existing_members=None, folder='Common'):
+        # Add, update and remove many members of a pool with one PATCH
+        # of the pool's members. Members are dicts with 'addr' and
+        # 'port', plus 'session' and 'ratio' when they should be set.
+        # existing_members are the members of the pool as returned by
+        # get_config, and are read when not given. The PATCH replaces
+        # the whole member set, so members which stay are sent with
+        # their session and ratio. Nodes of removed members are then
+        # deleted with one request each.
+        if not name:
+            return False
+        add_members = add_members or []
+        update_members = update_members or []
+        remove_members = remove_members or []
+        if not (add_members or update_members or remove_members):
+            return True
+        folder = str(folder).replace('/', '')
+        request_url = self.bigip.icr_url + '/ltm/pool/'
+        request_url += '~' + folder + '~' + name
+        for attempt in range(2):
+            if existing_members is None:
+                config = self.get_config(name=name, folder=folder)
+                if config is None:
+                    Log.error('pool',
+                              'tried to update members of non-existant '
+                              'pool %s.' % ('/' + folder + '/' + name))
+                    return False
+                existing_members = config['members']
+            payload = dict()
+            payload['members'] = self._merge_members(
+                existing_members, add_members, update_members,
+                remove_members, folder)
+            response = self.bigip.icr_session.patch(
+                request_url, data=json.dumps(payload),
+                timeout=const.CONNECTION_TIMEOUT)
+            if response.status_code < 400:
+                break
+            elif response.status_code == 404:
+                Log.error('pool',
+                          'tried to update members of non-existant pool %s.'
+                          % ('/' + folder + '/' + name))
+                return False
+            elif response.status_code == 409 and attempt == 0:
+                # members were added since the pool was read, so
+                # read them again and keep them instead of adding
+                existing_members = None
+            else:
+                Log.error('pool', response.text)
+                raise exceptions.PoolUpdateException(response.text)
+        for member in remove_members:
+            self._delete_node(member['addr'], folder)
+        return True
+
+    def _merge_members(self, existing_members, add_members,
+                       update_members, remove_members, folder):
+        # The member set of a pool after the changes
+        members = dict()
+        for member in existing_members:
+            payload = self._get_member_attributes(member)
+            # monitor-enabled is reported, but only user-enabled is set
+            if 'session' in payload and \
+                    payload['session'] != 'user-disabled':
+                payload['session'] = 'user-enabled'
+            payload['name'] = self._get_member_name(member)
+            payload['partition'] = folder
+            payload['address'] = member['addr']
+            members[payload['name']] = payload
+        for member in remove_members:
+            members.pop(self._get_member_name(member), None)
+        for member in update_members:
+            member_name = self._get_member_name(member)
+            if member_name in members:
+                members[member_name].update(
+                    self._get_member_attributes(member))
+        for member in add_members:
+            member_name = self._get_member_name(member)
+            if member_name not in members:
+                members[member_name] = {'name': member_name,
+                                        'partition': folder,
+                                        'address': member['addr']}
+            members[member_name].update(self._get_member_attributes(member))
+        return [members[member_name] for member_name in sorted(members)]
+
+    @staticmethod
+    def _get_member_name(member, quote=False):
+        addr = member['addr']
+        if quote:
+            addr = urllib.quote(addr)
+        if ':' in member['addr']:
+            return addr + '.' + str(member['port'])
+        else:
+            return addr + ':' + str(member['port'])
+
+    @staticmethod
+    def _get_member_attributes(member):
+        attributes = dict()
+        if 'session' in member:
+            attributes['session'] = member['session']
+        if 'ratio' in member:
+            attributes['ratio'] = member['ratio']
+        return attributes
+
     @icontrol_rest_folder
     @log
     def delete_all_nodes(self, folder='Common'):
@@ -658,27 +914,8 @@ class Pool(object):
                 if 'loadBalancingMode' not in response_obj:
                     return 'round-robin'
                 else:
-                    if response_obj['loadBalancingMode'] == \
-                            'least-connections-member':
-                        return 'LEAST_CONNECTIONS'
-                    if response_obj['loadBalancingMode'] == \
-                            'ratio-least-connections-member':
-                        return 'RATIO_LEAST_CONNECTIONS'
-                    if response_obj['loadBalancingMode'] == \
-                            'least-connections-node':
-                        return 'SOURCE_IP'
-                    if response_obj['loadBalancingMode'] == \
-                            'observed-member':
-                        return 'OBSERVED_MEMBER'
-                    if response_obj['loadBalancingMode'] == \
-                            'predictive-member':
-                        return 'PREDICTIVE_MEMBER'
-                    if response_obj['loadBalancingMode'] == \
-                            'ratio-member':
-                        return 'RATIO'
-                    if response_obj['loadBalancingMode'] == \
-                            'round-robin':
-                        return 'ROUND_ROBIN'
+                    return self._get_lb_method_from_rest_type(
+                        response_obj['loadBalancingMode'])
             elif response.status_code == 404:
                 Log.error(
                     'pool',
@@ -922,6 +1159,23 @@ class Pool(object):
         else:
             return 'round-robin'
 
+    def _get_lb_method_from_rest_type(self, lb_method_type):
+        if lb_method_type == 'least-connections-member':
+            return 'LEAST_CONNECTIONS'
+        elif lb_method_type == 'ratio-least-connections-member':
+            return 'RATIO_LEAST_CONNECTIONS'
+        elif lb_method_type == 'least-connections-node':
+            return 'SOURCE_IP'
+        elif lb_method_type == 'observed-member':
+            return 'OBSERVED_MEMBER'
+        elif lb_method_type == 'predictive-member':
+            return 'PREDICTIVE_MEMBER'
+        elif lb_method_type == 'ratio-member':
+            return 'RATIO'
+        elif lb_method_type == 'round-robin':
+            return 'ROUND_ROBIN'
+        return None
+
     def _get_icontrol_stat(self, name, value):
         if name == "activeMemberCnt":
             return ('POOL_ACTIVE_MEMBERS', value)
@@ -987,19 +1241,26 @@ class Pool(object):
     @log
     def exists(self, name=None, folder='Common', config_mode='object'):
         folder = str(folder).replace('/', '')
-        request_url = self.bigip.icr_url + '/ltm/pool/'
         if config_mode == 'iapp':
-            request_url += '~' + folder + '~' + name + '.app~' + name
+            pool_name = name + '.app~' + name
         else:
-            request_url += '~' + folder + '~' + name
+            pool_name = name
+        (known, found) = self.bigip.object_cache.get('pool', folder,
+                                                     pool_name)
+        if known:
+            return found
+        request_url = self.bigip.icr_url + '/ltm/pool/'
+        request_url += '~' + folder + '~' + pool_name
         request_url += '?$select=name'
         response = self.bigip.icr_session.get(
             request_url, timeout=const.CONNECTION_TIMEOUT)
         if response.status_code < 400:
+            self.bigip.object_cache.put('pool', folder, pool_name, True)
             return True
         elif response.status_code != 404:
             Log.error('pool', response.text)
             raise exceptions.PoolQueryException(response.text)
+        self.bigip.object_cache.put('pool', folder, pool_name, False)
         return False
 
     @icontrol_rest_folder
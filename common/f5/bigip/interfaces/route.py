@@ -140,6 +140,55 @@ class Route(object):
                 vlans.append(vlan)
         return vlans
 
+    @icontrol_rest_folder
+    @log
+    def get_domain_vlans(self, folder='Common'):
+        """ Get the VLANs of every route domain in a folder by id """
+        folder = str(folder).replace('/', '')
+        request_url = self.bigip.icr_url + \
+            '/net/route-domain?$select=id,partition,vlans'
+        if folder:
+            request_filter = 'partition eq ' + folder
+            request_url += '&$filter=' + request_filter
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+
+        domain_vlans = {}
+        if response.status_code < 400:
+            response_obj = json.loads(response.text)
+            if 'items' in response_obj:
+                for route_domain in response_obj['items']:
+                    if folder and route_domain['partition'] != folder:
+                        continue
+                    domain_vlans[int(route_domain['id'])] = \
+                        route_domain.get('vlans', [])
+        elif response.status_code != 404:
+            Log.error('route-domain', response.text)
+            raise exceptions.RouteQueryException(response.text)
+        return domain_vlans
+
+    @log
+    def get_domain_vlans_by_folder(self):
+        """ Get the VLANs of every route domain by folder and id """
+        request_url = self.bigip.icr_url + \
+            '/net/route-domain?$select=id,partition,vlans'
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+
+        folder_domains = {}
+        if response.status_code < 400:
+            response_obj = json.loads(response.text)
+            if 'items' in response_obj:
+                for route_domain in response_obj['items']:
+                    domain_vlans = folder_domains.setdefault(
+                        route_domain['partition'], {})
+                    domain_vlans[int(route_domain['id'])] = \
+                        route_domain.get('vlans', [])
+        elif response.status_code != 404:
+            Log.error('route-domain', response.text)
+            raise exceptions.RouteQueryException(response.text)
+        return folder_domains
+
     @icontrol_rest_folder
     @log
     def get_vlans_in_domain(self, folder='Common'):
@@ -269,8 +318,12 @@ class Route(object):
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400:
+                self.bigip.object_cache.put('route_domain', folder,
+                                            payload['name'], True)
                 return payload['id']
             elif response.status_code == 409:
+                self.bigip.object_cache.put('route_domain', folder,
+                                            payload['name'], True)
                 return True
             else:
                 Log.error('route-domain', response.text)
@@ -284,16 +337,17 @@ class Route(object):
         """ Delete route domain """
         folder = str(folder).replace('/', '')
         if not folder == 'Common':
+            if not name:
+                name = folder
             request_url = self.bigip.icr_url + '/net/route-domain/'
-            if name:
-                request_url += '~' + folder + '~' + name
-            else:
-                request_url += '~' + folder + '~' + folder
+            request_url += '~' + folder + '~' + name
             response = self.bigip.icr_session.delete(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
+            if response.status_code < 400 or response.status_code == 404:
+                self.bigip.object_cache.put('route_domain', folder, name,
+                                            False)
                 return True
-            elif response.status_code != 404:
+            else:
                 Log.error('route-domain', response.text)
                 raise exceptions.RouteDeleteException(response.text)
         return True
@@ -305,21 +359,27 @@ class Route(object):
         folder = str(folder).replace('/', '')
         if folder == 'Common':
             return True
-        request_url = self.bigip.icr_url + '/net/route-domain/'
         if route_domain_id is None:
-            request_url += '~' + folder + '~' + folder
+            name = folder
         else:
-            request_url += '~' + folder + '~' + \
-                folder + '_aux_' + str(route_domain_id)
+            name = folder + '_aux_' + str(route_domain_id)
+        (known, found) = self.bigip.object_cache.get('route_domain', folder,
+                                                     name)
+        if known:
+            return found
+        request_url = self.bigip.icr_url + '/net/route-domain/'
+        request_url += '~' + folder + '~' + name
         request_url += '?$select=name'
 
         response = self.bigip.icr_session.get(
             request_url, timeout=const.CONNECTION_TIMEOUT)
         if response.status_code < 400:
+            self.bigip.object_cache.put('route_domain', folder, name, True)
             return True
         elif response.status_code != 404:
             Log.error('route', response.text)
             raise exceptions.RouteQueryException(response.text)
+        self.bigip.object_cache.put('route_domain', folder, name, False)
         return False
 
     @icontrol_rest_folder
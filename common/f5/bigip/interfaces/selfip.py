@@ -226,6 +226,51 @@ class SelfIP(object):
             raise exceptions.SelfIPQueryException(response.text)
         return return_list
 
+    @icontrol_rest_folder
+    @log
+    def get_selfips_by_vlan(self, folder='Common'):
+        """ Get the names and addresses of selfips by vlan """
+        folder = str(folder).replace('/', '')
+        request_url = self.bigip.icr_url + '/net/self/'
+        request_url += '?$select=name,address,vlan'
+        if folder:
+            request_filter = 'partition eq ' + folder
+            request_url += '&$filter=' + request_filter
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+        selfips_by_vlan = {}
+        if response.status_code < 400:
+            return_obj = json.loads(response.text)
+            if 'items' in return_obj:
+                for selfip in return_obj['items']:
+                    selfip['name'] = strip_folder_and_prefix(selfip['name'])
+                    selfips_by_vlan.setdefault(
+                        selfip['vlan'], []).append(selfip)
+        elif response.status_code != 404:
+            Log.error('self', response.text)
+            raise exceptions.SelfIPQueryException(response.text)
+        return selfips_by_vlan
+
+    @log
+    def get_selfip_addresses_by_folder(self):
+        """ Get the addresses of every selfip by folder and name """
+        request_url = self.bigip.icr_url + '/net/self/'
+        request_url += '?$select=name,partition,address'
+        response = self.bigip.icr_session.get(
+            request_url, timeout=const.CONNECTION_TIMEOUT)
+        folder_selfips = {}
+        if response.status_code < 400:
+            return_obj = json.loads(response.text)
+            if 'items' in return_obj:
+                for selfip in return_obj['items']:
+                    folder_selfips.setdefault(
+                        selfip['partition'], {})[selfip['name']] = \
+                        selfip['address']
+        elif response.status_code != 404:
+            Log.error('self', response.text)
+            raise exceptions.SelfIPQueryException(response.text)
+        return folder_selfips
+
     @icontrol_rest_folder
     @log
     def get_selfip_list(self, folder='Common'):
@@ -20,10 +20,10 @@ from f5.common import constants as const
 from f5.bigip import exceptions
 from f5.bigip.interfaces import log
 
+from eventlet import corolocal
 from suds import WebFault
 
 import json
-import time
 import uuid
 
 
@@ -53,11 +53,14 @@ class System(object):
 
         # create stubs to hold static system params to avoid redundant calls
         self.version = None
+        # the SOAP active folder, and per greenthread the one its
+        # next SOAP call needs
         self.current_folder = None
+        self.requested_folder = corolocal.local()
+        self.folder_requests = 0
+        self.folder_switches = 0
         self.systeminfo = None
         self.exempt_folders = ['/', 'Common']
-        self.existing_folders = {}
-        self.existint_folders_updated = None
 
     @log
     def folder_exists(self, folder):
@@ -66,23 +69,20 @@ class System(object):
             folder = str(folder).replace('/', '')
             if folder == 'Common':
                 return True
-            if folder in self.existing_folders:
-                now = time.time()
-                if self.existint_folders_updated:
-                    if ((now - self.existint_folders_updated) <
-                            const.FOLDER_CACHE_TIMEOUT):
-                        return True
-                    else:
-                        del self.existing_folders[folder]
+            (known, found) = self.bigip.object_cache.get('folder', '/',
+                                                         folder)
+            if known:
+                return found
             request_url = self.bigip.icr_url + '/sys/folder/'
             request_url += '~' + folder
             request_url += '?$select=name'
             response = self.bigip.icr_session.get(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400:
-                self.existing_folders[folder] = 1
+                self.bigip.object_cache.put('folder', '/', folder, True)
                 return True
             elif response.status_code == 404:
+                self.bigip.object_cache.put('folder', '/', folder, False)
                 return False
             else:
                 Log.error('folder', response.text)
@@ -111,8 +111,8 @@ class System(object):
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400:
+                self.bigip.object_cache.put('folder', '/', folder, True)
                 if change_to:
-                    self.existing_folders[folder] = 1
                     self.set_folder(folder)
                 else:
                     self.set_folder('/Common')
@@ -132,8 +132,9 @@ class System(object):
             We need to do a fake query and fake command
             because setting your active folder, by itself, does
             not do anything. """
-        self.sys_session.set_active_folder('/')
-        self.current_folder = '/'
+        self.set_folder('/')
+        # switch even if the session is in the root folder already
+        self.current_folder = None
         self.mgmt_folder.get_list()
         fakename = '/set-folder-workaround-' + str(uuid.uuid4())[0:8]
         try:
@@ -149,13 +150,14 @@ class System(object):
             request_url = self.bigip.icr_url + '/sys/folder/~' + folder
             response = self.bigip.icr_session.delete(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                if folder in self.existing_folders:
-                    del self.existing_folders[folder]
+            if response.status_code < 400 or response.status_code == 404:
+                # nothing can be left in a deleted folder. The ARP
+                # index spans all folders and is read again.
+                self.bigip.object_cache.invalidate(folder=folder)
+                self.bigip.object_cache.invalidate('arp', '/', 'index')
+                self.bigip.object_cache.put('folder', '/', folder, False)
                 self.set_folder('/Common')
                 return True
-            elif response.status_code == 404:
-                return True
             else:
                 Log.error('folder', response.text)
                 raise exceptions.SystemDeleteException(response.text)
@@ -179,33 +181,56 @@ class System(object):
             raise exceptions.SystemQueryException(response.text)
         return return_list
 
-    @log
     def set_folder(self, folder):
-        """ Set Folder """
+        """ Set Folder.
+
+            The folder is only remembered here, for the calling
+            greenthread. The SOAP active folder is switched by
+            sync_folder, before the greenthread's next SOAP call, and
+            only if it is not that folder already. REST calls use
+            fully qualified paths and need neither.
+        """
         if not folder:
             msg = 'set_folder failed: No folder specified!'
             Log.error('System', msg)
             raise exceptions.SystemUpdateException(msg)
 
-        if not self.folder_exists(folder):
-            msg = 'set_folder:set_active_folder failed, ' + \
-                  'folder does not exist!'
-            Log.error('System', msg)
-            raise exceptions.SystemUpdateException(msg)
-
-        if not str(folder).startswith('/'):
+        folder = str(folder)
+        if not folder.startswith('/'):
             folder = '/' + folder
-        if self.current_folder and folder == self.current_folder:
+        self.folder_requests += 1
+        self.requested_folder.folder = folder
+
+    @property
+    def active_folder(self):
+        """ The folder last set by the calling greenthread """
+        return getattr(self.requested_folder, 'folder', None)
+
+    def sync_folder(self):
+        """ Switch the SOAP active folder to the one the calling
+            greenthread last set. SOAP calls run this with the
+            device's iControl lock held. """
+        folder = self.active_folder
+        if not folder or folder == self.current_folder:
             return
         try:
             self.sys_session.set_active_folder(folder)
             self.current_folder = folder
+            self.folder_switches += 1
         except WebFault as webfault:
             Log.error('System',
                       'set_folder:set_active_folder failed: ' +
                       str(webfault.message))
             raise exceptions.SystemUpdateException(webfault.message)
 
+    def get_folder_statistics(self):
+        """ Folder changes asked for and SOAP folder switches made.
+            Each request used to cost a folder existence check and,
+            for a different folder, a SOAP set_active_folder call. """
+        return {'requests': self.folder_requests,
+                'switches': self.folder_switches,
+                'avoided': self.folder_requests - self.folder_switches}
+
     @log
     def purge_folder_contents(self, folder, bigip=None):
         """ Purge Folder of contents """
@@ -224,6 +249,9 @@ class System(object):
             bigip.vlan.delete_all(folder=folder)
             bigip.l2gre.delete_all(folder=folder)
             bigip.route.delete_domain(folder=folder)
+            bigip.object_cache.invalidate(
+                folder=str(folder).replace('/', ''))
+            bigip.object_cache.invalidate('arp', '/', 'index')
         else:
             Log.error('folder',
                       'Request to purge exempt folder %s ignored.' % folder)
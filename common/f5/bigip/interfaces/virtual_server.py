@@ -86,6 +86,8 @@ class VirtualServer(object):
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400 or response.status_code == 409:
+                self.bigip.object_cache.put('virtual_server', folder, name,
+                                            True)
                 request_url = self.bigip.icr_url + '/ltm/virtual-address/'
                 request_url += '~' + folder + '~' + urllib.quote(ip_address)
                 payload = dict()
@@ -149,6 +151,8 @@ class VirtualServer(object):
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400 or response.status_code == 409:
+                self.bigip.object_cache.put('virtual_server', folder, name,
+                                            True)
                 request_url = self.bigip.icr_url + '/ltm/virtual-address/'
                 request_url += '~' + folder + '~' + urllib.quote(ip_address)
                 payload = dict()
@@ -217,6 +221,8 @@ class VirtualServer(object):
                 request_url, data=json.dumps(payload),
                 timeout=const.CONNECTION_TIMEOUT)
             if response.status_code < 400 or response.status_code == 409:
+                self.bigip.object_cache.put('virtual_server', folder, name,
+                                            True)
                 request_url = self.bigip.icr_url + '/ltm/virtual-address/'
                 request_url += '~' + folder + '~' + urllib.quote(ip_address)
                 payload = dict()
@@ -1277,9 +1283,9 @@ class VirtualServer(object):
             request_url += '~' + folder + '~' + name
             response = self.bigip.icr_session.delete(
                 request_url, timeout=const.CONNECTION_TIMEOUT)
-            if response.status_code < 400:
-                return True
-            elif response.status_code == 404:
+            if response.status_code < 400 or response.status_code == 404:
+                self.bigip.object_cache.put('virtual_server', folder, name,
+                                            False)
                 return True
             else:
                 Log.error('virtual', response.text)
@@ -1346,6 +1352,7 @@ class VirtualServer(object):
         response = self.bigip.icr_session.get(
             request_url, timeout=const.CONNECTION_TIMEOUT)
         if response.status_code < 400:
+            self.bigip.object_cache.invalidate('virtual_server', folder)
             response_obj = json.loads(response.text)
             if 'items' in response_obj:
                 for item in response_obj['items']:
@@ -1997,19 +2004,57 @@ class VirtualServer(object):
                 raise exceptions.VirtualServerUpdateException(response.text)
         return False
 
+    @icontrol_rest_folder
+    @log
+    def get_config(self, name=None, folder='Common'):
+        """ Get vip description, pool, state and connection limit """
+        if name:
+            folder = str(folder).replace('/', '')
+            request_url = self.bigip.icr_url + '/ltm/virtual/'
+            request_url += '~' + folder + '~' + name
+            request_url += '?$select=description,pool,enabled,disabled,'
+            request_url += 'connectionLimit'
+            response = self.bigip.icr_session.get(
+                request_url, timeout=const.CONNECTION_TIMEOUT)
+            if response.status_code < 400:
+                response_obj = json.loads(response.text)
+                config = dict()
+                config['description'] = response_obj.get('description', '')
+                if 'pool' in response_obj:
+                    config['pool'] = strip_folder_and_prefix(
+                        response_obj['pool'])
+                else:
+                    config['pool'] = None
+                config['enabled'] = 'disabled' not in response_obj
+                config['connection_limit'] = \
+                    int(response_obj.get('connectionLimit', 0))
+                return config
+            elif response.status_code == 404:
+                return None
+            else:
+                Log.error('virtual', response.text)
+                raise exceptions.VirtualServerQueryException(response.text)
+        return None
+
     @icontrol_rest_folder
     @log
     def exists(self, name=None, folder='Common'):
         """ Does vip exist? """
         folder = str(folder).replace('/', '')
+        (known, found) = self.bigip.object_cache.get('virtual_server', folder,
+                                                     name)
+        if known:
+            return found
         request_url = self.bigip.icr_url + '/ltm/virtual/'
         request_url += '~' + folder + '~' + name
         request_url += '?$select=name'
         response = self.bigip.icr_session.get(
             request_url, timeout=const.CONNECTION_TIMEOUT)
         if response.status_code < 400:
+            self.bigip.object_cache.put('virtual_server', folder, name, True)
             return True
         elif response.status_code == 404:
+            self.bigip.object_cache.put('virtual_server', folder, name, False)
             return False
         else:
             Log.error('virtual', response.text)
@@ -0,0 +1,95 @@
+""" Cache of BIG-IP object existence and attributes """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import OrderedDict
+from time import time
+
+from f5.common import constants as const
+
+
+class ObjectCache(object):
+    """ What is known about objects on one BIG-IP.
+
+        Entries are keyed by (kind, folder, name), ex:
+        ('pool', 'uuid_tenant', 'uuid_pool'). The value is whatever
+        the interface stored, usually whether the object exists.
+
+        Entries expire after timeout seconds, and the least recently
+        used entries are evicted beyond max_size entries. Interfaces
+        update or invalidate entries for every write they make, so
+        expiry only bounds how long changes made by someone else go
+        unnoticed. A timeout of 0 disables the cache.
+    """
+    def __init__(self, timeout=None, max_size=None):
+        if timeout is None:
+            timeout = const.OBJECT_CACHE_TIMEOUT
+        if max_size is None:
+            max_size = const.OBJECT_CACHE_SIZE
+        self.timeout = timeout
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind, folder, name):
+        """ (True, value) when known, otherwise (False, None) """
+        key = (kind, folder, name)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return (False, None)
+        (expires, value) = entry
+        if expires < time():
+            self.misses += 1
+            return (False, None)
+        # most recently used entries are kept last
+        self.entries[key] = entry
+        self.hits += 1
+        return (True, value)
+
+    def put(self, kind, folder, name, value):
+        """ Remember value for an object """
+        if not self.timeout:
+            return
+        key = (kind, folder, name)
+        self.entries.pop(key, None)
+        self.entries[key] = (time() + self.timeout, value)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, kind=None, folder=None, name=None):
+        """ Forget matching objects. None matches anything. """
+        if kind is not None and folder is not None and name is not None:
+            self.entries.pop((kind, folder, name), None)
+            return
+        for key in list(self.entries.keys()):
+            if (kind is None or key[0] == kind) and \
+                    (folder is None or key[1] == folder) and \
+                    (name is None or key[2] == name):
+                del self.entries[key]
+
+    def clear(self):
+        """ Forget everything """
+        self.entries.clear()
+
+    def get_statistics(self):
+        """ Hits, misses, evictions and size """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries)}
@@ -15,9 +15,19 @@
 # limitations under the License.
 #
 
+import errno
 import logging
+import os
 import platform
+import re
 import ssl
+import stat
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 try:
     from urllib2 import ProxyHandler
@@ -43,6 +53,7 @@ from suds.servicedefinition import ServiceDefinition
 from suds.wsdl import Definitions
 from suds.xsd.doctor import Import, ImportDoctor
 from suds import transport
+import suds
 
 # Fix missing imports. These can be global, as it applies to all f5 WSDLS.
 IMP = Import('http://schemas.xmlsoap.org/soap/encoding/')
@@ -53,15 +64,26 @@ SESSION_WSDL = 'System.Session'
 __version__ = '2.1'
 __build__ = 'r3'
 
+# Bump when the layout of on-disk WSDL cache entries changes
+WSDL_CACHE_FORMAT = 1
+
+LOG = logging.getLogger(__name__)
+
 
 class BIGIP(object):
     """
     Wrap suds client object(s) and create a user-friendly class to use.
+
+    Adding a WSDL only creates its module and interface attributes.
+    The suds client for an interface is built the first time one of
+    the interface's attributes is used, and each method is bound, with
+    its params and response_type, the first time it is used.
     """
     def __init__(self, hostname=None, username=None,
                  password=None, wsdls=None, directory=None,
                  fromurl=False, debug=False, proto='https',
-                 sessions=False, cache=True, **kwargs):
+                 sessions=False, cache=True, wsdl_cache_dir=None,
+                 version=None, **kwargs):
 
         self.hostname = hostname
         self.username = username
@@ -73,6 +95,11 @@ class BIGIP(object):
         self.debug = debug
         self.kw = kwargs
         self.sessionid = None
+        self.timeout = None
+        self.clients = []
+        # runs every iControl call, with the WSDL name, the method
+        # and its arguments
+        self.call_hook = None
 
         # Setup the in-memory object cache
         if cache:
@@ -80,6 +107,13 @@ class BIGIP(object):
         else:
             self.cache = None
 
+        # Parsed WSDLs can only be shared between devices
+        # when we know which TMOS version they came from.
+        if wsdl_cache_dir and version:
+            self.wsdl_cache = WSDLCache(wsdl_cache_dir, version)
+        else:
+            self.wsdl_cache = None
+
         if self.debug:
             self._set_trace_logging()
 
@@ -97,33 +131,26 @@ class BIGIP(object):
         else:
             self.wsdls = wsdls
 
-        self.clients = self._get_clients()
-
-        for client in self.clients:
-            self._build_suds_interface(client)
+        for wsdl in self.wsdls:
+            self._set_interface_attributes(wsdl)
 
     #---------------------
     # Methods to modify active pyControl objects
     #---------------------
     def set_timeout(self, timeout):
         if 0 < timeout <= 300:
+            self.timeout = timeout
             for client in self.clients:
                 client.set_options(timeout=timeout)
 
     def add_interface(self, wsdl):
         if not wsdl in self.wsdls:
             self.wsdls.append(wsdl)
-            client = self._get_client(wsdl)
-            self._build_suds_interface(client)
-            self.clients.append(client)
+            self._set_interface_attributes(wsdl)
 
     def add_interfaces(self, wsdls):
         for wsdl in wsdls:
-            if not wsdl in self.wsdls:
-                self.wsdls.append(wsdl)
-                client = self._get_client(wsdl)
-                self._build_suds_interface(client)
-                self.clients.append(client)
+            self.add_interface(wsdl)
 
     #---------------------
     # Setters and getters.
@@ -149,16 +176,22 @@ class BIGIP(object):
     # Private methods
     #---------------------
 
+    def _load_interface(self, interface):
+        """ Build the suds client behind an interface """
+        client = self._get_client(interface.wsdl)
+        interface.methods = set(self._get_methods(client))
+        interface.typefactory = client.factory
+        interface.suds = client
+        self.clients.append(client)
+        self._build_suds_interface(client)
+
     def _build_suds_interface(self, client):
         location = '%s://%s%s' % (self.proto, self.hostname, ICONTROL_URI)
 
-        self._set_module_attributes(client)
-        self._set_interface_attributes(client)
-        self._set_interface_sudsclient(client)
-        self._set_type_factory(client)
-        self._set_interface_methods(client)
         client.factory.separator('_')
         client.set_options(location=location, cache=self.cache)
+        if self.timeout:
+            client.set_options(timeout=self.timeout)
 
         if self.sessions:
             if self.sessionid:
@@ -170,38 +203,19 @@ class BIGIP(object):
 
     def _get_client(self, wsdl):
         url = self._set_url(wsdl)
-        return self._get_suds_client(url, **self.kw)
-
-    def _get_clients(self):
-        """ Get a suds client for the wsdls passed in."""
-        clients = []
-        for wsdl in self.wsdls:
-            client = self._get_client(wsdl)
-            clients.append(client)
-        return clients
+        return self._get_suds_client(url, wsdl_name=wsdl, **self.kw)
 
     @staticmethod
-    def _get_module_name(c):
+    def _get_module_name(wsdl):
         """ Returns the module name. Ex: 'LocalLB' """
-        return c.sd[0].service.name.split('.')[0]
-
-    def _get_module_object(self, c):
-        """ Returns a module object (e.g. LocalLB) """
-        return getattr(self, self._get_module_name(c))
+        return wsdl.split('.')[0]
 
     @staticmethod
-    def _get_interface_name(c):
+    def _get_interface_name(wsdl):
         """
         Returns the interface name. Ex: 'Pool' from 'LocalLB.Pool'
         """
-        return c.sd[0].service.name.split('.')[1]
-
-    def _get_interface_object(self, c, module):
-        """
-        Returns an interface object (e.g. Pool). Takes a client
-        object and a module object as args.
-        """
-        return getattr(module, self._get_interface_name(c))
+        return wsdl.split('.')[1]
 
     @staticmethod
     def _get_methods(c):
@@ -212,7 +226,7 @@ class BIGIP(object):
         methods = [method[0] for method in c.sd[0].ports[0][1]]
         return methods
 
-    def _get_suds_client(self, url, **kw):
+    def _get_suds_client(self, url, wsdl_name=None, **kw):
         """
         Make a suds client for a specific WSDL (via url).
         Added new Suds cache features. Warning: These don't work on
@@ -224,12 +238,16 @@ class BIGIP(object):
             t = transport.http.HttpAuthenticated(username=self.username,
                                                  password=self.password)
             c = ROClient(url, transport=t, username=self.username,
-                         password=self.password, doctor=DOCTOR, **kw)
+                         password=self.password, doctor=DOCTOR,
+                         wsdl_cache=self.wsdl_cache, wsdl_name=wsdl_name,
+                         **kw)
         else:
             t = HTTPSUnVerifiedCertTransport(username=self.username,
                                              password=self.password)
             c = ROClient(url, transport=t, username=self.username,
-                         password=self.password, doctor=DOCTOR, **kw)
+                         password=self.password, doctor=DOCTOR,
+                         wsdl_cache=self.wsdl_cache, wsdl_name=wsdl_name,
+                         **kw)
         return c
 
     def _set_url(self, wsdl):
@@ -257,44 +275,34 @@ class BIGIP(object):
                 url = 'file:' + pathname2url(self.directory + '/' + wsdl)
         return url
 
-    def _set_module_attributes(self, c):
-        """ Sets appropriate attributes for a Module. """
-        module = self._get_module_name(c)
-        if hasattr(self, module):
-            return
-        else:
-            setattr(self, module, ModuleInstance(module))
-
-    def _set_interface_sudsclient(self, c):
+    def _set_interface_attributes(self, wsdl):
         """
-        Set an attribute that points to the actual suds client. This
-        will allow for power-users to get at suds client internals.
+        Sets the module and interface attributes for a WSDL. The
+        interface builds its suds client when it is first used.
         """
-        module = self._get_module_object(c)
-        interface = self._get_interface_object(c, module)
-        setattr(interface, 'suds', c)
-
-    def _set_interface_attributes(self, c):
-        """ Sets appropriate attributes for a Module. """
-        module = self._get_module_object(c)
-        interface = self._get_interface_name(c)
-        setattr(module, interface, InterfaceInstance(interface))
-
-    def _set_interface_methods(self, c):
+        wsdl = wsdl.replace('.wsdl', '')
+        module_name = self._get_module_name(wsdl)
+        if module_name not in self.__dict__:
+            setattr(self, module_name, ModuleInstance(module_name))
+        module = getattr(self, module_name)
+        interface_name = self._get_interface_name(wsdl)
+        if interface_name not in module.__dict__:
+            setattr(module, interface_name,
+                    InterfaceInstance(interface_name, self, wsdl))
+
+    def _set_interface_method(self, interface, method):
         """
-        Sets up methods as attributes for a particular iControl interface.
-        Method keys (attrs) point to suds.service objects for the interface.
+        Sets up a method as an attribute of an iControl interface.
+        The attribute calls the suds.service object for the method.
         """
-        module = self._get_module_object(c)
-        interface = self._get_interface_object(c, module)
-        methods = self._get_methods(c)
-
-        for method in methods:
-            suds_method = getattr(c.service, method)
-            setattr(interface, method, suds_method)
-            m = getattr(interface, method)
-            self._set_method_input_params(c, m, method)
-            self._set_return_type(c, m, method)
+        c = interface.suds
+        suds_method = MethodInstance(self, interface.wsdl,
+                                     getattr(c.service, method))
+        setattr(interface, method, suds_method)
+        m = getattr(interface, method)
+        self._set_method_input_params(c, m, method)
+        self._set_return_type(c, m, method)
+        return m
 
     @staticmethod
     def _set_method_input_params(c, interface_method, method):
@@ -318,12 +326,6 @@ class BIGIP(object):
         else:
             setattr(interface_method, 'response_type', None)
 
-    def _set_type_factory(self, c):
-        factory = getattr(c, 'factory')
-        module = self._get_module_object(c)
-        interface = self._get_interface_object(c, module)
-        setattr(interface, 'typefactory', factory)
-
     @staticmethod
     def _set_trace_logging():
         logging.basicConfig(level=logging.INFO)
@@ -337,16 +339,52 @@ class ModuleInstance(object):
 
 
 class InterfaceInstance(object):
-    """ An iControl interface object to set attributes against. """
-    def __init__(self, name):
+    """
+    An iControl interface object to set attributes against.
+
+    The suds client is built, and each method bound, on first use.
+    """
+    def __init__(self, name, bigip=None, wsdl=None):
         self.name = name
+        self.bigip = bigip
+        self.wsdl = wsdl
+
+    def __getattr__(self, name):
+        # only called for attributes which are not set yet
+        if name.startswith('__') or self.bigip is None:
+            raise AttributeError(name)
+        if 'suds' not in self.__dict__:
+            self.bigip._load_interface(self)
+            if name in self.__dict__:
+                return self.__dict__[name]
+        if name in self.methods:
+            return self.bigip._set_interface_method(self, name)
+        raise AttributeError(name)
+
+
+class MethodInstance(object):
+    """ An iControl method which is run by the call hook when called. """
+    def __init__(self, bigip, wsdl, method):
+        self.bigip = bigip
+        self.wsdl = wsdl
+        self.method = method
+
+    def __call__(self, *args, **kwargs):
+        if self.bigip.call_hook:
+            return self.bigip.call_hook(self.wsdl, self.method,
+                                        *args, **kwargs)
+        return self.method(*args, **kwargs)
 
 
 class ROClient(Client):
-    def __init__(self, url, **kwargs):
+    def __init__(self, url, wsdl_cache=None, wsdl_name=None, **kwargs):
         """
         @param url: The URL for the WSDL.
         @type url: str
+        @param wsdl_cache: On-disk cache of parsed WSDLs.
+        @type wsdl_cache: L{WSDLCache}
+        @param wsdl_name: The WSDL's cache key. Ex: 'LocalLB.Pool'
+        @type wsdl_name: str
         @param kwargs: keyword arguments.
         @see: L{Options}
         """
@@ -355,16 +393,31 @@ class ROClient(Client):
         self.options = options
         options.cache = InMemoryCache()
         self.set_options(**kwargs)
-        reader = DefinitionsReader(options, Definitions)
-        self.wsdl = reader.open(url)
+        if not wsdl_name:
+            wsdl_cache = None
+        cached = None
+        if wsdl_cache:
+            cached = wsdl_cache.get(wsdl_name)
+        if cached:
+            (self.wsdl, self.sd) = cached
+            # options are not pickled, so the definitions
+            # get ours, as suds does for its object cache.
+            self.wsdl.options = options
+            for imp in self.wsdl.imports:
+                imp.imported.options = options
+        else:
+            reader = DefinitionsReader(options, Definitions)
+            self.wsdl = reader.open(url)
+            self.sd = []
+            for s in self.wsdl.services:
+                sd = ServiceDefinition(self.wsdl, s)
+                self.sd.append(sd)
+            if wsdl_cache:
+                wsdl_cache.put(wsdl_name, (self.wsdl, self.sd))
         plugins = PluginContainer(options.plugins)
         plugins.init.initialized(wsdl=self.wsdl)
         self.factory = Factory(self.wsdl)
         self.service = ServiceSelector(self, self.wsdl.services)
-        self.sd = []
-        for s in self.wsdl.services:
-            sd = ServiceDefinition(self.wsdl, s)
-            self.sd.append(sd)
         self.messages = dict(tx=None, rx=None)
 
 
@@ -387,7 +440,7 @@ class InMemoryCache(Cache):
         self.data[objid] = obj
 
     def putf(self, objid, fp):
-        self.put(fp.read())
+        self.put(objid, fp.read())
 
     def purge(self, objid):
         del self.data[objid]
@@ -396,6 +449,125 @@ class InMemoryCache(Cache):
         self.data = {}
 
 
+class WSDLCache(object):
+    """
+    On-disk cache of parsed WSDLs.
+
+    The parsed definitions and service definitions of each WSDL are
+    pickled in a directory per TMOS version, so any device running
+    that version can use them without fetching and parsing the WSDL.
+    Entries written for another TMOS version, pycontrol, suds or cache
+    format are ignored and replaced. Suds does not pickle the client
+    options, so no credentials are written to disk.
+
+    Unpickling runs code, so entries are only read when they and the
+    directories holding them are owned by the agent's user and not
+    writable by group or others.
+    """
+    def __init__(self, directory, version):
+        self.directory = directory
+        self.version = str(version)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, wsdl):
+        """ The cached definitions for a WSDL, or None """
+        path = self._get_path(wsdl)
+        try:
+            if not (self._is_trusted(os.stat(self.directory), self.directory)
+                    and self._is_trusted(os.stat(os.path.dirname(path)),
+                                         os.path.dirname(path))):
+                self.misses += 1
+                return None
+            with open(path, 'rb') as fp:
+                if not self._is_trusted(os.fstat(fp.fileno()), path):
+                    self.misses += 1
+                    return None
+                entry = pickle.load(fp)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception as exc:
+            LOG.warning('Discarding unreadable WSDL cache entry %s: %s'
+                        % (path, exc))
+            self.purge(wsdl)
+            self.misses += 1
+            return None
+        if not isinstance(entry, dict) or \
+                entry.get('key') != self._get_key(wsdl):
+            LOG.info('Discarding stale WSDL cache entry %s' % path)
+            self.purge(wsdl)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['definitions']
+
+    def put(self, wsdl, definitions):
+        """ Write the definitions for a WSDL """
+        path = self._get_path(wsdl)
+        entry = {'key': self._get_key(wsdl), 'definitions': definitions}
+        tmp_path = None
+        try:
+            self._make_dirs(os.path.dirname(path))
+            for directory in [self.directory, os.path.dirname(path)]:
+                if not self._is_trusted(os.stat(directory), directory):
+                    return False
+            # write a temporary file and rename it so readers
+            # never see a partial entry
+            (fd, tmp_path) = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix='.' + wsdl)
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(entry, fp, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+            return True
+        except Exception as exc:
+            LOG.warning('Could not write WSDL cache entry %s: %s'
+                        % (path, exc))
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def purge(self, wsdl):
+        """ Remove the entry for a WSDL """
+        try:
+            os.remove(self._get_path(wsdl))
+        except OSError:
+            pass
+
+    def _get_key(self, wsdl):
+        """ What an entry must have been written for to be used """
+        return (WSDL_CACHE_FORMAT, __version__, suds.__version__,
+                self.version, wsdl)
+
+    def _get_path(self, wsdl):
+        """ Ex: <directory>/11.6.0-0.0.6-Final/LocalLB.Pool.pickle """
+        version = re.sub(r'[^\w.-]', '_', self.version)
+        wsdl = re.sub(r'[^\w.-]', '_', wsdl)
+        return os.path.join(self.directory, version, wsdl + '.pickle')
+
+    @staticmethod
+    def _is_trusted(stat_result, path):
+        """ Whether only we could have written a cache file or directory """
+        if stat_result.st_uid != os.getuid():
+            LOG.warning('Not using WSDL cache %s, it is not owned by '
+                        'uid %d' % (path, os.getuid()))
+            return False
+        if stat_result.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            LOG.warning('Not using WSDL cache %s, it is writable by '
+                        'group or others' % path)
+            return False
+        return True
+
+    @staticmethod
+    def _make_dirs(path):
+        """ Create the cache directory, readable only by us """
+        try:
+            os.makedirs(path, 0o700)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+
 class HTTPSUnVerifiedCertTransport(transport.https.HttpAuthenticated):
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,79 @@
+""" iControl REST transport """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from f5.common import constants as const
+
+
+class IcrAdapter(HTTPAdapter):
+    """ Keep-alive connection pool to a BIG-IP management address.
+
+        Connections are kept open and reused between requests, so
+        only a new connection pays for the TCP and TLS handshakes.
+        Up to pool_size connections are kept open for concurrent
+        requests. Requests beyond that open extra connections which
+        are closed once they are used.
+    """
+    def __init__(self, pool_size=None):
+        if not pool_size:
+            pool_size = const.CONNECTION_POOL_SIZE
+        self.pool_size = pool_size
+        super(IcrAdapter, self).__init__(pool_connections=1,
+                                         pool_maxsize=pool_size)
+
+    def get_statistics(self):
+        """ Requests sent and connections opened by this adapter """
+        stats = {'requests': 0, 'connections': 0, 'reused': 0}
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            stats['requests'] += pool.num_requests
+            stats['connections'] += pool.num_connections
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        return stats
+
+
+class IcrSession(requests.Session):
+    """ iControl REST session to a single BIG-IP.
+
+        Requests which do not give a timeout use the session timeout,
+        so nothing depends on the process wide socket timeout.
+    """
+    def __init__(self, username, password, timeout=None, pool_size=None):
+        super(IcrSession, self).__init__()
+        if not timeout:
+            timeout = const.CONNECTION_TIMEOUT
+        self.timeout = timeout
+        self.auth = (username, password)
+        self.verify = False
+        self.headers.update({'Content-Type': 'application/json'})
+        self.adapter = IcrAdapter(pool_size)
+        self.mount('https://', self.adapter)
+
+    def request(self, method, url, **kwargs):
+        """ Send a request, with the session timeout by default """
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(IcrSession, self).request(method, url, **kwargs)
+
+    def get_statistics(self):
+        """ Connection reuse counters """
+        return self.adapter.get_statistics()
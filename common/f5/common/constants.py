@@ -20,8 +20,12 @@ MIN_EXTRA_MB = 500
 DEFAULT_HOSTNAME = 'bigip1'
 MAX_HOSTNAME_LENGTH = 128
 DEFAULT_FOLDER = "/Common"
-FOLDER_CACHE_TIMEOUT = 120
+# OBJECT EXISTENCE CACHE, PER BIG-IP
+OBJECT_CACHE_TIMEOUT = 120
+OBJECT_CACHE_SIZE = 10000
 CONNECTION_TIMEOUT = 30
+# iControl REST connections kept open per BIG-IP
+CONNECTION_POOL_SIZE = 10
 FDB_POPULATE_STATIC_ARP = True
 # DEVICE LOCK PREFIX
 DEVICE_LOCK_PREFIX = 'lock_'
@@ -35,6 +39,8 @@ HA_SELFIP_NAME = "HA"
 VS_PREFIX = 'vs'
 # POOL CONSTANTS
 POOL_PREFIX = 'pool'
+# pools per page when querying all pools at once
+POOL_QUERY_PAGE_SIZE = 500
 # POOL CONSTANTS
 MONITOR_PREFIX = 'monitor'
 # VLAN CONSTANTS
@@ -56,6 +62,9 @@ DEFAULT_SYNC_MODE = 'autosync'
 # (3+6+9+12+15+18) = 63
 SYNC_DELAY = 3
 MAX_SYNC_ATTEMPTS = 10
+# SYNC STATE POLLING BACKS OFF FROM 0.25 TO 2 SECONDS
+SYNC_POLL_DELAY = 0.25
+SYNC_POLL_MAX_DELAY = 2
 # SHARED CONFIG CONSTANTS
 SHARED_CONFIG_DEFAULT_TRAFFIC_GROUP = 'traffic-group-local-only'
 SHARED_CONFIG_DEFAULT_FLOATING_TRAFFIC_GROUP = 'traffic-group-1'
@@ -0,0 +1,201 @@
+""" Cache and index of neutron networks and subnets """
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import OrderedDict
+from time import time
+
+import netaddr
+
+
+class NetCache(object):
+    """ Neutron objects by id.
+
+        Entries expire timeout seconds after they were put, and the
+        least recently used entries are evicted beyond max_size
+        entries. Network and subnet notifications invalidate entries
+        as objects change, so expiry only bounds how long a missed
+        change goes unnoticed. A timeout of 0 disables the cache.
+    """
+    def __init__(self, timeout, max_size):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, obj_id):
+        """ cached object or None """
+        entry = self.entries.pop(obj_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        (expires, obj) = entry
+        if expires < time():
+            self.misses += 1
+            self.expirations += 1
+            self._removed(obj_id, obj)
+            return None
+        # most recently used entries are kept last
+        self.entries[obj_id] = entry
+        self.hits += 1
+        return obj
+
+    def _removed(self, obj_id, obj):
+        """ an entry was dropped """
+        pass
+
+    def put(self, obj_id, obj):
+        """ remember an object """
+        if not self.timeout:
+            return
+        entry = self.entries.pop(obj_id, None)
+        if entry is not None:
+            self._removed(obj_id, entry[1])
+        self.entries[obj_id] = (time() + self.timeout, obj)
+        while len(self.entries) > self.max_size:
+            (evicted_id, entry) = self.entries.popitem(last=False)
+            self._removed(evicted_id, entry[1])
+            self.evictions += 1
+
+    def invalidate(self, obj_id):
+        """ forget an object """
+        entry = self.entries.pop(obj_id, None)
+        if entry is not None:
+            self._removed(obj_id, entry[1])
+            self.invalidations += 1
+
+    def values(self):
+        """ objects which have not expired """
+        now = time()
+        return [entry[1] for entry in self.entries.values()
+                if entry[0] >= now]
+
+    def clear(self):
+        """ forget everything """
+        self.invalidations += len(self.entries)
+        for obj_id in self.entries:
+            self._removed(obj_id, self.entries[obj_id][1])
+        self.entries.clear()
+
+    def get_statistics(self):
+        """ hits, misses, hit rate, evictions and size """
+        lookups = self.hits + self.misses
+        hit_rate = 0.0
+        if lookups:
+            hit_rate = float(self.hits) / lookups
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': hit_rate,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self.entries)}
+
+
+class SubnetCache(NetCache):
+    """ Cached subnets, indexed by the addresses they contain """
+    def __init__(self, timeout, max_size):
+        super(SubnetCache, self).__init__(timeout, max_size)
+        self.index = SubnetIndex()
+
+    def put(self, obj_id, obj):
+        """ remember a subnet """
+        super(SubnetCache, self).put(obj_id, obj)
+        if obj_id in self.entries:
+            self.index.add(obj)
+
+    def _removed(self, obj_id, obj):
+        """ a subnet was dropped """
+        self.index.remove(obj_id)
+
+    def find(self, address):
+        """ cached subnets which contain the address """
+        now = time()
+        return [subnet for subnet in self.index.find(address)
+                if self.entries[subnet['id']][0] >= now]
+
+
+class SubnetIndex(object):
+    """ Subnets by the addresses they contain.
+
+        Subnets are kept by IP version and prefix length, then by
+        network address, so finding the subnets of an address takes
+        one lookup per prefix length in use, at most 33 for IPv4 and
+        129 for IPv6, whatever the number of subnets.
+    """
+    def __init__(self):
+        # (version, prefixlen) -> {network: {subnet_id: subnet}}
+        self.prefixes = {}
+        # subnet_id -> ((version, prefixlen), network)
+        self.subnets = {}
+
+    def __len__(self):
+        return len(self.subnets)
+
+    def add(self, subnet):
+        """ index or reindex a subnet """
+        self.remove(subnet['id'])
+        net = netaddr.IPNetwork(subnet['cidr'])
+        prefix = (net.version, net.prefixlen)
+        networks = self.prefixes.setdefault(prefix, {})
+        networks.setdefault(int(net.network), {})[subnet['id']] = subnet
+        self.subnets[subnet['id']] = (prefix, int(net.network))
+
+    def remove(self, subnet_id):
+        """ stop indexing a subnet """
+        if subnet_id not in self.subnets:
+            return
+        (prefix, network) = self.subnets.pop(subnet_id)
+        networks = self.prefixes[prefix]
+        del networks[network][subnet_id]
+        if not networks[network]:
+            del networks[network]
+            if not networks:
+                del self.prefixes[prefix]
+
+    def find(self, address):
+        """ subnets which contain the address """
+        ip_addr = netaddr.IPAddress(address)
+        bits = ip_addr.version == 4 and 32 or 128
+        ip_int = int(ip_addr)
+        found = []
+        for (version, prefixlen) in self.prefixes:
+            if version != ip_addr.version:
+                continue
+            host_bits = bits - prefixlen
+            network = (ip_int >> host_bits) << host_bits
+            networks = self.prefixes[(version, prefixlen)]
+            if network in networks:
+                found.extend(networks[network].values())
+        return found
+
+    def find_network(self, network_id):
+        """ subnets on a network """
+        found = []
+        for networks in self.prefixes.values():
+            for subnets in networks.values():
+                for subnet in subnets.values():
+                    if subnet['network_id'] == network_id:
+                        found.append(subnet)
+        return found
+
+    def clear(self):
+        """ stop indexing all subnets """
+        self.prefixes.clear()
+        self.subnets.clear()
@@ -15,8 +15,7 @@
 #
 
 import uuid
-import netaddr
-import datetime
+import hashlib
 
 try:
     from oslo.config import cfg  # @UnresolvedImport
@@ -33,6 +32,9 @@ from neutron.db import agents_db
 from neutron.context import get_admin_context
 from neutron.extensions import portbindings
 import f5.oslbaasv1driver.drivers.constants as lbaasv1constants
+from f5.oslbaasv1driver.drivers.net_cache import NetCache
+from f5.oslbaasv1driver.drivers.net_cache import SubnetCache
+from f5.oslbaasv1driver.drivers.net_cache import SubnetIndex
 
 PREJUNO = False
 PREKILO = False
@@ -104,13 +106,31 @@ OPTS = [
                         '.drivers.agent_scheduler'
                         '.TenantScheduler'),
                help=_('Driver to use for scheduling '
-                      'pool to a default loadbalancer agent'))
+                      'pool to a default loadbalancer agent')),
+    cfg.IntOpt('f5_net_cache_timeout',
+               default=1800,
+               help=_('Seconds to cache neutron networks and subnets '
+                      'used to build services. 0 disables the cache')),
+    cfg.IntOpt('f5_net_cache_size',
+               default=10000,
+               help=_('Most neutron networks and subnets to cache'))
 ]
 
 cfg.CONF.register_opts(OPTS)
 
 VIF_TYPE = 'f5'
-NET_CACHE_SECONDS = 1800
+
+# Least seconds between reloads of the subnet index when a member
+# address is in none of its subnets. Other neutron-server workers
+# add subnets without this one being told.
+SUBNET_INDEX_RELOAD_INTERVAL = 10
+
+# statuses of objects with no task waiting for an agent
+READY_STATUSES = (
+    constants.ACTIVE,
+    constants.INACTIVE,
+    constants.DOWN
+)
 
 
 class LoadBalancerCallbacks(object):
@@ -122,10 +142,16 @@ class LoadBalancerCallbacks(object):
         self.plugin = plugin
         self.env = env
         self.scheduler = scheduler
-        self.net_cache = {}
-        self.subnet_cache = {}
-
-        self.last_cache_update = datetime.datetime.now()
+        self.net_cache = NetCache(cfg.CONF.f5_net_cache_timeout,
+                                  cfg.CONF.f5_net_cache_size)
+        self.subnet_cache = SubnetCache(cfg.CONF.f5_net_cache_timeout,
+                                        cfg.CONF.f5_net_cache_size)
+        # every neutron subnet, reloaded when the cache timeout passes
+        # or an address is in none of them
+        self.subnet_index = SubnetIndex()
+        self.subnet_index_loaded = 0
+        self.subnet_index_expires = 0
+        self._subscribe_net_events()
 
     def _core_plugin(self):
         """ Get the core plugin """
@@ -279,71 +305,335 @@ class LoadBalancerCallbacks(object):
 
             return pools_to_update
 
+    @log.log
+    def get_pools_state(self, context, env=None, group=0, host=None):
+        """ Get the state of all pools for this group in this env.
+
+            Each pool comes with whether any of its objects has a task
+            pending, and a generation which changes when objects are
+            added to or removed from the pool. Agents only need to
+            fetch the services of pools whose state changed.
+        """
+        with context.session.begin(subtransactions=True):
+            if not host:
+                return []
+            agents = self.scheduler.get_agents_in_env(self.plugin,
+                                                      context,
+                                                      env,
+                                                      group)
+            if not agents:
+                return []
+
+            pools_state = []
+            for agent in agents:
+                agent_pools = self.plugin.list_pools_on_lbaas_agent(
+                    context,
+                    agent.id
+                )
+                for pool in agent_pools['pools']:
+                    pending = pool['status'] not in READY_STATUSES
+                    for hms in pool['health_monitors_status']:
+                        if hms['status'] not in READY_STATUSES:
+                            pending = True
+                    pools_state.append(
+                        {
+                         'agent_host': agent['host'],
+                         'pool_id': pool['id'],
+                         'tenant_id': pool['tenant_id'],
+                         'generation': self._get_pool_generation(pool),
+                         'pending': pending
+                        }
+                    )
+            if not pools_state:
+                return pools_state
+
+            # one query each for the vips and members of all pools
+            pool_ids = [pool['pool_id'] for pool in pools_state]
+            pending_pool_ids = set()
+            vips = self.plugin.get_vips(
+                context,
+                filters={'pool_id': pool_ids},
+                fields=['pool_id', 'status']
+            )
+            for vip in vips:
+                if vip['status'] not in READY_STATUSES:
+                    pending_pool_ids.add(vip['pool_id'])
+            members = self.plugin.get_members(
+                context,
+                filters={'pool_id': pool_ids},
+                fields=['pool_id', 'status']
+            )
+            for member in members:
+                if member['status'] not in READY_STATUSES:
+                    pending_pool_ids.add(member['pool_id'])
+            for pool in pools_state:
+                if pool['pool_id'] in pending_pool_ids:
+                    pool['pending'] = True
+            return pools_state
+
+    @staticmethod
+    def _get_pool_generation(pool):
+        """ Digest of the objects which make up a pool """
+        objects = (pool['id'],
+                   pool.get('vip_id'),
+                   sorted(pool.get('members', [])),
+                   sorted(pool.get('health_monitors', [])))
+        return hashlib.md5(str(objects)).hexdigest()
+
     @log.log
     def get_service_by_pool_id(
             self, context, pool_id=None, global_routed_mode=False, host=None):
         """ Get full service definition from pool id """
-        # invalidate cache if it is too old
-        if (datetime.datetime.now() - self.last_cache_update).seconds \
-                > NET_CACHE_SECONDS:
-            self.net_cache = {}
-            self.subnet_cache = {}
+        service = self.get_services_by_pool_ids(
+            context, pool_ids=[pool_id],
+            global_routed_mode=global_routed_mode)[pool_id]
+        LOG.debug(_('Built pool %s service: %s' % (pool_id, service)))
+        return service
 
-        service = {}
+    @log.log
+    def get_services_by_pool_ids(
+            self, context, pool_ids=None, global_routed_mode=False,
+            host=None):
+        """ Get full service definitions for many pools at once.
+
+            Each kind of object the services refer to is loaded with
+            one query for all of the pools, and the services are built
+            from those in memory. Returns the services by pool id.
+        """
+        services = {}
+        if not pool_ids:
+            return services
+        start_time = time()
         with context.session.begin(subtransactions=True):
-            LOG.debug(_('Building service definition entry for %s' % pool_id))
-
-            # populate pool
-            pool = self._get_extended_pool(
-                context, pool_id, global_routed_mode)
-            service['pool'] = pool
-            if not pool:
-                LOG.debug(_('Built pool %s service: %s' % (pool_id, service)))
-                return service
-            # populate pool members
+            pools = self.plugin.get_pools(
+                context, filters={'id': pool_ids})
+            members = {}
+            for member in self.plugin.get_members(
+                    context, filters={'pool_id': pool_ids}):
+                members[member['id']] = member
+            health_monitors = {}
+            health_monitor_ids = set()
+            for pool in pools:
+                health_monitor_ids.update(pool['health_monitors'])
+            if health_monitor_ids:
+                for health_mon in self.plugin.get_health_monitors(
+                        context, filters={'id': list(health_monitor_ids)}):
+                    health_monitors[health_mon['id']] = health_mon
+            vips = {}
+            vip_ids = [pool['vip_id'] for pool in pools if pool.get('vip_id')]
+            if vip_ids:
+                for vip in self.plugin.get_vips(
+                        context, filters={'id': vip_ids}):
+                    vips[vip['id']] = vip
+
             adminctx = get_admin_context()
-            if 'members' not in pool or len(pool['members']) == 0:
-                pool['members'] = []
-            service['members'] = []
-            for member_id in pool['members']:
-                try:
-                    member = self.plugin.get_member(context, member_id)
+            prefetched = {'allocations': {},
+                          'ports': {},
+                          'network_ports': {},
+                          'agents': None,
+                          'subnet_index': None}
+            if not global_routed_mode:
+                self._prefetch_networking(
+                    adminctx, members.values(), vips.values(), pools,
+                    prefetched)
+
+            for pool in pools:
+                LOG.debug(_('Building service definition entry for %s'
+                            % pool['id']))
+                service = {}
+                self._extend_pool(context, pool, global_routed_mode)
+                service['pool'] = pool
+
+                # populate pool members
+                if 'members' not in pool or len(pool['members']) == 0:
+                    pool['members'] = []
+                service['members'] = []
+                for member_id in pool['members']:
+                    if member_id not in members:
+                        LOG.error("get_service_by_pool_id: "
+                                  "Member not found %s" % member_id)
+                        continue
+                    member = members[member_id]
                     member['network'] = None
                     member['subnet'] = None
                     member['port'] = None
                     if not global_routed_mode:
                         self._extend_member(
-                            adminctx, context, pool, member)
+                            adminctx, context, pool, member, prefetched)
                     service['members'].append(member)
-                except MemberNotFound:
-                    LOG.error("get_service_by_pool_id: Member not found %s" %
-                              member_id)
-
-            # populate health monitors
-            service['health_monitors'] = []
-            for health_mon in service['pool']['health_monitors']:
-                service['health_monitors'].append(
-                    self.plugin.get_health_monitor(context, health_mon)
-                )
-
-            # populate vip
-            service['vip'] = self._get_extended_vip(
-                context, pool, global_routed_mode)
-
-        LOG.debug(_('Built pool %s service: %s' % (pool_id, service)))
-        return service
 
-    def _get_extended_pool(self, context, pool_id, global_routed_mode):
-        """ Get Pool from Neutron and add extended data """
-        # Start with neutron pool definition
+                # populate health monitors
+                service['health_monitors'] = []
+                for health_mon in pool['health_monitors']:
+                    if health_mon in health_monitors:
+                        service['health_monitors'].append(
+                            health_monitors[health_mon])
+
+                # populate vip
+                service['vip'] = self._get_extended_vip(
+                    context, pool, vips.get(pool.get('vip_id')),
+                    global_routed_mode, prefetched)
+                services[pool['id']] = service
+
+        for pool_id in pool_ids:
+            if pool_id not in services:
+                LOG.error("get_service_by_pool_id: Pool not found %s" %
+                          pool_id)
+                services[pool_id] = {'pool': None}
+        LOG.debug(_('Built %d services in %.5f secs, '
+                    'network cache %s, subnet cache %s'
+                    % (len(services), time() - start_time,
+                       self.net_cache.get_statistics(),
+                       self.subnet_cache.get_statistics())))
+        return services
+
+    def get_net_cache_statistics(self, context=None):
+        """ network and subnet cache statistics """
+        return {'networks': self.net_cache.get_statistics(),
+                'subnets': self.subnet_cache.get_statistics()}
+
+    def _subscribe_net_events(self):
+        """ invalidate cached networks and subnets as they change """
         try:
-            pool = self.plugin.get_pool(context, pool_id)
-        except:
-            LOG.error("get_service_by_pool_id: Pool not found %s" %
-                      pool_id)
-            return None
-
-        # Populate extended pool attributes
+            from neutron.callbacks import events
+            from neutron.callbacks import registry
+            from neutron.callbacks import resources
+        except ImportError:
+            LOG.debug('neutron callbacks not available, cached networks '
+                      'and subnets are only refreshed when they expire')
+            return
+        for resource in ('NETWORK', 'SUBNET'):
+            if not hasattr(resources, resource):
+                continue
+            for (event, callback) in (('AFTER_CREATE', self._net_updated),
+                                      ('AFTER_UPDATE', self._net_updated),
+                                      ('AFTER_DELETE', self._net_deleted)):
+                if hasattr(events, event):
+                    registry.subscribe(callback,
+                                       getattr(resources, resource),
+                                       getattr(events, event))
+
+    def _net_updated(self, resource, event, trigger, **kwargs):
+        """ neutron network or subnet created or changed """
+        obj = kwargs.get(resource) or {}
+        obj_id = kwargs.get(resource + '_id') or obj.get('id')
+        if resource == 'network':
+            self._invalidate_network(obj_id)
+            return
+        self._invalidate_subnet(obj_id)
+        if 'cidr' in obj:
+            self.subnet_index.add(obj)
+        else:
+            self.subnet_index_expires = 0
+
+    def _net_deleted(self, resource, event, trigger, **kwargs):
+        """ neutron network or subnet deleted """
+        obj = kwargs.get(resource) or {}
+        obj_id = kwargs.get(resource + '_id') or obj.get('id')
+        if resource == 'network':
+            self._invalidate_network(obj_id, deleted=True)
+        else:
+            self._invalidate_subnet(obj_id, deleted=True)
+
+    def _invalidate_network(self, network_id, deleted=False):
+        """ forget a network and its subnets """
+        if not network_id:
+            self.net_cache.clear()
+            self.subnet_cache.clear()
+            if deleted:
+                self.subnet_index_expires = 0
+            return
+        self.net_cache.invalidate(network_id)
+        for subnet in self.subnet_cache.values():
+            if subnet['network_id'] == network_id:
+                self.subnet_cache.invalidate(subnet['id'])
+        if deleted:
+            for subnet in self.subnet_index.find_network(network_id):
+                self.subnet_index.remove(subnet['id'])
+
+    def _invalidate_subnet(self, subnet_id, deleted=False):
+        """ forget a subnet """
+        if not subnet_id:
+            self.subnet_cache.clear()
+            if deleted:
+                self.subnet_index_expires = 0
+            return
+        self.subnet_cache.invalidate(subnet_id)
+        if deleted:
+            self.subnet_index.remove(subnet_id)
+
+    def _get_subnet_index(self, adminctx, reload=False):
+        """ index of all neutron subnets """
+        if reload or self.subnet_index_expires < time():
+            start_time = time()
+            self.subnet_index.clear()
+            for subnet in self._core_plugin()._get_all_subnets(adminctx):
+                self.subnet_index.add(
+                    self._core_plugin()._make_subnet_dict(subnet))
+            self.subnet_index_loaded = time()
+            self.subnet_index_expires = \
+                self.subnet_index_loaded + cfg.CONF.f5_net_cache_timeout
+            LOG.debug(_('Indexed %d subnets in %.5f secs'
+                        % (len(self.subnet_index), time() - start_time)))
+        return self.subnet_index
+
+    def _prefetch_networking(self, adminctx, members, vips, pools,
+                             prefetched):
+        """ Load the addresses, ports, subnets and networks of members,
+            vips and pools, one query for each kind of object """
+        from neutron.db import models_v2 as core_db
+        core_plugin = self._core_plugin()
+
+        addresses = set([member['address'] for member in members])
+        if addresses:
+            alloc_qry = adminctx.session.query(core_db.IPAllocation)
+            allocated = alloc_qry.filter(
+                core_db.IPAllocation.ip_address.in_(list(addresses))).all()
+            for alloc in allocated:
+                prefetched['allocations'].setdefault(
+                    alloc['ip_address'], []).append(alloc)
+
+        port_ids = set([vip['port_id'] for vip in vips])
+        subnet_ids = set([pool['subnet_id'] for pool in pools])
+        network_ids = set()
+        for allocated in prefetched['allocations'].values():
+            for alloc in allocated:
+                port_ids.add(alloc['port_id'])
+                subnet_ids.add(alloc['subnet_id'])
+                network_ids.add(alloc['network_id'])
+        if port_ids:
+            for port in core_plugin.get_ports(
+                    adminctx, filters={'id': list(port_ids)}):
+                prefetched['ports'][port['id']] = port
+                network_ids.add(port['network_id'])
+                for fixed_ip in port['fixed_ips']:
+                    subnet_ids.add(fixed_ip['subnet_id'])
+
+        subnets = {}
+        for subnet_id in subnet_ids:
+            subnet = self.subnet_cache.get(subnet_id)
+            if subnet:
+                subnets[subnet_id] = subnet
+        missing_ids = [subnet_id for subnet_id in subnet_ids
+                       if subnet_id not in subnets]
+        if missing_ids:
+            for subnet in core_plugin.get_subnets(
+                    adminctx, filters={'id': missing_ids}):
+                self.subnet_cache.put(subnet['id'], subnet)
+                subnets[subnet['id']] = subnet
+        for pool in pools:
+            if pool['subnet_id'] in subnets:
+                network_ids.add(subnets[pool['subnet_id']]['network_id'])
+
+        network_ids = [network_id for network_id in network_ids
+                       if not self.net_cache.get(network_id)]
+        if network_ids:
+            for network in core_plugin.get_networks(
+                    adminctx, filters={'id': network_ids}):
+                self._cache_network(network)
+
+    def _extend_pool(self, context, pool, global_routed_mode):
+        """ Add extended data to a neutron pool """
         if not global_routed_mode:
             pool['subnet'] = self._get_subnet_cached(
                 context, pool['subnet_id'])
@@ -352,33 +642,52 @@ class LoadBalancerCallbacks(object):
         else:
             pool['subnet_id'] = None
             pool['network'] = None
-
         return pool
 
     def _get_subnet_cached(self, context, subnet_id):
         """ subnet from cache or get from neutron """
-        if subnet_id not in self.subnet_cache:
+        subnet_dict = self.subnet_cache.get(subnet_id)
+        if not subnet_dict:
             subnet_dict = self._core_plugin().get_subnet(context, subnet_id)
-            self.subnet_cache[subnet_id] = subnet_dict
-        return self.subnet_cache[subnet_id]
+            self.subnet_cache.put(subnet_id, subnet_dict)
+        return subnet_dict
 
     def _get_network_cached(self, context, network_id):
         """ network from cache or get from neutron """
-        if network_id not in self.net_cache:
+        net_dict = self.net_cache.get(network_id)
+        if not net_dict:
             net_dict = self._core_plugin().get_network(context, network_id)
-            if 'provider:network_type' not in net_dict:
-                net_dict['provider:network_type'] = 'undefined'
-            if 'provider:segmentation_id' not in net_dict:
-                net_dict['provider:segmentation_id'] = 0
-            self.net_cache[network_id] = net_dict
-        return self.net_cache[network_id]
-
-    def _get_extended_vip(self, context, pool, global_routed_mode):
+            self._cache_network(net_dict)
+        return net_dict
+
+    def _cache_network(self, net_dict):
+        """ put a network in the cache """
+        if 'provider:network_type' not in net_dict:
+            net_dict['provider:network_type'] = 'undefined'
+        if 'provider:segmentation_id' not in net_dict:
+            net_dict['provider:segmentation_id'] = 0
+        self.net_cache.put(net_dict['id'], net_dict)
+
+    @staticmethod
+    def _get_port_prefetched(adminctx, core_plugin, port_id, prefetched):
+        """ port from the prefetched ports or get from neutron """
+        if port_id not in prefetched['ports']:
+            prefetched['ports'][port_id] = core_plugin.get_port(
+                adminctx, port_id)
+        return prefetched['ports'][port_id]
+
+    def _get_agents_prefetched(self, context, prefetched):
+        """ neutron agents, loaded once per batch """
+        if prefetched['agents'] is None:
+            prefetched['agents'] = self._core_plugin().get_agents(context)
+        return prefetched['agents']
+
+    def _get_extended_vip(self, context, pool, vip, global_routed_mode,
+                          prefetched):
         """ add network data to vip """
-        if 'vip_id' not in pool or not pool['vip_id']:
+        if not vip:
             return {'port': {'network': None, 'subnet': None}}
 
-        vip = self.plugin.get_vip(context, pool['vip_id'])
         if global_routed_mode:
             vip['network'] = None
             vip['subnet'] = None
@@ -387,20 +696,21 @@ class LoadBalancerCallbacks(object):
             vip['port']['subnet'] = None
             return vip
 
-        vip['port'] = self._core_plugin().get_port(context, vip['port_id'])
+        vip['port'] = self._get_port_prefetched(
+            context, self._core_plugin(), vip['port_id'], prefetched)
         vip['network'] = self._get_network_cached(
             context, vip['port']['network_id'])
-        self._populate_vip_network_vteps(context, vip)
+        self._populate_vip_network_vteps(context, vip, prefetched)
 
         # there should only be one fixed_ip
         for fixed_ip in vip['port']['fixed_ips']:
-            vip['subnet'] = self._core_plugin().get_subnet(
+            vip['subnet'] = self._get_subnet_cached(
                 context, fixed_ip['subnet_id'])
             vip['address'] = fixed_ip['ip_address']
 
         return vip
 
-    def _populate_vip_network_vteps(self, context, vip):
+    def _populate_vip_network_vteps(self, context, vip, prefetched):
         """ put related tunnel endpoints in vip definiton """
         vip['vxlan_vteps'] = []
         vip['gre_vteps'] = []
@@ -411,8 +721,12 @@ class LoadBalancerCallbacks(object):
         if nettype not in ['vxlan', 'gre']:
             return
 
-        ports = self.get_ports_on_network(context,
-                                          network_id=vip['network']['id'])
+        network_id = vip['network']['id']
+        if network_id not in prefetched['network_ports']:
+            prefetched['network_ports'][network_id] = \
+                self.get_ports_on_network(context, network_id=network_id)
+        ports = prefetched['network_ports'][network_id]
+        agents = self._get_agents_prefetched(context, prefetched)
         vtep_hosts = []
         for port in ports:
             if 'binding:host_id' in port and \
@@ -420,23 +734,23 @@ class LoadBalancerCallbacks(object):
                 vtep_hosts.append(port['binding:host_id'])
         for vtep_host in vtep_hosts:
             if nettype == 'vxlan':
-                endpoints = self._get_vxlan_endpoints(context, vtep_host)
+                endpoints = self._get_vxlan_endpoints(
+                    context, vtep_host, agents)
                 for ep in endpoints:
                     if ep not in vip['vxlan_vteps']:
                         vip['vxlan_vteps'].append(ep)
             elif nettype == 'gre':
-                endpoints = self._get_gre_endpoints(context, vtep_host)
+                endpoints = self._get_gre_endpoints(
+                    context, vtep_host, agents)
                 for ep in endpoints:
                     if ep not in vip['gre_vteps']:
                         vip['gre_vteps'].append(ep)
 
     def _extend_member(
-            self, adminctx, context, pool, member):
+            self, adminctx, context, pool, member, prefetched):
         """ Add networking info to member """
 
-        from neutron.db import models_v2 as core_db
-        alloc_qry = adminctx.session.query(core_db.IPAllocation)
-        allocated = alloc_qry.filter_by(ip_address=member['address']).all()
+        allocated = prefetched['allocations'].get(member['address'], [])
 
         # try populating member from pool subnet
         matching_keys = {'tenant_id': pool['tenant_id'],
@@ -444,24 +758,28 @@ class LoadBalancerCallbacks(object):
                          'shared': None}
 
         if self._found_and_used_matching_addr(
-                adminctx, context, member, allocated, matching_keys):
+                adminctx, context, member, allocated, matching_keys,
+                prefetched):
             return
 
         # try populating member from any tenant subnet
         matching_keys['subnet_id'] = None
         if self._found_and_used_matching_addr(
-                adminctx, context, member, allocated, matching_keys):
+                adminctx, context, member, allocated, matching_keys,
+                prefetched):
             return
 
         # try populating member net from any shared subnet
         matching_keys['tenant_id'] = None
         matching_keys['shared'] = True
         if self._found_and_used_matching_addr(
-                adminctx, context, member, allocated, matching_keys):
+                adminctx, context, member, allocated, matching_keys,
+                prefetched):
             return
 
     def _found_and_used_matching_addr(
-            self, adminctx, context, member, allocated, matching_keys):
+            self, adminctx, context, member, allocated, matching_keys,
+            prefetched):
         """ Find a matching address that matches keys """
 
         # first check list of allocated addresses in neutron
@@ -469,7 +787,8 @@ class LoadBalancerCallbacks(object):
         # first because we prefer to use a subnet that actually has
         # a matching ip address on it.
         if self._found_and_used_neutron_addr(
-                adminctx, context, member, allocated, matching_keys):
+                adminctx, context, member, allocated, matching_keys,
+                prefetched):
             return True
 
         # Perhaps the neutron network was deleted but the pool member
@@ -484,13 +803,14 @@ class LoadBalancerCallbacks(object):
         # with a different id. If we can find a matching subnet, it
         # might help us tear down our configuration.
         if self._found_and_used_neutron_subnet(
-                adminctx, member, matching_keys):
+                adminctx, member, matching_keys, prefetched):
             return True
 
         return False
 
     def _found_and_used_neutron_addr(
-            self, adminctx, context, member, allocated, matching_keys):
+            self, adminctx, context, member, allocated, matching_keys,
+            prefetched):
         """ Find a matching address that matches keys """
 
         for alloc in allocated:
@@ -512,69 +832,90 @@ class LoadBalancerCallbacks(object):
             member['subnet'] = self._get_subnet_cached(
                 context, alloc['subnet_id'])
 
-            member['port'] = self._core_plugin().get_port(
-                adminctx, alloc['port_id'])
-            self._populate_member_network(context, member)
+            member['port'] = self._get_port_prefetched(
+                adminctx, self._core_plugin(), alloc['port_id'], prefetched)
+            self._populate_member_network(context, member, prefetched)
             return True
 
     def _found_and_used_cached_subnet(
             self, adminctx, member, matching_keys):
         """ check our cache for missing network """
         subnets_matched = []
-        na_add = netaddr.IPAddress(member['address'])
-        for subnet in self.subnet_cache:
-            c_subnet = self.subnet_cache[subnet]
-            na_net = netaddr.IPNetwork(c_subnet['cidr'])
-            if na_add in na_net:
-                if matching_keys['subnet_id'] and \
-                        c_subnet['id'] != matching_keys['subnet_id']:
-                    continue
-                if matching_keys['tenant_id'] and \
-                        c_subnet['tenant_id'] != matching_keys['tenant_id']:
-                    continue
-                if matching_keys['shared'] and not c_subnet['shared']:
-                    continue
-                subnets_matched.append(subnet)
+        for c_subnet in self.subnet_cache.find(member['address']):
+            if matching_keys['subnet_id'] and \
+                    c_subnet['id'] != matching_keys['subnet_id']:
+                continue
+            if matching_keys['tenant_id'] and \
+                    c_subnet['tenant_id'] != matching_keys['tenant_id']:
+                continue
+            if matching_keys['shared'] and not c_subnet['shared']:
+                continue
+            subnets_matched.append(c_subnet)
         if len(subnets_matched) == 1:
-            member['subnet'] = self._get_subnet_cached(
-                adminctx, subnets_matched[0])
+            member['subnet'] = subnets_matched[0]
             member['network'] = self._get_network_cached(
                 adminctx, member['subnet']['network_id'])
             return True
         return False
 
     def _found_and_used_neutron_subnet(
-            self, adminctx, member, matching_keys):
+            self, adminctx, member, matching_keys, prefetched):
         """ check neutron for matching network """
 
-        na_add = netaddr.IPAddress(member['address'])
-
-        subnets_matched = []
-        for subnet in self._core_plugin()._get_all_subnets(adminctx):
-            subnet_dict = self._core_plugin()._make_subnet_dict(subnet)
-            self.subnet_cache[subnet_dict['id']] = subnet_dict
-            na_net = netaddr.IPNetwork(subnet_dict['cidr'])
-            if na_add in na_net:
-                if matching_keys['subnet_id'] and \
-                        subnet_dict['id'] != \
-                        matching_keys['subnet_id']:
-                    continue
-                if matching_keys['tenant_id'] and \
-                        subnet_dict['tenant_id'] != \
-                        matching_keys['tenant_id']:
-                    continue
-                if matching_keys['shared'] and not subnet_dict['shared']:
-                    continue
-                subnets_matched.append(subnet_dict)
+        # the index is checked for expiry once per batch
+        if prefetched['subnet_index'] is None:
+            prefetched['subnet_index'] = self._get_subnet_index(adminctx)
+
+        subnets_matched = self._find_indexed_subnets(
+            adminctx, member, matching_keys)
+        if not subnets_matched and time() - self.subnet_index_loaded > \
+                SUBNET_INDEX_RELOAD_INTERVAL:
+            # the subnet may have been created by another worker
+            self._get_subnet_index(adminctx, reload=True)
+            subnets_matched = self._find_indexed_subnets(
+                adminctx, member, matching_keys)
         if len(subnets_matched) == 1:
             LOG.debug(_('%s in subnet %s in cache'
                         % (member['address'],
                            subnets_matched[0]['id'])))
+            try:
+                network = self._get_network_cached(
+                    adminctx, subnets_matched[0]['network_id'])
+            except Exception:
+                # deleted by another worker, the member stays unresolved
+                return
             member['subnet'] = subnets_matched[0]
-            member['network'] = self._get_network_cached(
-                adminctx, member['subnet']['network_id'])
+            self.subnet_cache.put(subnets_matched[0]['id'],
+                                  subnets_matched[0])
+            member['network'] = network
+
+    def _find_indexed_subnets(self, adminctx, member, matching_keys):
+        """ indexed subnets of the member address which match the keys
+            and still exist in neutron """
+        subnets_matched = []
+        for subnet_dict in self.subnet_index.find(member['address']):
+            if matching_keys['subnet_id'] and \
+                    subnet_dict['id'] != \
+                    matching_keys['subnet_id']:
+                continue
+            if matching_keys['tenant_id'] and \
+                    subnet_dict['tenant_id'] != \
+                    matching_keys['tenant_id']:
+                continue
+            if matching_keys['shared'] and not subnet_dict['shared']:
+                continue
+            try:
+                subnet_dict = self._core_plugin().get_subnet(
+                    adminctx, subnet_dict['id'])
+            except Exception:
+                # deleted by another worker since the index was loaded
+                self.subnet_index.remove(subnet_dict['id'])
+                self.subnet_cache.invalidate(subnet_dict['id'])
+                continue
+            subnets_matched.append(subnet_dict)
+        return subnets_matched
 
-    def _populate_member_network(self, context, member):
+    def _populate_member_network(self, context, member, prefetched):
         """ Add networking info to pool member """
         member['vxlan_vteps'] = []
         member['gre_vteps'] = []
@@ -584,12 +925,14 @@ class LoadBalancerCallbacks(object):
                 if 'binding:host_id' in member['port']:
                     host = member['port']['binding:host_id']
                     member['vxlan_vteps'] = self._get_vxlan_endpoints(
-                        context, host)
+                        context, host,
+                        self._get_agents_prefetched(context, prefetched))
             if nettype == 'gre':
                 if 'binding:host_id' in member['port']:
                     host = member['port']['binding:host_id']
                     member['gre_vteps'] = self._get_gre_endpoints(
-                        context, host)
+                        context, host,
+                        self._get_agents_prefetched(context, prefetched))
         if 'provider:network_type' not in member['network']:
             member['network']['provider:network_type'] = 'undefined'
         if 'provider:segmentation_id' not in member['network']:
@@ -619,6 +962,7 @@ class LoadBalancerCallbacks(object):
     def delete_network(self, context, network_id):
         """ Delete neutron network """
         self._core_plugin().delete_network(context, network_id)
+        self._invalidate_network(network_id, deleted=True)
 
     @log.log
     def create_subnet(self, context, tenant_id=None, network_id=None,
@@ -640,15 +984,18 @@ class LoadBalancerCallbacks(object):
             subnet_data['dns_nameservers'] = dns_nameservers
         if host_routes:
             subnet_data['host_routes'] = host_routes
-        return self._core_plugin().create_subnet(
+        subnet = self._core_plugin().create_subnet(
             context,
             {'subenet': subnet_data}
         )
+        self.subnet_index.add(subnet)
+        return subnet
 
     @log.log
     def delete_subnet(self, context, subnet_id):
         """ Delete neutron subnet """
         self._core_plugin().delete_subnet(context, subnet_id)
+        self._invalidate_subnet(subnet_id, deleted=True)
 
     @log.log
     def get_ports_for_mac_addresses(self, context, mac_addresses=None):
@@ -1103,16 +1450,110 @@ class LoadBalancerCallbacks(object):
         except Exception as ex:
             LOG.error(_('error updating pool stats: %s' % ex.message))
 
+    @log.log
+    def update_pools_stats(self, context, stats_by_pool=None, host=None):
+        """ Update stats for many pools at once.
+
+            The pools and their members are read with one query each
+            and their stats written from those rows. Each pool is
+            written in its own savepoint, so a pool deleted meanwhile
+            only loses its own stats.
+        """
+        if not stats_by_pool:
+            return
+        start_time = time()
+        pool_ids = list(stats_by_pool.keys())
+        updated = 0
+        try:
+            with context.session.begin(subtransactions=True):
+                # ids are read before any savepoint rollback can
+                # expire the rows
+                pools = [(pool.id, pool) for pool in
+                         context.session.query(lb_db.Pool).filter(
+                             lb_db.Pool.id.in_(pool_ids))]
+                members_by_pool = {}
+                for member in context.session.query(lb_db.Member).filter(
+                        lb_db.Member.pool_id.in_(pool_ids)):
+                    members_by_pool.setdefault(
+                        member.pool_id, {})[member.id] = member
+                for (pool_id, pool) in pools:
+                    if self._update_pool_stats_row(
+                            context, pool_id, pool, stats_by_pool[pool_id],
+                            members_by_pool.get(pool_id, {})):
+                        updated += 1
+        except Exception as ex:
+            LOG.error(_('error updating pools stats: %s' % ex.message))
+            return
+        LOG.debug(_('updated stats for %d of %d pools in %.5f secs'
+                    % (updated, len(pool_ids), time() - start_time)))
+
+    def _update_pool_stats_row(self, context, pool_id, pool, stats,
+                               members):
+        """ Write the stats of one loaded pool and its members.
+
+            Returns whether they were written. Failures roll back
+            to the savepoint and are logged, not raised.
+        """
+        try:
+            # Do not update stats of pools being deleted.
+            if pool.status == constants.PENDING_DELETE:
+                return False
+            member_status = {}
+            for member_id in members:
+                member_status[member_id] = members[member_id].status
+            member_updates = self._get_member_stats_updates(
+                stats.get('members', {}), member_status)
+            with context.session.begin_nested():
+                pool.stats = self.plugin._create_pool_stats(
+                    context, pool_id, stats)
+                for member_id in member_updates:
+                    status = member_updates[member_id].get('status')
+                    if not status:
+                        continue
+                    member = members[member_id]
+                    member.status = status
+                    if member.status_description:
+                        member.status_description = None
+            return True
+        except Exception as ex:
+            LOG.debug(_('stats of pool %s were not updated: %s'
+                        % (pool_id, ex.message)))
+            return False
+
+    @staticmethod
+    def _get_member_stats_updates(member_stats, member_status):
+        """ Member stats which change the status of a member.
+
+            Members which are provisioning, being deleted or in error
+            keep their status, as do members whose status is unchanged.
+        """
+        updates = {}
+        for member_id in member_stats:
+            if member_id not in member_status:
+                continue
+            status = member_status[member_id]
+            if status in [constants.PENDING_CREATE,
+                          constants.PENDING_UPDATE,
+                          constants.PENDING_DELETE,
+                          constants.ERROR]:
+                continue
+            if member_stats[member_id].get('status') == status:
+                continue
+            updates[member_id] = member_stats[member_id]
+        return updates
+
     def create_rpc_dispatcher(self):
         """ Create rpc dispatcher """
         return q_rpc.PluginRpcDispatcher(  # @UndefinedVariable
             [self, agents_db.AgentExtRpcCallback(self.plugin)])
 
     @log.log
-    def _get_vxlan_endpoints(self, context, host=None):
+    def _get_vxlan_endpoints(self, context, host=None, agents=None):
         """ Get vxlan endpoints """
         endpoints = []
-        for agent in self._core_plugin().get_agents(context):
+        if agents is None:
+            agents = self._core_plugin().get_agents(context)
+        for agent in agents:
             if 'configurations' in agent:
                 if 'tunnel_types' in agent['configurations']:
                     if 'vxlan' in agent['configurations']['tunnel_types']:
@@ -1136,10 +1577,12 @@ class LoadBalancerCallbacks(object):
                                         endpoints.append(ip_addr)
         return endpoints
 
-    def _get_gre_endpoints(self, context, host=None):
+    def _get_gre_endpoints(self, context, host=None, agents=None):
         """ Get gre endpoints """
         endpoints = []
-        for agent in self._core_plugin().get_agents(context):
+        if agents is None:
+            agents = self._core_plugin().get_agents(context)
+        for agent in agents:
             if 'configurations' in agent:
                 if 'tunnel_types' in agent['configurations']:
                     if 'gre' in agent['configurations']['tunnel_types']:
@@ -0,0 +1,128 @@
+""" Micro-benchmark for pool member reconciliation
+
+    Reconciles pools of 5,000 members against a fake bigip and
+    reports how long BigipPoolManager.assure_bigip_members takes,
+    next to the linear scan it replaced.
+
+    python test/benchmark_member_index.py [members] [rounds]
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gettext
+gettext.install('test')
+
+import sys
+from time import time
+
+from neutron.plugins.common import constants as plugin_const
+
+from f5.oslbaasv1agent.drivers.bigip.pools import BigipPoolManager
+
+
+class FakePool(object):
+    """ Records member changes instead of sending them """
+    def __init__(self):
+        self.changes = None
+
+    def update_members(self, name=None, add_members=None,
+                       update_members=None, remove_members=None,
+                       existing_members=None, folder='Common'):
+        self.changes = (len(add_members), len(update_members),
+                        len(remove_members))
+        return True
+
+
+class FakeBigIP(object):
+    def __init__(self):
+        self.pool = FakePool()
+
+
+def make_service(member_count, route_domain):
+    """ Service with member_count members on one route domain """
+    members = []
+    for i in range(member_count):
+        members.append(
+            {'address': '10.%d.%d.%d%%%d' % ((i >> 16) & 255, (i >> 8) & 255,
+                                             i & 255, route_domain),
+             'protocol_port': 80,
+             'status': plugin_const.ACTIVE,
+             'admin_state_up': True,
+             'weight': 1,
+             'network': None,
+             'subnet': None})
+    return {'pool': {'id': 'bench', 'tenant_id': 'bench'},
+            'members': members}
+
+
+def make_pool_state(service, skip=0):
+    """ What the bigip would report for the service's members,
+        in a different order than neutron lists them """
+    members = []
+    for member in reversed(service['members'][skip:]):
+        members.append({'addr': member['address'],
+                        'port': member['protocol_port'],
+                        'session': 'monitor-enabled',
+                        'ratio': 1})
+    return {'members': members}
+
+
+def linear_scan(service, pool_state):
+    """ The reconciliation loop assure_bigip_members used to run """
+    existing_members = list(pool_state['members'])
+    for member in service['members']:
+        found = None
+        for existing_member in existing_members:
+            if member['address'].startswith(existing_member['addr']) and \
+               member['protocol_port'] == existing_member['port']:
+                found = existing_member
+                break
+        if found:
+            existing_members.remove(found)
+    return existing_members
+
+
+def run(member_count, rounds):
+    manager = BigipPoolManager(None, None)
+    bigip = FakeBigIP()
+    service = make_service(member_count, 2)
+    hints = {'check_for_delete_subnets': {}, 'do_not_delete_subnets': []}
+
+    for (label, skip) in (('unchanged', 0), ('100 missing', 100)):
+        best = None
+        for _ in range(rounds):
+            pool_state = make_pool_state(service, skip)
+            start_time = time()
+            manager.assure_bigip_members(bigip, service, hints, pool_state)
+            elapsed = time() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        print('indexed %5d members, %-11s: %.5f secs, changes %s'
+              % (member_count, label, best, bigip.pool.changes))
+        bigip.pool.changes = None
+
+    pool_state = make_pool_state(service)
+    start_time = time()
+    linear_scan(service, pool_state)
+    print('scanned %5d members, unchanged  : %.5f secs'
+          % (member_count, time() - start_time))
+
+
+if __name__ == '__main__':
+    member_count = 5000
+    rounds = 5
+    if len(sys.argv) > 1:
+        member_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        rounds = int(sys.argv[2])
+    run(member_count, rounds)
@@ -0,0 +1,95 @@
+""" Micro-benchmark for member to subnet resolution
+
+    Finds the subnets of member addresses among 20,000 subnets with
+    the SubnetIndex used by the plugin callbacks, next to the scan of
+    every subnet it replaced.
+
+    python test/benchmark_subnet_index.py [subnets] [members]
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import random
+import sys
+from time import time
+
+import netaddr
+
+from f5.oslbaasv1driver.drivers.net_cache import SubnetIndex
+
+
+def make_subnets(subnet_count):
+    """ IPv4 /24 and IPv6 /64 subnets """
+    subnets = []
+    for i in range(subnet_count):
+        if i % 4:
+            cidr = '10.%d.%d.0/24' % ((i >> 8) & 255, i & 255)
+        else:
+            cidr = '2001:db8:%x::/64' % i
+        subnets.append({'id': 'subnet-%d' % i,
+                        'network_id': 'network-%d' % i,
+                        'tenant_id': 'tenant-%d' % (i % 100),
+                        'shared': False,
+                        'cidr': cidr})
+    return subnets
+
+
+def make_addresses(subnets, member_count):
+    """ An address in a random subnet for each member """
+    addresses = []
+    for _ in range(member_count):
+        net = netaddr.IPNetwork(random.choice(subnets)['cidr'])
+        addresses.append(str(net[5]))
+    return addresses
+
+
+def linear_scan(subnets, address):
+    """ The subnet search the plugin used to run """
+    na_add = netaddr.IPAddress(address)
+    return [subnet for subnet in subnets
+            if na_add in netaddr.IPNetwork(subnet['cidr'])]
+
+
+def run(subnet_count, member_count):
+    subnets = make_subnets(subnet_count)
+    addresses = make_addresses(subnets, member_count)
+
+    start_time = time()
+    index = SubnetIndex()
+    for subnet in subnets:
+        index.add(subnet)
+    print('indexed %d subnets: %.5f secs'
+          % (subnet_count, time() - start_time))
+
+    start_time = time()
+    for address in addresses:
+        assert len(index.find(address)) == 1
+    print('indexed lookup of %d members: %.5f secs'
+          % (member_count, time() - start_time))
+
+    start_time = time()
+    for address in addresses:
+        linear_scan(subnets, address)
+    print('scanned lookup of %d members: %.5f secs'
+          % (member_count, time() - start_time))
+
+
+if __name__ == '__main__':
+    subnet_count = 20000
+    member_count = 20
+    if len(sys.argv) > 1:
+        subnet_count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        member_count = int(sys.argv[2])
+    run(subnet_count, member_count)
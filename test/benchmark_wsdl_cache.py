@@ -0,0 +1,76 @@
+""" Benchmark of BigIP construction with a cold and warm WSDL cache
+
+    Connects to a BIG-IP several times and loads the iControl
+    interfaces the agent uses, first with no WSDL cache, then with
+    an empty (cold) on-disk cache and then with the cache it filled
+    (warm), and reports the best time for each.
+
+    python test/benchmark_wsdl_cache.py <hostname> <username> <password>
+        [rounds]
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import shutil
+import sys
+import tempfile
+from time import time
+
+from f5.bigip.bigip import BigIP
+
+
+def open_bigip(hostname, username, password, wsdl_cache_dir=None):
+    """ Connect and load the SOAP interfaces the agent uses """
+    start_time = time()
+    bigip = BigIP(hostname, username, password,
+                  wsdl_cache_dir=wsdl_cache_dir)
+    bigip.system
+    bigip.device
+    bigip.cluster
+    bigip.arp
+    return (time() - start_time, bigip.get_wsdl_cache_statistics())
+
+
+def run(hostname, username, password, rounds):
+    best = None
+    for _ in range(rounds):
+        (elapsed, stats) = open_bigip(hostname, username, password)
+        best = elapsed if best is None else min(best, elapsed)
+    print('no cache  : %.5f secs' % best)
+
+    cold = None
+    warm = None
+    for _ in range(rounds):
+        wsdl_cache_dir = tempfile.mkdtemp()
+        try:
+            (elapsed, stats) = open_bigip(hostname, username, password,
+                                          wsdl_cache_dir)
+            cold = elapsed if cold is None else min(cold, elapsed)
+            (elapsed, stats) = open_bigip(hostname, username, password,
+                                          wsdl_cache_dir)
+            warm = elapsed if warm is None else min(warm, elapsed)
+        finally:
+            shutil.rmtree(wsdl_cache_dir)
+    print('cold cache: %.5f secs' % cold)
+    print('warm cache: %.5f secs, %s' % (warm, stats))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(1)
+    rounds = 3
+    if len(sys.argv) > 4:
+        rounds = int(sys.argv[4])
+    run(sys.argv[1], sys.argv[2], sys.argv[3], rounds)
@@ -0,0 +1,117 @@
+""" Unit tests for the BIG-IP object cache
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from f5.bigip import object_cache
+from f5.bigip.object_cache import ObjectCache
+
+
+class TestObjectCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.real_time = object_cache.time
+        object_cache.time = lambda: self.now
+        self.cache = ObjectCache(timeout=120, max_size=3)
+
+    def tearDown(self):
+        object_cache.time = self.real_time
+
+    def test_unknown_object(self):
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'uuid_p'),
+                         (False, None))
+
+    def test_known_object(self):
+        self.cache.put('pool', 'uuid_t', 'uuid_p', False)
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'uuid_p'),
+                         (True, False))
+
+    def test_entries_expire(self):
+        self.cache.put('pool', 'uuid_t', 'uuid_p', True)
+        self.now += 120
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'uuid_p'),
+                         (True, True))
+        self.now += 1
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'uuid_p'),
+                         (False, None))
+
+    def test_zero_timeout_disables(self):
+        cache = ObjectCache(timeout=0, max_size=3)
+        cache.put('pool', 'uuid_t', 'uuid_p', True)
+        self.assertEqual(cache.get('pool', 'uuid_t', 'uuid_p'),
+                         (False, None))
+
+    def test_least_recently_used_is_evicted(self):
+        for name in ['a', 'b', 'c']:
+            self.cache.put('pool', 'uuid_t', name, True)
+        self.cache.get('pool', 'uuid_t', 'a')
+        self.cache.put('pool', 'uuid_t', 'd', True)
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'b'),
+                         (False, None))
+        for name in ['a', 'c', 'd']:
+            self.assertEqual(self.cache.get('pool', 'uuid_t', name),
+                             (True, True))
+        self.assertEqual(self.cache.get_statistics()['evictions'], 1)
+
+    def test_invalidate_one(self):
+        self.cache.put('pool', 'uuid_t', 'a', True)
+        self.cache.put('pool', 'uuid_t', 'b', True)
+        self.cache.invalidate('pool', 'uuid_t', 'a')
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'a'),
+                         (False, None))
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'b'),
+                         (True, True))
+
+    def test_invalidate_folder(self):
+        self.cache.put('pool', 'uuid_t', 'a', True)
+        self.cache.put('monitor', 'uuid_t', 'b', True)
+        self.cache.put('pool', 'Common', 'c', True)
+        self.cache.invalidate(folder='uuid_t')
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'a'),
+                         (False, None))
+        self.assertEqual(self.cache.get('monitor', 'uuid_t', 'b'),
+                         (False, None))
+        self.assertEqual(self.cache.get('pool', 'Common', 'c'),
+                         (True, True))
+
+    def test_invalidate_kind(self):
+        self.cache.put('pool', 'uuid_t', 'a', True)
+        self.cache.put('monitor', 'uuid_t', 'b', True)
+        self.cache.invalidate('pool')
+        self.assertEqual(self.cache.get('pool', 'uuid_t', 'a'),
+                         (False, None))
+        self.assertEqual(self.cache.get('monitor', 'uuid_t', 'b'),
+                         (True, True))
+
+    def test_clear(self):
+        self.cache.put('pool', 'uuid_t', 'a', True)
+        self.cache.clear()
+        self.assertEqual(self.cache.get_statistics()['size'], 0)
+
+    def test_statistics(self):
+        self.cache.put('pool', 'uuid_t', 'a', True)
+        self.cache.get('pool', 'uuid_t', 'a')
+        self.cache.get('pool', 'uuid_t', 'b')
+        self.assertEqual(self.cache.get_statistics(),
+                         {'hits': 1, 'misses': 1, 'evictions': 0,
+                          'size': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
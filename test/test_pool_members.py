@@ -0,0 +1,160 @@
+""" Unit tests for updating pool members with one request
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+import unittest
+
+from f5.bigip import exceptions
+from f5.bigip.interfaces.pool import Pool
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, obj=None):
+        self.status_code = status_code
+        self.text = json.dumps(obj or {})
+
+
+class FakeSession(object):
+    """ Answers requests with queued responses and records them """
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+
+    def _request(self, method, url, data=None):
+        self.requests.append((method, url, data and json.loads(data)))
+        return self.responses.pop(0)
+
+    def get(self, url, timeout=None):
+        return self._request('GET', url)
+
+    def patch(self, url, data=None, timeout=None):
+        return self._request('PATCH', url, data)
+
+    def delete(self, url, timeout=None):
+        return self._request('DELETE', url)
+
+
+class FakeBigIP(object):
+    def __init__(self):
+        self.icr_url = 'https://bigip/mgmt/tm'
+        self.icr_session = FakeSession()
+
+
+def member(addr, port, **attributes):
+    """ Member as returned by Pool.get_config """
+    attributes.update({'addr': addr, 'port': port})
+    return attributes
+
+
+class TestUpdateMembers(unittest.TestCase):
+
+    def setUp(self):
+        self.bigip = FakeBigIP()
+        self.session = self.bigip.icr_session
+        self.pool = Pool(self.bigip)
+        self.existing = [
+            member('10.0.0.1', 80, session='monitor-enabled', ratio=1),
+            member('10.0.0.2', 80, session='user-disabled', ratio=2)]
+
+    def test_one_patch_for_adds_and_updates(self):
+        self.session.responses = [FakeResponse(200)]
+        adds = [member('10.0.0.%d' % i, 80, session='user-enabled',
+                       ratio=1) for i in range(10, 510)]
+        self.assertTrue(self.pool.update_members(
+            name='pool', folder='tenant',
+            add_members=adds,
+            update_members=[member('10.0.0.2', 80,
+                                   session='user-enabled')],
+            existing_members=self.existing))
+        self.assertEqual(len(self.session.requests), 1)
+        (method, url, payload) = self.session.requests[0]
+        self.assertEqual(method, 'PATCH')
+        self.assertTrue(url.endswith('/ltm/pool/~uuid_tenant~uuid_pool'))
+        members = dict((m['name'], m) for m in payload['members'])
+        self.assertEqual(len(members), 502)
+        self.assertEqual(members['10.0.0.1:80']['session'], 'user-enabled')
+        self.assertEqual(members['10.0.0.2:80'],
+                         {'name': '10.0.0.2:80', 'partition': 'uuid_tenant',
+                          'address': '10.0.0.2', 'session': 'user-enabled',
+                          'ratio': 2})
+
+    def test_removed_members_delete_their_nodes(self):
+        # the node is deleted, then its ARP entry looked for
+        self.session.responses = [FakeResponse(200), FakeResponse(200),
+                                  FakeResponse(200)]
+        self.assertTrue(self.pool.update_members(
+            name='pool', folder='tenant',
+            remove_members=[member('10.0.0.1', 80)],
+            existing_members=self.existing))
+        (method, url, payload) = self.session.requests[0]
+        self.assertEqual([m['name'] for m in payload['members']],
+                         ['10.0.0.2:80'])
+        (method, url, payload) = self.session.requests[1]
+        self.assertEqual(method, 'DELETE')
+        self.assertTrue(url.endswith('/ltm/node/~uuid_tenant~10.0.0.1'))
+        self.assertEqual(len(self.session.requests), 3)
+
+    def test_ipv6_member_names(self):
+        self.session.responses = [FakeResponse(200)]
+        self.pool.update_members(
+            name='pool', folder='tenant',
+            add_members=[member('2001:db8::1', 80)], existing_members=[])
+        (method, url, payload) = self.session.requests[0]
+        self.assertEqual(payload['members'][0]['name'], '2001:db8::1.80')
+
+    def test_conflict_rereads_members_and_retries(self):
+        config = {'membersReference': {'items': [
+            {'name': '10.0.0.9:80', 'session': 'monitor-enabled',
+             'ratio': 3}]}}
+        self.session.responses = [FakeResponse(409), FakeResponse(200, config),
+                                  FakeResponse(200)]
+        self.assertTrue(self.pool.update_members(
+            name='pool', folder='tenant',
+            add_members=[member('10.0.0.9', 80, ratio=1)],
+            existing_members=[]))
+        self.assertEqual([request[0] for request in self.session.requests],
+                         ['PATCH', 'GET', 'PATCH'])
+        (method, url, payload) = self.session.requests[2]
+        self.assertEqual(payload['members'],
+                         [{'name': '10.0.0.9:80', 'partition': 'uuid_tenant',
+                           'address': '10.0.0.9', 'session': 'user-enabled',
+                           'ratio': 1}])
+
+    def test_missing_pool(self):
+        self.session.responses = [FakeResponse(404)]
+        self.assertFalse(self.pool.update_members(
+            name='pool', folder='tenant',
+            add_members=[member('10.0.0.9', 80)], existing_members=[]))
+
+    def test_failure_raises(self):
+        self.session.responses = [FakeResponse(400)]
+        self.assertRaises(exceptions.PoolUpdateException,
+                          self.pool.update_members,
+                          name='pool', folder='tenant',
+                          add_members=[member('10.0.0.9', 80)],
+                          existing_members=[])
+
+    def test_nothing_to_do(self):
+        self.assertTrue(self.pool.update_members(
+            name='pool', folder='tenant', existing_members=self.existing))
+        self.assertEqual(self.session.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
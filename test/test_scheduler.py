@@ -0,0 +1,242 @@
+""" Unit tests for the keyed request scheduler
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from eventlet import event
+from eventlet import greenthread
+
+from f5.oslbaasv1agent.drivers.bigip import scheduler
+from f5.oslbaasv1agent.drivers.bigip.scheduler import ServiceScheduler
+
+
+def make_service(pool_id, tenant_id='tenant-1'):
+    """ Smallest service definition the scheduler looks at """
+    return {'pool': {'id': pool_id, 'tenant_id': tenant_id}}
+
+
+class SchedulerTestCase(unittest.TestCase):
+    """ Runs requests whose invocations block until released """
+
+    def setUp(self):
+        self.scheduler = ServiceScheduler(workers=10)
+        self.gates = {}
+        self.started = []
+        self.finished = []
+        self.results = {}
+
+    def submit(self, name, method_name, service):
+        """ Queue a request which runs until release(name) """
+        self.gates[name] = event.Event()
+
+        def invoke(service):
+            self.started.append(name)
+            self.gates[name].wait()
+            self.finished.append(name)
+            return service
+
+        def run():
+            self.results[name] = self.scheduler.run(
+                method_name, service, invoke)
+
+        greenthread.spawn_n(run)
+        self.settle()
+
+    def release(self, name):
+        """ Let a running request finish """
+        self.gates[name].send(True)
+        self.settle()
+
+    @staticmethod
+    def settle():
+        """ Let every runnable greenthread run until it blocks """
+        for _ in range(10):
+            greenthread.sleep(0)
+
+
+class TestClaims(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = ServiceScheduler()
+
+    def test_global_exclusive_methods(self):
+        self.assertEqual(
+            self.scheduler.get_claims('remove_orphans', make_service('p1')),
+            [(scheduler.GLOBAL_KEY, True)])
+
+    def test_adding_bigips_runs_alone(self):
+        self.assertEqual(self.scheduler.get_claims('add_bigips', None),
+                         [(scheduler.GLOBAL_KEY, True)])
+
+    def test_request_without_service(self):
+        self.assertEqual(self.scheduler.get_claims('sync', None),
+                         [(scheduler.GLOBAL_KEY, True)])
+
+    def test_pool_request(self):
+        self.assertEqual(
+            self.scheduler.get_claims('update_pool', make_service('p1')),
+            [(scheduler.GLOBAL_KEY, False),
+             (scheduler.tenant_key('tenant-1'), False),
+             (scheduler.pool_key('p1'), True)])
+
+    def test_tenant_exclusive_request(self):
+        claims = self.scheduler.get_claims('delete_pool', make_service('p1'))
+        self.assertIn((scheduler.tenant_key('tenant-1'), True), claims)
+
+    def test_read_only_request(self):
+        claims = self.scheduler.get_claims('exists', make_service('p1'))
+        self.assertIn((scheduler.pool_key('p1'), False), claims)
+
+
+class TestOrdering(SchedulerTestCase):
+
+    def test_same_pool_runs_in_order(self):
+        self.submit('first', 'update_pool', make_service('p1'))
+        self.submit('second', 'update_health_monitor', make_service('p1'))
+        self.assertEqual(self.started, ['first'])
+        self.release('first')
+        self.assertEqual(self.started, ['first', 'second'])
+        self.release('second')
+        self.assertEqual(self.finished, ['first', 'second'])
+
+    def test_different_pools_run_concurrently(self):
+        self.submit('p1', 'update_pool', make_service('p1'))
+        self.submit('p2', 'update_pool', make_service('p2'))
+        self.assertEqual(self.started, ['p1', 'p2'])
+        self.release('p2')
+        self.release('p1')
+        self.assertEqual(self.finished, ['p2', 'p1'])
+
+    def test_tenant_exclusive_waits_for_tenant(self):
+        self.submit('update', 'update_pool', make_service('p1'))
+        self.submit('delete', 'delete_pool', make_service('p2'))
+        self.submit('other', 'update_pool', make_service('p3'))
+        self.submit('elsewhere', 'update_pool',
+                    make_service('p4', tenant_id='tenant-2'))
+        # the delete waits for the tenant, and holds back requests
+        # for the tenant queued after it
+        self.assertEqual(self.started, ['update', 'elsewhere'])
+        self.release('update')
+        self.assertEqual(self.started, ['update', 'elsewhere', 'delete'])
+        self.release('delete')
+        self.assertEqual(self.started[-1], 'other')
+        self.release('other')
+        self.release('elsewhere')
+
+    def test_global_exclusive_runs_alone(self):
+        self.submit('p1', 'update_pool', make_service('p1'))
+        self.submit('orphans', 'remove_orphans', None)
+        self.submit('p2', 'update_pool', make_service('p2'))
+        self.assertEqual(self.started, ['p1'])
+        self.release('p1')
+        self.assertEqual(self.started, ['p1', 'orphans'])
+        self.release('orphans')
+        self.assertEqual(self.started, ['p1', 'orphans', 'p2'])
+        self.release('p2')
+
+    def test_queue_is_empty_when_done(self):
+        self.submit('p1', 'update_pool', make_service('p1'))
+        self.assertEqual(len(self.scheduler), 1)
+        self.release('p1')
+        self.assertEqual(len(self.scheduler), 0)
+        self.assertEqual(self.scheduler.keys, {})
+        self.assertEqual(self.results['p1'], make_service('p1'))
+
+    def test_failure_releases_keys(self):
+        def invoke(service):
+            raise ValueError('failed')
+        self.assertRaises(ValueError, self.scheduler.run,
+                          'update_pool', make_service('p1'), invoke)
+        self.assertEqual(len(self.scheduler), 0)
+        self.submit('p1', 'update_pool', make_service('p1'))
+        self.assertEqual(self.started, ['p1'])
+        self.release('p1')
+
+
+class TestCoalescing(SchedulerTestCase):
+
+    def test_queued_request_absorbs_later_ones(self):
+        self.submit('running', 'update_pool', make_service('p1'))
+        self.submit('queued', 'update_member', make_service('p1'))
+        newer = make_service('p1')
+        newer['members'] = ['m1']
+        self.submit('merged', 'create_member', newer)
+        self.release('running')
+        # the queued request runs once, with the newest service
+        self.assertEqual(self.started, ['running', 'queued'])
+        self.release('queued')
+        self.assertEqual(self.finished, ['running', 'queued'])
+        self.assertEqual(self.results['queued'], newer)
+        self.assertEqual(self.results['merged'], newer)
+        self.assertEqual(
+            self.scheduler.get_statistics(scheduler.pool_key('p1'))['merged'],
+            1)
+
+    def test_running_request_does_not_absorb(self):
+        self.submit('running', 'update_pool', make_service('p1'))
+        self.submit('queued', 'update_pool', make_service('p1'))
+        self.release('running')
+        self.release('queued')
+        self.assertEqual(self.finished, ['running', 'queued'])
+
+    def test_other_methods_are_not_merged(self):
+        self.submit('running', 'update_pool', make_service('p1'))
+        self.submit('queued', 'update_pool', make_service('p1'))
+        self.submit('monitor', 'update_health_monitor', make_service('p1'))
+        self.release('running')
+        self.release('queued')
+        self.release('monitor')
+        self.assertEqual(self.finished, ['running', 'queued', 'monitor'])
+
+    def test_exclusive_request_behind_blocks_merge(self):
+        self.submit('running', 'update_pool', make_service('p1'))
+        self.submit('queued', 'update_pool', make_service('p1'))
+        self.submit('delete', 'delete_pool', make_service('p2'))
+        # merging into 'queued' would run this ahead of the delete
+        self.submit('later', 'update_pool', make_service('p1'))
+        self.release('running')
+        self.release('queued')
+        self.release('delete')
+        self.release('later')
+        self.assertEqual(self.finished,
+                         ['running', 'queued', 'delete', 'later'])
+
+    def test_merged_callers_get_the_exception(self):
+        self.submit('running', 'update_pool', make_service('p1'))
+        failures = []
+
+        def invoke(service):
+            raise ValueError('failed')
+
+        def run(name):
+            try:
+                self.scheduler.run('update_pool', make_service('p1'),
+                                   invoke)
+            except ValueError:
+                failures.append(name)
+
+        greenthread.spawn_n(run, 'queued')
+        self.settle()
+        greenthread.spawn_n(run, 'merged')
+        self.settle()
+        self.release('running')
+        self.assertEqual(sorted(failures), ['merged', 'queued'])
+
+
+if __name__ == '__main__':
+    unittest.main()
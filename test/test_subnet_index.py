@@ -0,0 +1,95 @@
+""" Unit tests for the member address to subnet index
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from f5.oslbaasv1driver.drivers.net_cache import SubnetIndex
+
+
+def make_subnet(subnet_id, cidr, network_id='net-1'):
+    """ Subnet as returned by the neutron plugin """
+    return {'id': subnet_id, 'cidr': cidr, 'network_id': network_id}
+
+
+def ids(subnets):
+    """ Sorted ids of subnets """
+    return sorted([subnet['id'] for subnet in subnets])
+
+
+class TestSubnetIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SubnetIndex()
+
+    def test_find_ipv4(self):
+        self.index.add(make_subnet('a', '10.1.0.0/24'))
+        self.index.add(make_subnet('b', '10.2.0.0/24'))
+        self.assertEqual(ids(self.index.find('10.1.0.5')), ['a'])
+        self.assertEqual(ids(self.index.find('10.3.0.5')), [])
+
+    def test_find_ipv6(self):
+        self.index.add(make_subnet('a', '2001:db8:1::/64'))
+        self.assertEqual(ids(self.index.find('2001:db8:1::5')), ['a'])
+        self.assertEqual(ids(self.index.find('2001:db8:2::5')), [])
+
+    def test_versions_do_not_mix(self):
+        self.index.add(make_subnet('v4', '0.0.0.0/0'))
+        self.index.add(make_subnet('v6', '::/0'))
+        self.assertEqual(ids(self.index.find('10.1.0.5')), ['v4'])
+        self.assertEqual(ids(self.index.find('2001:db8::5')), ['v6'])
+
+    def test_nested_and_duplicate_subnets(self):
+        self.index.add(make_subnet('wide', '10.0.0.0/8'))
+        self.index.add(make_subnet('narrow', '10.1.0.0/24'))
+        self.index.add(make_subnet('other-net', '10.1.0.0/24', 'net-2'))
+        self.assertEqual(ids(self.index.find('10.1.0.5')),
+                         ['narrow', 'other-net', 'wide'])
+        self.assertEqual(ids(self.index.find('10.2.0.5')), ['wide'])
+
+    def test_remove(self):
+        self.index.add(make_subnet('a', '10.1.0.0/24'))
+        self.index.add(make_subnet('b', '10.1.0.0/24'))
+        self.index.remove('a')
+        self.index.remove('unknown')
+        self.assertEqual(ids(self.index.find('10.1.0.5')), ['b'])
+        self.index.remove('b')
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.prefixes, {})
+
+    def test_readd_moves_subnet(self):
+        self.index.add(make_subnet('a', '10.1.0.0/24'))
+        self.index.add(make_subnet('a', '10.2.0.0/24'))
+        self.assertEqual(ids(self.index.find('10.1.0.5')), [])
+        self.assertEqual(ids(self.index.find('10.2.0.5')), ['a'])
+        self.assertEqual(len(self.index), 1)
+
+    def test_find_network(self):
+        self.index.add(make_subnet('a', '10.1.0.0/24', 'net-1'))
+        self.index.add(make_subnet('b', '2001:db8:1::/64', 'net-1'))
+        self.index.add(make_subnet('c', '10.2.0.0/24', 'net-2'))
+        self.assertEqual(ids(self.index.find_network('net-1')), ['a', 'b'])
+
+    def test_clear(self):
+        self.index.add(make_subnet('a', '10.1.0.0/24'))
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(ids(self.index.find('10.1.0.5')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
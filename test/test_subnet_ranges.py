@@ -0,0 +1,134 @@
+""" Unit tests for route domain subnet ranges
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+# Copyright 2016 F5 Networks Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import random
+import unittest
+
+import netaddr
+
+from f5.oslbaasv1agent.drivers.bigip.subnet_ranges import SubnetRanges
+
+
+class TestSubnetRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.ranges = SubnetRanges()
+
+    def test_empty(self):
+        self.assertFalse(self.ranges.overlaps('10.0.0.0/24'))
+        self.assertEqual(len(self.ranges), 0)
+
+    def test_same_cidr_overlaps(self):
+        self.ranges.add('a', '10.0.0.0/24')
+        self.assertTrue(self.ranges.overlaps('10.0.0.0/24'))
+
+    def test_partial_overlap(self):
+        self.ranges.add('a', '10.0.0.0/23')
+        self.assertTrue(self.ranges.overlaps('10.0.1.0/24'))
+        self.assertTrue(self.ranges.overlaps('10.0.0.0/22'))
+
+    def test_containment(self):
+        # a wide range which starts before narrower ones
+        self.ranges.add('wide', '10.0.0.0/8')
+        self.ranges.add('narrow', '10.1.0.0/24')
+        self.assertTrue(self.ranges.overlaps('10.200.0.0/24'))
+        # a cidr containing existing ranges
+        ranges = SubnetRanges()
+        ranges.add('narrow', '10.1.0.0/24')
+        self.assertTrue(ranges.overlaps('10.0.0.0/8'))
+
+    def test_adjacent_ranges_do_not_overlap(self):
+        self.ranges.add('a', '10.0.0.0/24')
+        self.ranges.add('c', '10.0.2.0/24')
+        self.assertFalse(self.ranges.overlaps('10.0.1.0/24'))
+        self.assertFalse(self.ranges.overlaps('10.0.3.0/24'))
+        self.assertFalse(self.ranges.overlaps('9.255.255.0/24'))
+
+    def test_wide_range_before_gap(self):
+        # the greatest end so far, not the previous range's end,
+        # decides whether an earlier range reaches a cidr
+        self.ranges.add('wide', '10.0.0.0/16')
+        self.ranges.add('narrow', '10.0.1.0/24')
+        self.assertTrue(self.ranges.overlaps('10.0.200.0/24'))
+        self.assertFalse(self.ranges.overlaps('10.1.0.0/24'))
+
+    def test_mixed_versions(self):
+        self.ranges.add('v4', '0.0.0.0/0')
+        self.assertFalse(self.ranges.overlaps('::/0'))
+        self.assertFalse(self.ranges.overlaps('::ffff:10.0.0.0/120'))
+        self.ranges.add('v6', '2001:db8::/32')
+        self.assertTrue(self.ranges.overlaps('2001:db8:1::/64'))
+        self.assertFalse(self.ranges.overlaps('2001:db9::/64'))
+        self.assertTrue(self.ranges.overlaps('10.0.0.0/24'))
+
+    def test_remove(self):
+        self.ranges.add('wide', '10.0.0.0/16')
+        self.ranges.add('narrow', '10.0.1.0/24')
+        self.ranges.remove('wide')
+        self.ranges.remove('unknown')
+        self.assertNotIn('wide', self.ranges)
+        self.assertIn('narrow', self.ranges)
+        self.assertFalse(self.ranges.overlaps('10.0.200.0/24'))
+        self.assertTrue(self.ranges.overlaps('10.0.1.128/25'))
+        self.ranges.remove('narrow')
+        self.assertEqual(len(self.ranges), 0)
+        self.assertFalse(self.ranges.overlaps('10.0.1.0/24'))
+
+    def test_readd_moves_range(self):
+        self.ranges.add('a', '10.0.0.0/24')
+        self.ranges.add('a', '10.0.5.0/24')
+        self.assertEqual(len(self.ranges), 1)
+        self.assertFalse(self.ranges.overlaps('10.0.0.0/24'))
+        self.assertTrue(self.ranges.overlaps('10.0.5.0/24'))
+
+    def test_ignore_subnet_id(self):
+        self.ranges.add('a', '10.0.0.0/24')
+        self.ranges.add('b', '10.1.0.0/24')
+        self.assertFalse(self.ranges.overlaps('10.0.0.0/24', 'a'))
+        self.assertTrue(self.ranges.overlaps('10.1.0.0/24', 'a'))
+        self.assertTrue(self.ranges.overlaps('10.0.0.0/24', 'unknown'))
+
+    def test_matches_pairwise_check(self):
+        rand = random.Random(7)
+        cidrs = {}
+        for i in range(200):
+            prefixlen = rand.randint(16, 28)
+            address = '10.%d.%d.%d' % (rand.randint(0, 3),
+                                       rand.randint(0, 255),
+                                       rand.randint(0, 255))
+            cidr = str(netaddr.IPNetwork(
+                '%s/%d' % (address, prefixlen)).cidr)
+            subnet_id = 'subnet-%d' % i
+            expected = False
+            for other in cidrs.values():
+                if netaddr.IPNetwork(other).first <= \
+                        netaddr.IPNetwork(cidr).last and \
+                        netaddr.IPNetwork(cidr).first <= \
+                        netaddr.IPNetwork(other).last:
+                    expected = True
+            self.assertEqual(self.ranges.overlaps(cidr), expected, cidr)
+            self.ranges.add(subnet_id, cidr)
+            cidrs[subnet_id] = cidr
+            if i % 3 == 0:
+                removed = rand.choice(sorted(cidrs))
+                self.ranges.remove(removed)
+                del cidrs[removed]
+
+
+if __name__ == '__main__':
+    unittest.main()